@@ -1,33 +1,39 @@
-import pandas as pd
-import re
 from pathlib import Path
 from datetime import datetime
 import os
 
+from lazy_imports import lazy_import
+from rhash_codec import (
+    RHASH_KEY_DTYPE, extract_rhash, hex_to_keys, build_rhash_dictionary, encode_keys, decode_codes
+)
+from index_timeline import order_snapshots, update_timeline
+from profiling import profile_flag_from_argv
+from seo_etl import files, stages
+from stage_metrics import current_stage, instrumented
+
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+
 # 設定
 INPUT_FILE = './data/siteコロン結果（取得期間9.23〜10.9）.xlsx'
 OUTPUT_DIR = './data/analysis'
+TIMELINE_FILE = './data/index_timeline/index_timeline.npz'
 
-def extract_r_hash_from_url(url):
-    """URLからr_hashを抽出"""
-    if pd.isna(url):
-        return None
-
-    # r_で始まる32文字のハッシュを抽出
-    match = re.search(r'r_([a-f0-9]{32})', str(url))
-    if match:
-        return match.group(1)
-    return None
-
-def analyze_index_drops(input_file, output_dir):
+@instrumented()
+def analyze_index_drops(input_file, output_dir, timeline_file=TIMELINE_FILE):
     """
     インデックス落ちしたr_hashを特定する
 
     Args:
         input_file: 入力Excelファイルのパス
         output_dir: 出力ディレクトリ
+        timeline_file: インデックスタイムラインの保存先（Noneの場合は更新しない）
     """
+    metrics = current_stage()
+
     print(f"Excelファイルを読み込み中: {input_file}")
+    step = metrics.step('load')
+    step.read(input_file)
 
     # Excelファイルを開く
     excel_file = pd.ExcelFile(input_file)
@@ -36,8 +42,8 @@ def analyze_index_drops(input_file, output_dir):
     print(f"シート数: {len(sheet_names)}")
     print(f"シート名: {sheet_names}")
 
-    # 各シートのr_hashセットを格納
-    sheet_data = {}
+    # 各シートのr_hash（128bitキー）を格納
+    sheet_keys = {}
 
     for sheet_name in sheet_names:
         print(f"\nシート '{sheet_name}' を処理中...")
@@ -45,31 +51,52 @@ def analyze_index_drops(input_file, output_dir):
         # シート全体を読み込み
         df = pd.read_excel(input_file, sheet_name=sheet_name)
         print(f"  読み込み完了: {len(df):,}行")
+        step.rows_in = (step.rows_in or 0) + len(df)
 
-        # URLからr_hashを抽出
-        r_hashes = set()
+        # URLからr_hashを抽出し、128bitキーに変換
+        keys = np.empty(0, dtype=RHASH_KEY_DTYPE)
 
         if 'url' in df.columns:
-            df['r_hash'] = df['url'].apply(extract_r_hash_from_url)
-            r_hashes.update(df['r_hash'].dropna().unique())
+            keys = np.unique(hex_to_keys(extract_rhash(df['url'])))
         elif 'keyword' in df.columns:
             # keywordカラムからも抽出を試みる
-            df['r_hash'] = df['keyword'].apply(extract_r_hash_from_url)
-            r_hashes.update(df['r_hash'].dropna().unique())
-
-        print(f"  検出されたr_hash数: {len(r_hashes):,}")
-        sheet_data[sheet_name] = r_hashes
+            keys = np.unique(hex_to_keys(extract_rhash(df['keyword'])))
+
+        print(f"  検出されたr_hash数: {len(keys):,}")
+        sheet_keys[sheet_name] = keys
+
+    step.rows_out = sum(len(keys) for keys in sheet_keys.values())
+    metrics.rows_in = step.rows_in
+
+    # 長期推移用のタイムラインに未登録のシートを追記
+    step = metrics.step('timeline', rows_in=step.rows_out)
+    if timeline_file:
+        print()
+        # タイムラインの更新に失敗してもインデックス落ち分析は続行
+        try:
+            update_timeline(sheet_keys, timeline_file)
+        except Exception as e:
+            print(f"  ⚠ インデックスタイムラインを更新できませんでした: {e}")
+
+    # 全シート共通の辞書でint32コードに変換（以降の集合演算は整数配列で行う）
+    step = metrics.step('classify', rows_in=step.rows_in)
+    dictionary = build_rhash_dictionary(sheet_keys.values())
+    sheet_data = {
+        sheet_name: encode_keys(keys, dictionary)
+        for sheet_name, keys in sheet_keys.items()
+    }
 
     # インデックス落ちを分析
     print("\n" + "="*60)
     print("インデックス落ち分析")
     print("="*60)
 
-    # シート名をソート（時系列順と仮定）
-    sorted_sheets = sorted(sheet_names)
+    # シートを時系列順に並べる（タイムラインと同じ順序。日付を読み取れない場合は名前順）
+    sorted_sheets = order_snapshots(sheet_names)
 
     # 前のシートと比較してインデックス落ちを検出
     results = []
+    dropped_counts = {}
 
     for i in range(1, len(sorted_sheets)):
         prev_sheet = sorted_sheets[i-1]
@@ -79,10 +106,10 @@ def analyze_index_drops(input_file, output_dir):
         current_hashes = sheet_data[current_sheet]
 
         # インデックス落ち = 前には存在したが今は存在しない
-        dropped = prev_hashes - current_hashes
+        dropped = np.setdiff1d(prev_hashes, current_hashes, assume_unique=True)
 
         # 新規追加 = 前には存在しなかったが今は存在する
-        added = current_hashes - prev_hashes
+        added = np.setdiff1d(current_hashes, prev_hashes, assume_unique=True)
 
         print(f"\n【{prev_sheet} → {current_sheet}】")
         print(f"  前のシート: {len(prev_hashes):,}件")
@@ -90,15 +117,17 @@ def analyze_index_drops(input_file, output_dir):
         print(f"  インデックス落ち: {len(dropped):,}件")
         print(f"  新規追加: {len(added):,}件")
 
-        # インデックス落ちしたr_hashを記録
-        for r_hash in dropped:
-            results.append({
-                'r_hash': r_hash,
-                'url': f'https://jp.stanby.com/r_{r_hash}',
+        # インデックス落ちしたr_hashを記録（出力時に16進文字列へ戻す）
+        dropped_counts[(prev_sheet, current_sheet)] = len(dropped)
+        if len(dropped) > 0:
+            dropped_hex = pd.Series(decode_codes(dropped, dictionary))
+            results.append(pd.DataFrame({
+                'r_hash': dropped_hex,
+                'url': 'https://jp.stanby.com/r_' + dropped_hex,
                 'dropped_from': prev_sheet,
                 'dropped_to': current_sheet,
                 'status': 'dropped'
-            })
+            }))
 
     # 最終的なインデックス落ち（最初のシートには存在したが最後には存在しない）
     first_sheet = sorted_sheets[0]
@@ -107,7 +136,7 @@ def analyze_index_drops(input_file, output_dir):
     first_hashes = sheet_data[first_sheet]
     last_hashes = sheet_data[last_sheet]
 
-    final_dropped = first_hashes - last_hashes
+    final_dropped = np.setdiff1d(first_hashes, last_hashes, assume_unique=True)
 
     print(f"\n{'='*60}")
     print(f"【全期間でのインデックス落ち】")
@@ -116,8 +145,11 @@ def analyze_index_drops(input_file, output_dir):
     print(f"{'='*60}")
 
     # 結果をDataFrameに変換
-    if results:
-        df_results = pd.DataFrame(results)
+    df_results = pd.concat(results, ignore_index=True) if results else pd.DataFrame()
+    step.rows_out = metrics.rows_out = len(df_results)
+    step = metrics.step('write', rows_in=len(df_results))
+
+    if len(df_results) > 0:
 
         # 出力ディレクトリを作成
         Path(output_dir).mkdir(parents=True, exist_ok=True)
@@ -128,6 +160,7 @@ def analyze_index_drops(input_file, output_dir):
 
         # CSVに保存
         df_results.to_csv(output_file, index=False, encoding='utf-8-sig')
+        step.wrote(output_file)
         print(f"\n✓ インデックス落ち一覧を保存: {output_file}")
 
         # サマリーレポートも作成
@@ -135,14 +168,14 @@ def analyze_index_drops(input_file, output_dir):
         with open(summary_file, 'w', encoding='utf-8') as f:
             f.write("=== インデックス落ち分析レポート ===\n\n")
             f.write(f"分析期間: {first_sheet} ～ {last_sheet}\n")
-            f.write(f"総インデックス落ち数: {len(results):,}件\n\n")
+            f.write(f"総インデックス落ち数: {len(df_results):,}件\n\n")
 
             # 期間ごとの統計
             f.write("【期間別インデックス落ち数】\n")
             for i in range(1, len(sorted_sheets)):
                 prev_sheet = sorted_sheets[i-1]
                 current_sheet = sorted_sheets[i]
-                dropped_count = len([r for r in results if r['dropped_from'] == prev_sheet and r['dropped_to'] == current_sheet])
+                dropped_count = dropped_counts[(prev_sheet, current_sheet)]
                 f.write(f"  {prev_sheet} → {current_sheet}: {dropped_count:,}件\n")
 
             f.write(f"\n【全期間でのインデックス落ち】\n")
@@ -150,31 +183,36 @@ def analyze_index_drops(input_file, output_dir):
 
             # 最終的なインデックス落ち一覧も別ファイルに保存
             final_dropped_file = os.path.join(output_dir, f"index_drops_final_{timestamp}.csv")
-            final_df = pd.DataFrame([
-                {
-                    'r_hash': r_hash,
-                    'url': f'https://jp.stanby.com/r_{r_hash}',
-                    'first_seen': first_sheet,
-                    'last_seen': 'not in ' + last_sheet
-                }
-                for r_hash in final_dropped
-            ])
+            final_hex = pd.Series(decode_codes(final_dropped, dictionary), dtype=object)
+            final_df = pd.DataFrame({
+                'r_hash': final_hex,
+                'url': 'https://jp.stanby.com/r_' + final_hex,
+                'first_seen': first_sheet,
+                'last_seen': 'not in ' + last_sheet
+            })
             final_df.to_csv(final_dropped_file, index=False, encoding='utf-8-sig')
 
             f.write(f"\n詳細は以下のファイルを参照:\n")
             f.write(f"  - 全インデックス落ち: {output_file}\n")
             f.write(f"  - 最終インデックス落ち: {final_dropped_file}\n")
 
+        step.wrote(summary_file)
+        step.wrote(final_dropped_file)
+        files.record_output(output_file, files.INDEX_DROPS, inputs=[input_file], rows=len(df_results))
+        files.record_output(final_dropped_file, files.INDEX_DROPS_FINAL, inputs=[input_file], rows=len(final_df))
+        files.record_output(summary_file, files.INDEX_DROPS_SUMMARY, inputs=[output_file, final_dropped_file])
         print(f"✓ サマリーレポートを保存: {summary_file}")
         print(f"✓ 最終インデックス落ち一覧を保存: {final_dropped_file}")
     else:
         print("\nインデックス落ちは検出されませんでした")
 
-    return results
+    return df_results
 
 if __name__ == "__main__":
+    profile_flag_from_argv()
+
     try:
-        results = analyze_index_drops(INPUT_FILE, OUTPUT_DIR)
+        results = stages.index_drops(INPUT_FILE, OUTPUT_DIR, TIMELINE_FILE)
         print(f"\n✓ インデックス落ち分析が完了しました")
     except Exception as e:
         print(f"\nエラー: {e}")
@@ -1,15 +1,23 @@
-import pandas as pd
-import numpy as np
 from datetime import datetime, timedelta
 from pathlib import Path
 import os
-import glob
+
+from lazy_imports import lazy_import
+from rhash_codec import to_rhash_category
+from category_index import attach_categories, hash_index_from_frame, HASH_VALUE_COLUMNS
+from profiling import profile_flag_from_argv
+from seo_etl import files, stages
+from stage_metrics import current_stage, instrumented
+
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
 
 # 設定
 SEARCH_CONSOLE_DIR = './data/search_console'
 OUTPUT_DIR = './data/analysis'
 MONTHS_TO_ANALYZE = 3  # 直近3ヶ月
 
+@instrumented()
 def analyze_search_console_trends_simple(input_dir, output_dir):
     """
     Search Consoleデータから前週→今週の順位変化を分析（シンプル版）
@@ -23,26 +31,22 @@ def analyze_search_console_trends_simple(input_dir, output_dir):
     print("="*80)
 
     # 最新のファイルを取得
-    csv_files = sorted(glob.glob(os.path.join(input_dir, 'search_console_weekly_*.csv')))
+    latest_file = files.latest_output(files.SEARCH_CONSOLE_WEEKLY, input_dir)
 
-    if not csv_files:
+    if not latest_file:
         print(f"エラー: {input_dir}にSearch Consoleデータが見つかりません")
         return
 
-    latest_file = csv_files[-1]
     print(f"\n使用するファイル: {latest_file}")
 
     # データを読み込み
     df = pd.read_csv(latest_file)
     print(f"データ読み込み完了: {len(df):,}行")
 
-    # CSVにquery_keyword, query_location, categoryがない場合は空の列を追加
-    if 'query_keyword' not in df.columns:
-        df['query_keyword'] = ''
-    if 'query_location' not in df.columns:
-        df['query_location'] = ''
-    if 'category' not in df.columns:
-        df['category'] = ''
+    # キーワード・地域・カテゴリを付与（CSVに値がない行だけカテゴリインデックスから補完）
+    hash_col = 'query_hash' if 'query_hash' in df.columns else 'r_hash'
+    df = attach_categories(df, hash_col=hash_col)
+    df[['query_keyword', 'query_location', 'category']] = df[['query_keyword', 'query_location', 'category']].fillna('')
 
     # 順位データをfloat型に変換
     df['avg_position'] = pd.to_numeric(df['avg_position'], errors='coerce')
@@ -284,10 +288,15 @@ def analyze_search_console_trends_simple(input_dir, output_dir):
         df_output = pd.DataFrame(csv_data)
         csv_file = os.path.join(output_dir, f"search_console_trends_{timestamp}.csv")
         df_output.to_csv(csv_file, index=False, encoding='utf-8-sig')
+        files.record_output(csv_file, files.SEARCH_CONSOLE_TRENDS, params={'mode': 'simple'},
+                            inputs=[latest_file], rows=len(df_output))
         print(f"✓ CSV出力を保存しました: {csv_file}")
 
+    files.record_output(report_file, files.SEARCH_CONSOLE_TRENDS_REPORT, params={'mode': 'simple'},
+                        inputs=[latest_file])
     return report_file
 
+@instrumented()
 def analyze_search_console_trends(input_dir, output_dir, months=3):
     """
     Search Consoleデータから順位推移の傾向を分析
@@ -302,70 +311,54 @@ def analyze_search_console_trends(input_dir, output_dir, months=3):
     print("="*80)
 
     # 複数の週次ファイルを取得
-    csv_files = sorted(glob.glob(os.path.join(input_dir, 'search_console_weekly_*.csv')))
+    # 直近N週分のファイルを読み込み
+    weeks_to_analyze = months * 4  # 約3ヶ月 = 12週
+    files_to_use = files.latest_outputs(files.SEARCH_CONSOLE_WEEKLY, weeks_to_analyze, input_dir)
 
-    if not csv_files:
+    if not files_to_use:
         print(f"エラー: {input_dir}にSearch Consoleデータが見つかりません")
         return
 
-    # 直近N週分のファイルを読み込み
-    weeks_to_analyze = months * 4  # 約3ヶ月 = 12週
-    files_to_use = csv_files[-min(weeks_to_analyze, len(csv_files)):]
-
     print(f"\n使用するファイル数: {len(files_to_use)}件")
     for f in files_to_use:
         print(f"  - {os.path.basename(f)}")
 
+    metrics = current_stage()
+
     # 複数ファイルを結合
+    step = metrics.step('load')
     df_list = []
-    mapping_df = None
-
-    # まず最新のファイルからマッピング情報を取得
-    for file in reversed(files_to_use):
-        df_temp = pd.read_csv(file)
-
-        # r_hashをquery_hashにリネーム
-        if 'r_hash' in df_temp.columns and 'query_hash' not in df_temp.columns:
-            df_temp = df_temp.rename(columns={'r_hash': 'query_hash'})
-
-        # query_keyword, query_location, categoryがあるファイルからマッピングを作成
-        if 'query_keyword' in df_temp.columns and 'query_location' in df_temp.columns and 'category' in df_temp.columns:
-            mapping_df = df_temp[['query_hash', 'query_keyword', 'query_location', 'category']].drop_duplicates(subset=['query_hash'])
-            print(f"\nマッピング情報を取得: {os.path.basename(file)} ({len(mapping_df):,}件)")
-            break
-
-    # 各ファイルを読み込み
     for file in files_to_use:
         df_temp = pd.read_csv(file)
+        step.read(file)
         df_temp['week_start'] = pd.to_datetime(df_temp['week_start'])
 
         # r_hashをquery_hashにリネーム（古いファイル対応）
         if 'r_hash' in df_temp.columns and 'query_hash' not in df_temp.columns:
             df_temp = df_temp.rename(columns={'r_hash': 'query_hash'})
 
-        # CSVにquery_keyword, query_location, categoryがない場合
-        if 'query_keyword' not in df_temp.columns or 'query_location' not in df_temp.columns or 'category' not in df_temp.columns:
-            if mapping_df is not None:
-                # マッピング情報があれば結合
-                df_temp = df_temp.merge(
-                    mapping_df,
-                    on='query_hash',
-                    how='left'
-                )
-            else:
-                # マッピング情報がない場合は空の列を追加
-                if 'query_keyword' not in df_temp.columns:
-                    df_temp['query_keyword'] = ''
-                if 'query_location' not in df_temp.columns:
-                    df_temp['query_location'] = ''
-                if 'category' not in df_temp.columns:
-                    df_temp['category'] = ''
-
         df_list.append(df_temp)
 
+    # query_keyword・query_location・categoryがある最新のファイル（列がない古いファイルの補完元）
+    latest_labeled = next((df_temp for df_temp in reversed(df_list)
+                           if set(HASH_VALUE_COLUMNS) <= set(df_temp.columns)), None)
+
     df = pd.concat(df_list, ignore_index=True)
+    step.rows_out = metrics.rows_in = len(df)
     print(f"\nデータ読み込み完了: {len(df):,}行")
 
+    # キーワード・地域・カテゴリを付与（CSVに値がない行だけカテゴリインデックスから補完）
+    step = metrics.step('coerce', rows_in=len(df))
+    # 最新のファイルの値を先に補い（query_category_master.csvがない場合もクエリの系列が分かれないように）、
+    # 残りをquery_category_master.csvのインデックスから補う
+    if latest_labeled is not None:
+        df = attach_categories(df, hash_col='query_hash', index=hash_index_from_frame(latest_labeled))
+    df = attach_categories(df, hash_col='query_hash')
+    df[['query_keyword', 'query_location', 'category']] = df[['query_keyword', 'query_location', 'category']].fillna('')
+
+    # query_hashを辞書エンコード（重複除去・グループ化を整数コード上で行う）
+    df['query_hash'] = to_rhash_category(df['query_hash'])
+
     # 重複を除去（query_hash + week_startで一意）
     df = df.drop_duplicates(subset=['query_hash', 'week_start'], keep='last')
     print(f"重複除去後: {len(df):,}行")
@@ -384,10 +377,20 @@ def analyze_search_console_trends(input_dir, output_dir, months=3):
     df_recent['avg_position'] = pd.to_numeric(df_recent['avg_position'], errors='coerce')
     df_recent['prev_position'] = pd.to_numeric(df_recent['prev_position'], errors='coerce')
 
-    # クエリごとに時系列データを作成
+    step.rows_out = len(df_recent)
+
+    # クエリごとに時系列データを作成（キーはquery_hashの辞書コード）
+    step = metrics.step('groupby', rows_in=len(df_recent))
     query_trends = {}
+    query_hash_values = df_recent['query_hash'].cat.categories
+    query_hash_codes = df_recent['query_hash'].cat.codes.rename('query_hash_code')
 
-    for (query_hash, query_keyword, query_location, category), group in df_recent.groupby(['query_hash', 'query_keyword', 'query_location', 'category']):
+    for (query_hash_code, query_keyword, query_location, category), group in df_recent.groupby(
+        [query_hash_codes, 'query_keyword', 'query_location', 'category']
+    ):
+        if query_hash_code < 0:
+            continue
+        query_hash = query_hash_values[query_hash_code]
         group = group.sort_values('week_start')
 
         # 順位の推移を記録
@@ -405,7 +408,7 @@ def analyze_search_console_trends(input_dir, output_dir, months=3):
 
         # データポイントが2つ以上ある場合のみ分析
         if len(positions) >= 2:
-            query_trends[query_hash] = {
+            query_trends[query_hash_code] = {
                 'query_keyword': query_keyword,
                 'query_location': query_location,
                 'query_hash': query_hash,
@@ -419,9 +422,11 @@ def analyze_search_console_trends(input_dir, output_dir, months=3):
                 'data_points': len(positions)
             }
 
+    step.rows_out = len(query_trends)
     print(f"\n分析対象クエリ数: {len(query_trends):,}件")
 
     # 4つの傾向を分類
+    step = metrics.step('classify', rows_in=len(query_trends))
     print("\n" + "="*80)
     print("傾向分析")
     print("="*80)
@@ -483,8 +488,10 @@ def analyze_search_console_trends(input_dir, output_dir, months=3):
     print(f"【2. 順位が11位以上から10位以下に上昇】: {len(jumped_to_top10)}件")
     print(f"【3. 順位が徐々に下降しているもの】: {len(gradually_declining)}件")
     print(f"【4. 順位が徐々に上昇しているもの】: {len(gradually_improving)}件")
+    step.rows_out = len(dropped_from_top10) + len(jumped_to_top10) + len(gradually_declining) + len(gradually_improving)
 
     # レポート生成
+    step = metrics.step('write')
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     Path(output_dir).mkdir(parents=True, exist_ok=True)
 
@@ -685,14 +692,23 @@ def analyze_search_console_trends(input_dir, output_dir, months=3):
         df_output = pd.DataFrame(csv_data)
         csv_file = os.path.join(output_dir, f"search_console_trends_{timestamp}.csv")
         df_output.to_csv(csv_file, index=False, encoding='utf-8-sig')
+        step.wrote(csv_file)
+        files.record_output(csv_file, files.SEARCH_CONSOLE_TRENDS, params={'months': months},
+                            inputs=files_to_use, rows=len(df_output))
         print(f"✓ CSV出力を保存しました: {csv_file}")
 
+    step.wrote(report_file)
+    files.record_output(report_file, files.SEARCH_CONSOLE_TRENDS_REPORT, params={'months': months},
+                        inputs=files_to_use)
+    metrics.rows_out = len(csv_data)
     return report_file
 
 if __name__ == "__main__":
+    profile_flag_from_argv()
+
     try:
         # 複数週のデータを使った時系列分析を実行
-        report_file = analyze_search_console_trends(SEARCH_CONSOLE_DIR, OUTPUT_DIR, MONTHS_TO_ANALYZE)
+        report_file = stages.search_console_trends(SEARCH_CONSOLE_DIR, OUTPUT_DIR, MONTHS_TO_ANALYZE)
         print(f"\n✓ Search Console順位推移分析が完了しました")
     except Exception as e:
         print(f"\nエラー: {e}")
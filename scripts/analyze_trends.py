@@ -1,89 +1,161 @@
-import pandas as pd
-import numpy as np
-from datetime import datetime, timedelta
+from __future__ import annotations
+
 import os
-import glob
 from pathlib import Path
 
-def calculate_weekly_changes(df: pd.DataFrame, weeks: int = 12):
+from lazy_imports import lazy_import
+from profiling import profile_flag_from_argv
+from seo_etl import stages
+from stage_metrics import stage
+
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+
+# マージ済みデータの列名 → 分析で使う列名
+RANK_COLUMNS = {
+    'キーワード': 'keyword',
+    'URL': 'url',
+    'ランク': 'rank',
+    '距離': 'distance'
+}
+
+# prepare_rank_frame済みであることを示すDataFrame.attrsのキー
+RANK_FRAME_ATTR = 'rank_frame'
+
+def _downcast_numeric(values: pd.Series) -> pd.Series:
+    """数値列を値が変わらない範囲で小さい型に変換（整数は整数型のまま、小数はfloat32に収まる場合のみ）"""
+    if values.dtype.kind in 'iu':
+        return pd.to_numeric(values, downcast='integer')
+
+    narrowed = values.astype(np.float32)
+    if (narrowed.astype(np.float64) == values).all():
+        return narrowed
+    return values
+
+def _compute_values(values: pd.Series) -> np.ndarray:
+    """計算用にint64 / float64へ戻した配列（元の型と同じ計算結果になるように）"""
+    return values.to_numpy(dtype=np.int64 if values.dtype.kind in 'iu' else np.float64)
+
+def prepare_rank_frame(df: pd.DataFrame) -> pd.DataFrame:
     """
-    期間ごとの順位と距離の差分、変化率を計算する
+    分析用の順位データ（prepared rank frame）を作成
 
-    注: 週次データの場合は週次比較、日次データの場合は日次比較として動作します。
+    列名の統一・型変換・欠損行の除外・ソートを1回だけ行い、
+    calculate_weekly_changes と analyze_trends_over_period で共有します。
+
+    - 列: date, keyword, url, rank, distance
+    - keyword / url はソート済みカテゴリのcategory型
+    - rank / distance は値が変わらない範囲で小さい数値型に変換
+    - keyword, url, date の順にソート済み
 
     Args:
         df: マージされたデータフレーム（date, キーワード, URL, ランク, 距離カラムを含む）
-        weeks: 遡る期間数（デフォルト12期間=週次なら3ヶ月分）
 
     Returns:
-        変化率と差分を含むデータフレーム
+        分析用のデータフレーム（既に作成済みのものを渡した場合はそのまま返す）
     """
-    # カラム名を英語にマッピング
-    df = df.rename(columns={
-        'キーワード': 'keyword',
-        'URL': 'url',
-        'ランク': 'rank',
-        '距離': 'distance'
-    })
+    if df.attrs.get(RANK_FRAME_ATTR):
+        return df
 
-    # データ型を変換
-    df['rank'] = pd.to_numeric(df['rank'], errors='coerce')
-    df['distance'] = pd.to_numeric(df['distance'], errors='coerce')
+    columns = {RANK_COLUMNS.get(col, col): col for col in df.columns}
 
-    # 日付カラムをdatetime型に変換
-    df['date'] = pd.to_datetime(df['date'])
+    rank = pd.to_numeric(df[columns['rank']], errors='coerce')
+    distance = pd.to_numeric(df[columns['distance']], errors='coerce')
+    keyword = df[columns['keyword']]
+    url = df[columns['url']]
 
-    # NaNを含む行を除外
-    df = df.dropna(subset=['rank', 'distance'])
+    # 順位・距離が数値でない行と、キーワード・URLがない行を除外
+    valid = (rank.notna() & distance.notna() & keyword.notna() & url.notna()).to_numpy()
 
-    # データを日付順にソート
-    df = df.sort_values(['keyword', 'url', 'date'])
+    frame = pd.DataFrame({
+        'date': pd.to_datetime(df[columns['date']][valid]),
+        'keyword': pd.Categorical(keyword[valid]),
+        'url': pd.Categorical(url[valid]),
+        'rank': _downcast_numeric(rank[valid]),
+        'distance': _downcast_numeric(distance[valid]),
+    })
 
-    # keyword + url で グループ化
-    df['key'] = df['keyword'] + '_' + df['url']
+    # カテゴリはソート済みのため、コード順のソートが文字列順のソートと一致する
+    frame = frame.sort_values(['keyword', 'url', 'date'], kind='stable', ignore_index=True)
+    frame.attrs[RANK_FRAME_ATTR] = True
 
-    results = []
+    return frame
 
-    for key, group in df.groupby('key'):
-        group = group.sort_values('date').reset_index(drop=True)
+def _group_starts(frame: pd.DataFrame) -> np.ndarray:
+    """prepared rank frameで各（keyword, url）グループの先頭行ならTrue"""
+    keyword_codes = frame['keyword'].cat.codes.to_numpy()
+    url_codes = frame['url'].cat.codes.to_numpy()
 
-        # 最新のweeks週分のデータのみ使用
-        if len(group) > weeks:
-            group = group.tail(weeks)
+    starts = np.ones(len(frame), dtype=bool)
+    starts[1:] = (keyword_codes[1:] != keyword_codes[:-1]) | (url_codes[1:] != url_codes[:-1])
+    return starts
 
-        for i in range(1, len(group)):
-            current = group.iloc[i]
-            previous = group.iloc[i-1]
+def _change_rate(diff: np.ndarray, previous: np.ndarray) -> np.ndarray:
+    """変化率（%、小数2桁）。前回値が0の場合は0"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = np.where(previous != 0, diff / previous * 100, 0)
+    return np.round(rate, 2)
 
-            # 前週との差分を計算
-            rank_diff = current['rank'] - previous['rank']
-            distance_diff = current['distance'] - previous['distance']
+def calculate_weekly_changes(df: pd.DataFrame, weeks: int = 12):
+    """
+    期間ごとの順位と距離の差分、変化率を計算する
 
-            # 変化率を計算（0除算を避ける）
-            rank_change_rate = (rank_diff / previous['rank'] * 100) if previous['rank'] != 0 else 0
-            distance_change_rate = (distance_diff / previous['distance'] * 100) if previous['distance'] != 0 else 0
+    注: 週次データの場合は週次比較、日次データの場合は日次比較として動作します。
+    日次データを週次・月次で比較する場合は、rank_rollups.period_changes で週・月ごとに
+    集約したロールアップから計算してください（stages.weekly_analysis は自動で切り替えます）。
 
-            # 週単位の経過
-            weeks_elapsed = (current['date'] - previous['date']).days // 7
+    Args:
+        df: マージされたデータフレーム（date, キーワード, URL, ランク, 距離カラムを含む）
+            またはprepare_rank_frameで作成したデータフレーム
+        weeks: 遡る期間数（デフォルト12期間=週次なら3ヶ月分）
 
-            result = {
-                'date': current['date'],
-                'keyword': current['keyword'],
-                'url': current['url'],
-                'current_rank': current['rank'],
-                'previous_rank': previous['rank'],
-                'rank_diff': rank_diff,
-                'rank_change_rate': round(rank_change_rate, 2),
-                'current_distance': current['distance'],
-                'previous_distance': previous['distance'],
-                'distance_diff': round(distance_diff, 2),
-                'distance_change_rate': round(distance_change_rate, 2),
-                'weeks_elapsed': weeks_elapsed,
-            }
+    Returns:
+        変化率と差分を含むデータフレーム
+    """
+    frame = prepare_rank_frame(df)
+
+    # 最新のweeks週分のデータのみ使用
+    recent_mask = frame.groupby(['keyword', 'url'], observed=True, sort=False).cumcount(ascending=False) < weeks
+    recent = frame[recent_mask.to_numpy()]
+
+    # 各グループの2行目以降を「今週」、その1つ前の行を「前週」とする
+    starts = _group_starts(recent)
+    current_idx = np.flatnonzero(~starts)
+    previous_idx = current_idx - 1
+
+    rank = _compute_values(recent['rank'])
+    distance = _compute_values(recent['distance'])
+    dates = recent['date'].to_numpy()
+
+    # 前週との差分を計算
+    rank_diff = rank[current_idx] - rank[previous_idx]
+    distance_diff = distance[current_idx] - distance[previous_idx]
+
+    result = pd.DataFrame({
+        'date': dates[current_idx],
+        'keyword': recent['keyword'].array.take(current_idx),
+        'url': recent['url'].array.take(current_idx),
+        'current_rank': rank[current_idx],
+        'previous_rank': rank[previous_idx],
+        'rank_diff': rank_diff,
+        'rank_change_rate': _change_rate(rank_diff, rank[previous_idx]),
+        'current_distance': distance[current_idx],
+        'previous_distance': distance[previous_idx],
+        'distance_diff': np.round(distance_diff, 2),
+        'distance_change_rate': _change_rate(distance_diff, distance[previous_idx]),
+        # 週単位の経過
+        'weeks_elapsed': (dates[current_idx] - dates[previous_idx]) // np.timedelta64(7, 'D'),
+    })
 
-            results.append(result)
+    # 出力順は従来どおり「キーワード_URL」の文字列順（同じキー内は日付順）
+    group_ids = np.cumsum(starts) - 1
+    pairs = recent[starts]
+    pair_keys = (pairs['keyword'].astype(str) + '_' + pairs['url'].astype(str)).to_numpy()
+    pair_rank = np.empty(len(pair_keys), dtype=np.intp)
+    pair_rank[np.argsort(pair_keys, kind='stable')] = np.arange(len(pair_keys))
+    order = np.argsort(pair_rank[group_ids[current_idx]], kind='stable')
 
-    return pd.DataFrame(results)
+    return result.iloc[order].reset_index(drop=True)
 
 def analyze_trends_over_period(df: pd.DataFrame, min_data_points: int = 5):
     """
@@ -91,81 +163,63 @@ def analyze_trends_over_period(df: pd.DataFrame, min_data_points: int = 5):
 
     Args:
         df: 元のデータフレーム（date, keyword, url, rank, distanceカラムを含む）
+            またはprepare_rank_frameで作成したデータフレーム
         min_data_points: 分析に必要な最小データポイント数
 
     Returns:
         継続的改善/悪化キーワードのリスト
     """
-    # カラム名を統一
-    if 'キーワード' in df.columns:
-        df = df.rename(columns={'キーワード': 'keyword', 'URL': 'url', 'ランク': 'rank', '距離': 'distance'})
-
-    df['rank'] = pd.to_numeric(df['rank'], errors='coerce')
-    df['distance'] = pd.to_numeric(df['distance'], errors='coerce')
-    df['date'] = pd.to_datetime(df['date'])
-    df = df.dropna(subset=['rank', 'distance'])
-    df = df.sort_values(['keyword', 'url', 'date'])
-
-    trends = []
-
-    for (keyword, url), group in df.groupby(['keyword', 'url']):
-        group = group.sort_values('date').reset_index(drop=True)
-
-        # データポイントが少ない場合はスキップ
-        if len(group) < min_data_points:
-            continue
-
-        # 最初と最後の順位
-        first_rank = group.iloc[0]['rank']
-        last_rank = group.iloc[-1]['rank']
-        total_change = last_rank - first_rank
+    frame = prepare_rank_frame(df)
+
+    starts = _group_starts(frame)
+    start_idx = np.flatnonzero(starts)
+    group_ids = np.cumsum(starts) - 1
+    sizes = np.diff(np.append(start_idx, len(frame)))
+    end_idx = start_idx + sizes - 1
+
+    rank = _compute_values(frame['rank'])
+    dates = frame['date'].to_numpy()
+
+    # 線形回帰の傾き（正＝悪化、負＝改善）: x = グループ内の位置(0, 1, 2, ...)
+    x = np.arange(len(frame)) - start_idx[group_ids]
+    x_centered = x - (sizes[group_ids] - 1) / 2
+    sxy = np.bincount(group_ids, weights=x_centered * rank, minlength=len(sizes))
+    sxx = sizes * (sizes.astype(np.float64) ** 2 - 1) / 12
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where(sizes > 1, sxy / sxx, 0.0)
+
+    # 単調性チェック（連続して改善/悪化している回数）
+    diff = np.zeros(len(frame), dtype=rank.dtype)
+    diff[1:] = rank[1:] - rank[:-1]
+    diff[starts] = 0
+    improvements = np.bincount(group_ids, weights=diff < 0, minlength=len(sizes)).astype(np.int64)
+    deteriorations = np.bincount(group_ids, weights=diff > 0, minlength=len(sizes)).astype(np.int64)
+
+    # 一貫性スコア（-1〜1、負＝改善傾向、正＝悪化傾向）
+    total_changes = improvements + deteriorations
+    with np.errstate(divide='ignore', invalid='ignore'):
+        consistency_score = np.where(total_changes > 0, (deteriorations - improvements) / total_changes, 0.0)
+
+    trends = pd.DataFrame({
+        'keyword': frame['keyword'].array.take(start_idx),
+        'url': frame['url'].array.take(start_idx),
+        'first_date': dates[start_idx],
+        'last_date': dates[end_idx],
+        'first_rank': rank[start_idx],
+        'last_rank': rank[end_idx],
+        'total_change': rank[end_idx] - rank[start_idx],
+        'slope': slope,
+        'improvements': improvements,
+        'deteriorations': deteriorations,
+        'consistency_score': consistency_score,
+        'data_points': sizes,
+    })
 
-        # 線形回帰で傾向を計算
-        x = np.arange(len(group))
-        y = group['rank'].values
+    # データポイントが少ない場合は除外
+    return trends[sizes >= min_data_points].reset_index(drop=True)
 
-        # 傾き（正＝悪化、負＝改善）
-        if len(x) > 1:
-            slope = np.polyfit(x, y, 1)[0]
-        else:
-            slope = 0
-
-        # 単調性チェック（連続して改善/悪化している回数）
-        improvements = 0
-        deteriorations = 0
-
-        for i in range(1, len(group)):
-            diff = group.iloc[i]['rank'] - group.iloc[i-1]['rank']
-            if diff < 0:  # 改善
-                improvements += 1
-            elif diff > 0:  # 悪化
-                deteriorations += 1
-
-        # 一貫性スコア（-1〜1、負＝改善傾向、正＝悪化傾向）
-        total_changes = improvements + deteriorations
-        if total_changes > 0:
-            consistency_score = (deteriorations - improvements) / total_changes
-        else:
-            consistency_score = 0
-
-        trends.append({
-            'keyword': keyword,
-            'url': url,
-            'first_date': group.iloc[0]['date'],
-            'last_date': group.iloc[-1]['date'],
-            'first_rank': first_rank,
-            'last_rank': last_rank,
-            'total_change': total_change,
-            'slope': slope,
-            'improvements': improvements,
-            'deteriorations': deteriorations,
-            'consistency_score': consistency_score,
-            'data_points': len(group)
-        })
-
-    return pd.DataFrame(trends)
-
-def generate_insights(analysis_df: pd.DataFrame, original_df: pd.DataFrame = None, output_file: str = None):
+def generate_insights(analysis_df: pd.DataFrame, original_df: pd.DataFrame = None, output_file: str = None,
+                      trends_df: pd.DataFrame = None):
     """
     分析データから主要な示唆を生成（期間全体の推移ベース）
 
@@ -173,6 +227,7 @@ def generate_insights(analysis_df: pd.DataFrame, original_df: pd.DataFrame = Non
         analysis_df: 分析済みデータフレーム（週次変化）
         original_df: 元のデータフレーム（推移分析用）
         output_file: 示唆を保存するファイル名（Noneの場合は保存しない）
+        trends_df: 推移分析の結果（trend_state.trend_featuresで作成したもの。Noneの場合はoriginal_dfから計算）
     """
     insights = []
 
@@ -180,9 +235,13 @@ def generate_insights(analysis_df: pd.DataFrame, original_df: pd.DataFrame = Non
     insights.append(f"分析期間: {analysis_df['date'].min().strftime('%Y-%m-%d')} ～ {analysis_df['date'].max().strftime('%Y-%m-%d')}\n")
     insights.append(f"総データ数: {len(analysis_df)}件\n")
 
-    # 推移分析（元データがある場合）
-    if original_df is not None:
-        trends_df = analyze_trends_over_period(original_df, min_data_points=5)
+    # 推移分析（増分更新した特徴量、または元データから計算）
+    if trends_df is None and original_df is not None:
+        with stage('trends_over_period') as step:
+            trends_df = analyze_trends_over_period(original_df, min_data_points=5)
+            step.rows_in, step.rows_out = len(original_df), len(trends_df)
+
+    if trends_df is not None:
 
         # 継続的に改善しているキーワード（負の傾きが大きく、一貫性が高い）
         improving = trends_df[
@@ -262,74 +321,11 @@ def generate_insights(analysis_df: pd.DataFrame, original_df: pd.DataFrame = Non
     return report
 
 if __name__ == "__main__":
-    # マージ済みデータを読み込み（最新のファイルを自動検出）
-    processed_folder = "./data/processed"
-    csv_files = sorted(glob.glob(os.path.join(processed_folder, "merged_data_*.csv")))
+    profile_flag_from_argv()
 
-    if not csv_files:
-        print(f"エラー: {processed_folder}にマージ済みファイルが見つかりません。先にmerge_data.pyを実行してください。")
+    try:
+        # マージ済みデータを読み込み（最新のファイルを自動検出）
+        stages.analyze_seo(weeks=12)
+    except FileNotFoundError as e:
+        print(f"エラー: {e}")
         exit(1)
-
-    input_file = csv_files[-1]  # 最新のファイルを使用
-    print(f"使用するファイル: {input_file}")
-
-    df = pd.read_csv(input_file)
-    print(f"データ読み込み完了: {len(df)}行")
-
-    # カテゴリマッピングを読み込み
-    category_mapping_file = "./data/category_mapping.csv"
-    if os.path.exists(category_mapping_file):
-        print(f"カテゴリマッピングを読み込み中: {category_mapping_file}")
-        category_df = pd.read_csv(category_mapping_file)
-        print(f"カテゴリマッピング: {len(category_df)}行")
-
-        # キーワード列を統一
-        if 'キーワード' in df.columns:
-            keyword_col = 'キーワード'
-        else:
-            keyword_col = 'keyword'
-
-        # カテゴリ情報をマージ
-        df = df.merge(
-            category_df[['キーワード', 'カテゴリ', 'Groups']],
-            left_on=keyword_col,
-            right_on='キーワード',
-            how='left'
-        )
-        print(f"カテゴリ情報をマージ完了")
-        print(f"カテゴリがマッチしたキーワード数: {df['カテゴリ'].notna().sum()}件")
-    else:
-        print(f"警告: カテゴリマッピングファイルが見つかりません: {category_mapping_file}")
-
-    # 週次変化を計算（3ヶ月 = 12週）
-    analysis_df = calculate_weekly_changes(df, weeks=12)
-
-    # カテゴリ情報を分析結果にもマージ
-    if 'カテゴリ' in df.columns:
-        # キーワード列を確認
-        if 'キーワード' in df.columns:
-            df_category = df[['キーワード', 'URL', 'カテゴリ', 'Groups']].drop_duplicates()
-        else:
-            df_category = df[['keyword', 'url', 'カテゴリ', 'Groups']].drop_duplicates()
-            df_category = df_category.rename(columns={'keyword': 'キーワード', 'url': 'URL'})
-
-        analysis_df = analysis_df.merge(
-            df_category,
-            left_on=['keyword', 'url'],
-            right_on=['キーワード', 'URL'],
-            how='left'
-        )
-        print(f"分析結果にカテゴリ情報をマージ: {analysis_df['カテゴリ'].notna().sum()}件マッチ")
-
-    # 分析結果を保存
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_folder = "./data/analysis"
-    Path(output_folder).mkdir(parents=True, exist_ok=True)
-
-    analysis_output = os.path.join(output_folder, f"weekly_analysis_{timestamp}.csv")
-    analysis_df.to_csv(analysis_output, index=False, encoding='utf-8-sig')
-    print(f"分析結果を保存: {analysis_output}")
-
-    # 示唆レポートを生成（元データも渡して推移分析を行う）
-    insights_output = os.path.join(output_folder, f"insights_report_{timestamp}.txt")
-    generate_insights(analysis_df, original_df=df, output_file=insights_output)
@@ -0,0 +1,569 @@
+"""
+合成データによるパイプラインのベンチマーク
+
+本番のDrive / BigQueryのデータがなくても各分析ステージの処理時間とメモリを測れるよう、
+指定した規模の合成データを一時ディレクトリに生成し、ステージごとに計測します。
+
+生成するデータ:
+- 順位エクスポート（キーワード, URL, ランク, 距離）の週次CSV
+- search_console_weekly_*.csv（週ごとに一部のr_hashが入れ替わる）
+- site:検索結果の複数シート構成のExcelブック
+- カテゴリマッピング（category_mapping.csv）
+
+結果は data/benchmark/benchmark_<タイムスタンプ>.json に保存され、
+--compare で以前の結果（別コミットでの実行結果など）と比較できます。
+
+使い方:
+    python scripts/benchmark.py                       # 標準規模で実行
+    python scripts/benchmark.py --scale 5 --repeat 3  # 5倍の規模で3回ずつ計測
+    python scripts/benchmark.py --compare data/benchmark/benchmark_20250101_000000.json
+"""
+import os
+import io
+import gc
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+import contextlib
+from datetime import datetime, timedelta
+
+
+from lazy_imports import lazy_import
+from rhash_codec import RHASH_KEY_DTYPE, keys_to_hex
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(SCRIPTS_DIR)
+RESULTS_DIR = os.path.join(REPO_DIR, 'data', 'benchmark')
+
+# scale=1 の規模（--scaleの倍率を掛けて使用）
+BASE_SIZES = {
+    'keywords': 2000,
+    'search_console_hashes': 20000,
+    'site_hashes': 20000,
+}
+
+URLS_PER_KEYWORD = 3
+
+DEFAULT_WEEKS = 26
+DEFAULT_SEARCH_CONSOLE_WEEKS = 12
+DEFAULT_SITE_SHEETS = 4
+DEFAULT_CHURN = 0.1
+DEFAULT_SEED = 42
+
+START_DATE = datetime(2025, 1, 6)  # 月曜日
+CATEGORIES = ['営業', '看護', '介護', '事務', '販売', '製造', '物流', '飲食']
+LOCATIONS = ['東京', '大阪', '名古屋', '福岡', '札幌']
+
+# 比較時に悪化とみなす変化率（%）と、処理時間の差の下限（短いステージの揺らぎを除くため）
+REGRESSION_THRESHOLD = 10.0
+REGRESSION_MIN_SEC = 0.05
+
+
+def _random_hashes(rng, n):
+    """32桁の16進文字列のr_hashをn件生成"""
+    return keys_to_hex(rng.integers(0, 256, size=(n, 16), dtype=np.uint8).view(RHASH_KEY_DTYPE).ravel())
+
+
+def generate_rank_exports(raw_dir, keywords, urls_per_keyword, weeks, rng):
+    """
+    順位エクスポート（キーワード, URL, ランク, 距離）の週次CSVを生成
+
+    Returns:
+        生成したファイル数
+    """
+    os.makedirs(raw_dir, exist_ok=True)
+
+    keyword_names = np.array([f'キーワード{i}' for i in range(keywords)], dtype=object)
+    urls = 'https://jp.stanby.com/r_' + _random_hashes(rng, keywords * urls_per_keyword)
+    row_keywords = np.repeat(keyword_names, urls_per_keyword)
+
+    base_rank = rng.integers(1, 80, len(urls))
+    for week in range(weeks):
+        date = (START_DATE + timedelta(weeks=week)).strftime('%Y-%m-%d')
+
+        # 順位は前週からの小さな変動にし、一部は圏外（'-'）にする
+        base_rank = np.clip(base_rank + rng.integers(-3, 4, len(urls)), 1, 100)
+        rank = base_rank.astype(object)
+        rank[rng.random(len(urls)) < 0.1] = '-'
+
+        # 週ごとに一部のキーワードは取得されない
+        present = rng.random(len(urls)) > 0.05
+        pd.DataFrame({
+            'キーワード': row_keywords[present],
+            'URL': urls[present],
+            'ランク': rank[present],
+            '距離': rng.integers(0, 100, len(urls))[present],
+        }).to_csv(os.path.join(raw_dir, f'Site_benchmark_キーワード_{date}_{date}.csv'), index=False)
+
+    return weeks
+
+
+def generate_category_mapping(mapping_file, keywords, rng):
+    """キーワード → カテゴリ・Groups のマッピング（一部のキーワードは未登録）を生成"""
+    os.makedirs(os.path.dirname(mapping_file), exist_ok=True)
+
+    n = int(keywords * 0.9)
+    pd.DataFrame({
+        'キーワード': [f'キーワード{i}' for i in range(n)],
+        'カテゴリ': rng.choice(CATEGORIES, n),
+        'Groups': rng.choice(['g1', 'g2', 'g3'], n),
+    }).to_csv(mapping_file, index=False, encoding='utf-8-sig')
+
+
+def generate_search_console_weekly(search_console_dir, hashes, weeks, churn, rng):
+    """
+    search_console_weekly_*.csv を週ごとに生成
+
+    毎週churnの割合のr_hashが新しいものに入れ替わります。
+
+    Returns:
+        生成したファイル数
+    """
+    os.makedirs(search_console_dir, exist_ok=True)
+
+    current = _random_hashes(rng, hashes)
+    keywords = np.array([f'キーワード{k}' for k in rng.integers(0, max(hashes // 10, 1), hashes)], dtype=object)
+    locations = rng.choice(LOCATIONS, hashes)
+    categories = rng.choice(CATEGORIES, hashes)
+    position = rng.random(hashes) * 50 + 1
+    impressions = rng.integers(50, 5000, hashes)
+    clicks = (impressions * rng.random(hashes) * 0.1).astype(int)
+
+    for week in range(weeks):
+        week_start = START_DATE + timedelta(weeks=week)
+
+        # 入れ替わったr_hashはキーワード・地域・カテゴリはそのままの別ページとして扱う
+        if week > 0:
+            replaced = rng.random(hashes) < churn
+            current[replaced] = _random_hashes(rng, int(replaced.sum()))
+
+        prev_position, prev_impressions, prev_clicks = position, impressions, clicks
+        position = np.clip(position + rng.normal(0, 2, hashes), 1, 100)
+        impressions = np.maximum(impressions + rng.integers(-200, 200, hashes), 0)
+        clicks = np.minimum(np.maximum(clicks + rng.integers(-10, 10, hashes), 0), impressions)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ctr = np.where(impressions > 0, clicks / impressions, 0)
+            prev_ctr = np.where(prev_impressions > 0, prev_clicks / prev_impressions, 0)
+
+        pd.DataFrame({
+            'r_hash': current,
+            'query_keyword': keywords,
+            'query_location': locations,
+            'category': categories,
+            'week_start': week_start.strftime('%Y-%m-%d'),
+            'total_impressions': impressions,
+            'total_clicks': clicks,
+            'avg_ctr': ctr,
+            'avg_position': position.round(),
+            'prev_impressions': prev_impressions,
+            'prev_clicks': prev_clicks,
+            'prev_ctr': prev_ctr,
+            'prev_position': prev_position.round(),
+            'imp_diff': impressions - prev_impressions,
+            'clicks_diff': clicks - prev_clicks,
+            'ctr_diff': ctr - prev_ctr,
+            'position_diff': position.round() - prev_position.round(),
+            'imp_change_rate': np.round((impressions - prev_impressions) / np.maximum(prev_impressions, 1) * 100, 2),
+            'clicks_change_rate': np.round((clicks - prev_clicks) / np.maximum(prev_clicks, 1) * 100, 2),
+            'ctr_change_rate': np.round((ctr - prev_ctr) / np.where(prev_ctr > 0, prev_ctr, 1) * 100, 2),
+            'position_change_rate': np.round((position.round() - prev_position.round()) / prev_position.round() * 100, 2),
+            'days_count': 7,
+        }).to_csv(os.path.join(search_console_dir, f"search_console_weekly_{week_start.strftime('%Y%m%d')}_000000.csv"),
+                  index=False, encoding='utf-8-sig')
+
+    return weeks
+
+
+def generate_site_workbook(workbook_file, hashes, sheets, churn, rng):
+    """
+    site:検索結果のExcelブック（1シート = 1回の取得、url列にr_hash入りURL）を生成
+
+    シートごとにchurnの割合のr_hashがインデックス落ち・新規追加で入れ替わります。
+
+    Returns:
+        生成したシート数
+    """
+    os.makedirs(os.path.dirname(workbook_file), exist_ok=True)
+
+    current = _random_hashes(rng, hashes)
+    with pd.ExcelWriter(workbook_file) as writer:
+        for sheet in range(sheets):
+            if sheet > 0:
+                replaced = rng.random(hashes) < churn
+                current[replaced] = _random_hashes(rng, int(replaced.sum()))
+
+            sheet_name = (START_DATE + timedelta(weeks=sheet)).strftime('%Y%m%d')
+            pd.DataFrame({
+                'keyword': 'site:jp.stanby.com',
+                'url': 'https://jp.stanby.com/r_' + current,
+            }).to_excel(writer, sheet_name=sheet_name, index=False)
+
+    return sheets
+
+
+def generate_dataset(workspace, scale=1.0, weeks=DEFAULT_WEEKS, churn=DEFAULT_CHURN, seed=DEFAULT_SEED):
+    """
+    ベンチマーク用の合成データをworkspace/data以下に生成
+
+    Returns:
+        生成したデータの規模（結果のJSONに記録）
+    """
+    rng = np.random.default_rng(seed)
+    sizes = {name: max(int(value * scale), 1) for name, value in BASE_SIZES.items()}
+
+    data_dir = os.path.join(workspace, 'data')
+    generate_rank_exports(os.path.join(data_dir, 'raw'), sizes['keywords'], URLS_PER_KEYWORD, weeks, rng)
+    generate_category_mapping(os.path.join(data_dir, 'category_mapping.csv'), sizes['keywords'], rng)
+    generate_search_console_weekly(os.path.join(data_dir, 'search_console'), sizes['search_console_hashes'],
+                                   DEFAULT_SEARCH_CONSOLE_WEEKS, churn, rng)
+    generate_site_workbook(os.path.join(data_dir, 'site_benchmark.xlsx'), sizes['site_hashes'],
+                           DEFAULT_SITE_SHEETS, churn, rng)
+
+    sizes.update({
+        'urls_per_keyword': URLS_PER_KEYWORD,
+        'weeks': weeks,
+        'search_console_weeks': DEFAULT_SEARCH_CONSOLE_WEEKS,
+        'site_sheets': DEFAULT_SITE_SHEETS,
+        'churn': churn,
+        'seed': seed,
+        'scale': scale,
+    })
+    return sizes
+
+
+def build_stages():
+    """
+    計測するステージの一覧を作成（作業ディレクトリはベンチマーク用のworkspace）
+
+    各ステージは (名前, 実行関数, 準備関数, 後続が結果を使うか) で、準備関数は計測の前に
+    毎回呼ばれ、前回の実行で作られた出力を消して同じ条件で実行できるようにします（計測対象外）。
+    前のステージの結果はcontextで受け渡します。
+    """
+    from merge_data import merge_weekly_data
+    from analyze_trends import prepare_rank_frame, calculate_weekly_changes, analyze_trends_over_period
+    from category_index import attach_categories
+    import trend_state
+    from analyze_search_console_trends import analyze_search_console_trends
+    from analyze_index_drop import analyze_index_drops
+    from export_for_dify import export_seo_rank_analysis, export_search_console_analysis, export_shards
+
+    context = {}
+
+    def remove(path):
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+
+    def save_weekly_analysis():
+        os.makedirs('./data/analysis', exist_ok=True)
+        analysis_file = './data/analysis/weekly_analysis_benchmark.csv'
+        if not os.path.exists(analysis_file):
+            context['weekly_analysis'].to_csv(analysis_file, index=False, encoding='utf-8-sig')
+
+    def run_merge():
+        context['merged'] = merge_weekly_data('./data/raw', './data/processed',
+                                              ['キーワード', 'URL', 'ランク', '距離', 'date'])
+
+    def run_prepare():
+        context['rank_frame'] = prepare_rank_frame(context['merged'])
+
+    def run_weekly_changes():
+        context['weekly_changes'] = calculate_weekly_changes(context['rank_frame'], weeks=12)
+
+    def run_attach_categories():
+        context['weekly_analysis'] = attach_categories(context['weekly_changes'], keyword_col='keyword')
+
+    def build_previous_trend_state():
+        # 最新の日付を除いた状態（増分更新で最新の週だけを反映する場合の計測用）
+        frame = context['rank_frame']
+        previous = frame[(frame['date'] < frame['date'].max()).to_numpy()]
+        context['trend_state'], _ = trend_state.update_state(trend_state.empty_state(), previous)
+
+    return [
+        ('merge_weekly_data', run_merge, lambda: remove('./data/processed'), True),
+        ('prepare_rank_frame', run_prepare, None, True),
+        ('calculate_weekly_changes', run_weekly_changes, None, True),
+        ('attach_categories', run_attach_categories, None, True),
+        ('analyze_trends_over_period', lambda: analyze_trends_over_period(context['rank_frame'], min_data_points=5),
+         None, False),
+        ('trend_state_rebuild', lambda: trend_state.update_state(trend_state.empty_state(), context['rank_frame']),
+         None, False),
+        ('trend_state_refresh', lambda: trend_state.trend_features(
+            trend_state.update_state(context['trend_state'], context['rank_frame'])[0], min_data_points=5),
+         build_previous_trend_state, False),
+        ('analyze_search_console_trends',
+         lambda: analyze_search_console_trends('./data/search_console', './data/analysis'), None, False),
+        ('analyze_index_drops',
+         lambda: analyze_index_drops('./data/site_benchmark.xlsx', './data/analysis',
+                                     timeline_file='./data/index_timeline/index_timeline.npz'),
+         lambda: remove('./data/index_timeline'), False),
+        ('export_seo_rank_analysis', export_seo_rank_analysis, save_weekly_analysis, False),
+        ('export_search_console_analysis', export_search_console_analysis, None, False),
+        ('export_shards', lambda: export_shards(output_dir='./data/dify_export/shards'),
+         lambda: (save_weekly_analysis(), remove('./data/dify_export/shards')), False),
+    ]
+
+
+def measure_stage(run, setup=None, repeat=1, memory=True, verbose=False):
+    """
+    ステージの処理時間とメモリを計測
+
+    処理時間はtracemallocなしでrepeat回計測し、メモリ（Pythonのメモリ確保のピーク）は
+    別にもう1回実行して計測します。
+
+    Returns:
+        計測結果のdict
+    """
+    wall_times = []
+    cpu_times = []
+
+    for _ in range(repeat):
+        if setup:
+            setup()
+        gc.collect()
+
+        output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+        with output:
+            wall_start = time.perf_counter()
+            cpu_start = time.process_time()
+            run()
+            cpu_times.append(time.process_time() - cpu_start)
+            wall_times.append(time.perf_counter() - wall_start)
+
+    result = {
+        'wall_sec': round(min(wall_times), 4),
+        'wall_sec_runs': [round(t, 4) for t in wall_times],
+        'cpu_sec': round(min(cpu_times), 4),
+    }
+
+    if memory:
+        if setup:
+            setup()
+        gc.collect()
+
+        output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+        tracemalloc.start()
+        try:
+            with output:
+                run()
+            result['peak_memory_mb'] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 2)
+        finally:
+            tracemalloc.stop()
+
+    return result
+
+
+def _git_commit():
+    """実行時のコミット（gitが使えない場合はNone）"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f'{commit}-dirty' if dirty else commit
+
+
+def _max_rss_mb():
+    """プロセスの最大常駐メモリ（MB、取得できない環境ではNone）"""
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linuxはキロバイト、macOSはバイト単位
+    return round(max_rss / 1024 / (1024 if sys.platform == 'darwin' else 1), 1)
+
+
+def run_benchmark(scale=1.0, weeks=DEFAULT_WEEKS, churn=DEFAULT_CHURN, seed=DEFAULT_SEED,
+                  repeat=1, memory=True, stages=None, workdir=None, keep=False, verbose=False):
+    """
+    合成データを生成して各ステージを計測
+
+    Args:
+        scale: データ規模の倍率（1で キーワード2,000件・r_hash 20,000件）
+        weeks: 順位エクスポートの週数
+        churn: Search Console・site:検索で週／シートごとに入れ替わるr_hashの割合
+        seed: 乱数シード
+        repeat: 処理時間の計測回数（最小値を採用）
+        memory: メモリを計測するか
+        stages: 計測するステージ名のリスト（Noneの場合は全て）
+        workdir: 合成データの生成先（Noneの場合は一時ディレクトリ）
+        keep: 終了後に合成データを残すか
+        verbose: 各ステージの出力を表示するか
+
+    Returns:
+        計測結果のdict
+    """
+    workspace = os.path.abspath(workdir) if workdir else tempfile.mkdtemp(prefix='seo_etl_benchmark_')
+    original_dir = os.getcwd()
+
+    try:
+        print(f"合成データを生成中: {workspace}")
+        generate_start = time.perf_counter()
+        sizes = generate_dataset(workspace, scale=scale, weeks=weeks, churn=churn, seed=seed)
+        print(f"  生成完了（{time.perf_counter() - generate_start:.1f}秒）: {sizes}")
+
+        # 各ステージは ./data 以下の相対パスを使うため、workspaceに移動して実行
+        os.chdir(workspace)
+
+        results = {}
+        stage_list = build_stages()
+        unknown = set(stages or []) - {name for name, _, _, _ in stage_list}
+        if unknown:
+            raise ValueError(f"存在しないステージです: {sorted(unknown)}")
+
+        for name, run, setup, provides in stage_list:
+            if stages and name not in stages:
+                # 後続のステージが使う結果だけは計測せずに作成
+                if provides:
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        if setup:
+                            setup()
+                        run()
+                continue
+
+            result = measure_stage(run, setup, repeat=repeat, memory=memory, verbose=verbose)
+            results[name] = result
+
+            memory_label = f" / ピーク {result['peak_memory_mb']:,.1f}MB" if 'peak_memory_mb' in result else ''
+            print(f"  {name:<32} {result['wall_sec']:>9.3f}秒{memory_label}")
+    finally:
+        os.chdir(original_dir)
+        if not keep and not workdir:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': _git_commit(),
+        'environment': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'sizes': sizes,
+        'repeat': repeat,
+        'max_rss_mb': _max_rss_mb(),
+        'stages': results,
+    }
+
+
+def save_results(results, output_dir=RESULTS_DIR):
+    """計測結果をJSONで保存"""
+    os.makedirs(output_dir, exist_ok=True)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    output_file = os.path.join(output_dir, f'benchmark_{timestamp}.json')
+
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+    print(f"\n計測結果を保存しました: {output_file}")
+    return output_file
+
+
+def compare_results(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """
+    2つの計測結果をステージごとに比較して表示
+
+    Returns:
+        threshold（%）を超えて悪化したステージ名のリスト
+    """
+    print(f"\n比較: {baseline.get('git_commit')} ({baseline.get('timestamp')}) → "
+          f"{current.get('git_commit')} ({current.get('timestamp')})")
+
+    if baseline.get('sizes') != current.get('sizes'):
+        print("警告: データ規模が異なるため、単純に比較できません")
+
+    def change(before, after):
+        if not before:
+            return None
+        return (after - before) / before * 100
+
+    regressions = []
+    print(f"\n{'ステージ':<32} {'処理時間(秒)':>22} {'変化':>8}   {'ピークメモリ(MB)':>22} {'変化':>8}")
+    for name, after in current['stages'].items():
+        before = baseline.get('stages', {}).get(name)
+        if before is None:
+            print(f"{name:<32} {'(比較対象なし)':>22}")
+            continue
+
+        time_change = change(before['wall_sec'], after['wall_sec'])
+        memory_change = None
+        if 'peak_memory_mb' in before and 'peak_memory_mb' in after:
+            memory_change = change(before['peak_memory_mb'], after['peak_memory_mb'])
+
+        time_regressed = (time_change is not None and time_change > threshold
+                          and after['wall_sec'] - before['wall_sec'] > REGRESSION_MIN_SEC)
+        memory_regressed = memory_change is not None and memory_change > threshold
+        regressed = time_regressed or memory_regressed
+        if regressed:
+            regressions.append(name)
+
+        time_text = f"{before['wall_sec']:.3f} → {after['wall_sec']:.3f}"
+        time_change_text = f"{time_change:+.1f}%" if time_change is not None else '-'
+        memory_text = (f"{before['peak_memory_mb']:.1f} → {after['peak_memory_mb']:.1f}"
+                       if memory_change is not None else '-')
+        memory_change_text = f"{memory_change:+.1f}%" if memory_change is not None else '-'
+        mark = '  ⚠️' if regressed else ''
+        print(f"{name:<32} {time_text:>22} {time_change_text:>8}   {memory_text:>22} {memory_change_text:>8}{mark}")
+
+    if regressions:
+        print(f"\n⚠️ {threshold:.0f}%以上悪化したステージ: {', '.join(regressions)}")
+    else:
+        print(f"\n✓ {threshold:.0f}%以上悪化したステージはありません")
+
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='合成データによるパイプラインのベンチマーク')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='データ規模の倍率（1で キーワード2,000件・r_hash 20,000件、デフォルト: 1）')
+    parser.add_argument('--weeks', type=int, default=DEFAULT_WEEKS, help=f'順位エクスポートの週数（デフォルト: {DEFAULT_WEEKS}）')
+    parser.add_argument('--churn', type=float, default=DEFAULT_CHURN,
+                        help=f'週／シートごとに入れ替わるr_hashの割合（デフォルト: {DEFAULT_CHURN}）')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help=f'乱数シード（デフォルト: {DEFAULT_SEED}）')
+    parser.add_argument('--repeat', type=int, default=1, help='処理時間の計測回数（最小値を採用、デフォルト: 1）')
+    parser.add_argument('--stages', nargs='+', help='計測するステージ名（デフォルト: 全て）')
+    parser.add_argument('--no-memory', action='store_true', help='メモリを計測しない（実行時間が短くなります）')
+    parser.add_argument('--workdir', help='合成データの生成先（指定した場合は終了後も残ります）')
+    parser.add_argument('--keep', action='store_true', help='一時ディレクトリの合成データを残す')
+    parser.add_argument('--verbose', action='store_true', help='各ステージの出力を表示')
+    parser.add_argument('--output-dir', default=RESULTS_DIR, help=f'結果の保存先（デフォルト: {RESULTS_DIR}）')
+    parser.add_argument('--compare', help='比較する以前の結果（JSONファイル）')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help=f'悪化とみなす変化率（%%、デフォルト: {REGRESSION_THRESHOLD}）')
+    parser.add_argument('--fail-on-regression', action='store_true',
+                        help='--compareで悪化したステージがあれば終了コード1で終了')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("ベンチマーク")
+    print("=" * 60)
+
+    results = run_benchmark(scale=args.scale, weeks=args.weeks, churn=args.churn, seed=args.seed,
+                            repeat=args.repeat, memory=not args.no_memory, stages=args.stages,
+                            workdir=args.workdir, keep=args.keep, verbose=args.verbose)
+    save_results(results, args.output_dir)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, results, threshold=args.threshold)
+        if regressions and args.fail_on_regression:
+            exit(1)
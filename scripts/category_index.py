@@ -0,0 +1,310 @@
+"""
+カテゴリ情報の共通インデックス
+
+キーワード → カテゴリ（category_mapping.csv）と、query_hash → キーワード・地域・
+カテゴリ（query_category_master.csv）を1つのインデックスにまとめ、各分析ステージは
+attach_categories(df) を呼ぶだけでカテゴリ列を付与できるようにします。
+
+インデックスはソート済みのキー配列と、カテゴリ値への int32 コード配列（辞書エンコード）
+からなり、data/cache/category_index/ に .npy ファイルとして保存されます。
+読み込みはメモリマップで行い、元のCSVが更新されていれば次回の利用時に自動で再構築します。
+
+使い方:
+    from category_index import attach_categories
+    df = attach_categories(df, keyword_col='keyword')     # カテゴリ, Groups を付与
+    df = attach_categories(df, hash_col='query_hash')     # query_keyword, query_location, category を付与
+"""
+import os
+import json
+
+
+from lazy_imports import lazy_import
+from rhash_codec import hex_to_keys, RHASH_KEY_DTYPE
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# 元データ
+CATEGORY_MAPPING_FILE = './data/category_mapping.csv'
+QUERY_CATEGORY_MASTER_FILE = './data/query_category_master.csv'
+
+# インデックスの保存先
+INDEX_DIR = './data/cache/category_index'
+INDEX_META_FILE = 'meta.json'
+INDEX_VERSION = 1
+
+# キーワードから付与する列（category_mapping.csvの列名）
+KEYWORD_KEY_COLUMN = 'キーワード'
+KEYWORD_VALUE_COLUMNS = ('カテゴリ', 'Groups')
+
+# query_hashから付与する列（query_category_master.csvの列名）
+HASH_KEY_COLUMN = 'query_hash'
+HASH_VALUE_COLUMNS = ('query_keyword', 'query_location', 'category')
+
+# 実行中に読み込んだインデックス
+_index = None
+
+
+def _source_signature(path):
+    """元ファイルの更新検知用（存在しない場合はNone）"""
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return {'mtime': stat.st_mtime, 'size': stat.st_size}
+
+
+def _encode_values(values):
+    """値の列を (ソート済みの値の配列, int32コード) に辞書エンコード（欠損は-1）"""
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object), sort=True)
+    return np.asarray(uniques, dtype=str), codes.astype(np.int32)
+
+
+def _hash_arrays(frame, hash_col=HASH_KEY_COLUMN):
+    """query_hash列とHASH_VALUE_COLUMNSを持つDataFrameから query_hash のインデックス配列を作成"""
+    hashes = frame[hash_col].astype('string').str.lower()
+    frame = frame[hashes.str.fullmatch(r'[0-9a-f]{32}').fillna(False).to_numpy(dtype=bool)]
+    frame = frame.assign(**{hash_col: hashes}).drop_duplicates(subset=[hash_col], keep='first')
+
+    keys = hex_to_keys(frame[hash_col])
+    order = np.argsort(keys, kind='stable')
+    arrays = {'hash_keys': keys[order]}
+
+    for i, column in enumerate(HASH_VALUE_COLUMNS):
+        column_values = frame[column] if column in frame.columns else pd.Series(np.nan, index=frame.index)
+        values, codes = _encode_values(column_values)
+        arrays[f'hash_values_{i}'] = values
+        arrays[f'hash_codes_{i}'] = codes[order]
+
+    return arrays
+
+
+def hash_index_from_frame(frame, hash_col=HASH_KEY_COLUMN):
+    """
+    DataFrameから query_hash → キーワード・地域・カテゴリ のインデックスを作成（保存はしません）
+
+    query_category_master.csv がない場合や古い週次ファイルに列がない場合に、
+    列を持つ最新のファイルを attach_categories(df, hash_col=..., index=...) の補完元として使うためのものです。
+
+    Returns:
+        get_category_index() と同じ形式の {配列名: numpy配列}（query_hashの配列のみ）
+    """
+    return _hash_arrays(frame, hash_col)
+
+
+def build_category_index(mapping_file=CATEGORY_MAPPING_FILE, master_file=QUERY_CATEGORY_MASTER_FILE,
+                         index_dir=INDEX_DIR):
+    """
+    元のCSVからカテゴリインデックスを構築して保存
+
+    同じキーが複数行ある場合は先頭の行を採用します。
+
+    Returns:
+        保存したインデックスのディレクトリ
+    """
+    arrays = {}
+
+    if os.path.exists(mapping_file):
+        mapping = pd.read_csv(mapping_file, dtype=str)
+        mapping = mapping.dropna(subset=[KEYWORD_KEY_COLUMN])
+        mapping = mapping.drop_duplicates(subset=[KEYWORD_KEY_COLUMN], keep='first')
+
+        keys = mapping[KEYWORD_KEY_COLUMN].to_numpy(dtype=str)
+        order = np.argsort(keys, kind='stable')
+        arrays['keyword_keys'] = keys[order]
+
+        for i, column in enumerate(KEYWORD_VALUE_COLUMNS):
+            column_values = mapping[column] if column in mapping.columns else pd.Series(np.nan, index=mapping.index)
+            values, codes = _encode_values(column_values)
+            arrays[f'keyword_values_{i}'] = values
+            arrays[f'keyword_codes_{i}'] = codes[order]
+
+        print(f"カテゴリインデックス（キーワード）: {len(keys):,}件")
+
+    if os.path.exists(master_file):
+        master = pd.read_csv(master_file, dtype=str)
+        hash_arrays = _hash_arrays(master)
+        arrays.update(hash_arrays)
+
+        print(f"カテゴリインデックス（query_hash）: {len(hash_arrays['hash_keys']):,}件")
+
+    os.makedirs(index_dir, exist_ok=True)
+    for name in os.listdir(index_dir):
+        if name.endswith('.npy'):
+            os.remove(os.path.join(index_dir, name))
+    for name, array in arrays.items():
+        np.save(os.path.join(index_dir, f'{name}.npy'), array)
+
+    meta = {
+        'version': INDEX_VERSION,
+        'arrays': sorted(arrays),
+        'sources': {
+            'mapping': _source_signature(mapping_file),
+            'master': _source_signature(master_file),
+        },
+    }
+    meta_file = os.path.join(index_dir, INDEX_META_FILE)
+    tmp_file = meta_file + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, meta_file)
+
+    return index_dir
+
+
+def _is_index_current(index_dir, mapping_file, master_file):
+    """保存済みインデックスが元のCSVと一致しているか"""
+    meta_file = os.path.join(index_dir, INDEX_META_FILE)
+    if not os.path.exists(meta_file):
+        return False
+
+    with open(meta_file, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+
+    return (meta.get('version') == INDEX_VERSION
+            and meta.get('sources') == {
+                'mapping': _source_signature(mapping_file),
+                'master': _source_signature(master_file),
+            })
+
+
+def load_category_index(mapping_file=CATEGORY_MAPPING_FILE, master_file=QUERY_CATEGORY_MASTER_FILE,
+                        index_dir=INDEX_DIR):
+    """
+    カテゴリインデックスを読み込み（元のCSVが更新されていれば再構築）
+
+    Returns:
+        {配列名: メモリマップされたnumpy配列}
+    """
+    if not _is_index_current(index_dir, mapping_file, master_file):
+        build_category_index(mapping_file, master_file, index_dir)
+
+    with open(os.path.join(index_dir, INDEX_META_FILE), 'r', encoding='utf-8') as f:
+        names = json.load(f)['arrays']
+
+    return {name: np.load(os.path.join(index_dir, f'{name}.npy'), mmap_mode='r') for name in names}
+
+
+def get_category_index():
+    """カテゴリインデックスを取得（初回利用時に読み込み、以降は使い回す）"""
+    global _index
+    if _index is None:
+        _index = load_category_index()
+    return _index
+
+
+def _lookup_positions(sorted_keys, keys):
+    """ソート済みキー配列でのkeysの位置（見つからない場合は-1）"""
+    if len(sorted_keys) == 0 or len(keys) == 0:
+        return np.full(len(keys), -1, dtype=np.intp)
+
+    positions = np.searchsorted(sorted_keys, keys)
+    positions[positions >= len(sorted_keys)] = 0
+    found = sorted_keys[positions] == keys
+    return np.where(found, positions, -1)
+
+
+def _decode(values, codes, positions):
+    """位置とコード配列から値を取り出す（見つからない・欠損はNaN）"""
+    # 値の辞書は小さいので先にobject型にし、行への展開は参照のコピーだけで済ませる
+    values = np.append(np.asarray(values).astype(object), np.nan)
+    row_codes = np.full(len(positions), -1, dtype=np.intp)
+    hit = positions >= 0
+    row_codes[hit] = np.asarray(codes)[positions[hit]]
+    return values[row_codes]
+
+
+def lookup_keywords(keywords, index=None):
+    """
+    キーワードからカテゴリ・Groupsを検索
+
+    Returns:
+        KEYWORD_VALUE_COLUMNSを列に持つDataFrame（keywordsと同じ順・同じindex）
+    """
+    index = get_category_index() if index is None else index
+    keywords = pd.Series(keywords)
+
+    positions = np.full(len(keywords), -1, dtype=np.intp)
+    if 'keyword_keys' in index:
+        # 入力を辞書エンコードし、ユニークな値だけを検索してから行に展開
+        codes, uniques = pd.factorize(keywords)
+        unique_positions = _lookup_positions(index['keyword_keys'], np.asarray(uniques, dtype=str))
+        valid = codes >= 0
+        positions[valid] = unique_positions[codes[valid]]
+
+    return pd.DataFrame({
+        column: (_decode(index[f'keyword_values_{i}'], index[f'keyword_codes_{i}'], positions)
+                 if 'keyword_keys' in index else np.full(len(keywords), np.nan, dtype=object))
+        for i, column in enumerate(KEYWORD_VALUE_COLUMNS)
+    }, index=keywords.index)
+
+
+def lookup_hashes(hashes, index=None):
+    """
+    query_hash（r_hash）からキーワード・地域・カテゴリを検索
+
+    Returns:
+        HASH_VALUE_COLUMNSを列に持つDataFrame（hashesと同じ順・同じindex）
+    """
+    index = get_category_index() if index is None else index
+    hashes = pd.Series(hashes)
+
+    positions = np.full(len(hashes), -1, dtype=np.intp)
+    if 'hash_keys' in index:
+        # 入力を辞書エンコードし、ユニークな値だけを検索してから行に展開
+        codes, uniques = pd.factorize(hashes)
+        uniques = pd.Series(np.asarray(uniques, dtype=object), dtype='string').str.lower()
+        is_hash = uniques.str.fullmatch(r'[0-9a-f]{32}').fillna(False).to_numpy(dtype=bool)
+
+        unique_positions = np.full(len(uniques), -1, dtype=np.intp)
+        keys = np.asarray(hex_to_keys(uniques[is_hash]), dtype=RHASH_KEY_DTYPE)
+        unique_positions[is_hash] = _lookup_positions(index['hash_keys'], keys)
+
+        valid = codes >= 0
+        positions[valid] = unique_positions[codes[valid]]
+
+    return pd.DataFrame({
+        column: (_decode(index[f'hash_values_{i}'], index[f'hash_codes_{i}'], positions)
+                 if 'hash_keys' in index else np.full(len(hashes), np.nan, dtype=object))
+        for i, column in enumerate(HASH_VALUE_COLUMNS)
+    }, index=hashes.index)
+
+
+def attach_categories(df, keyword_col=None, hash_col=None, index=None):
+    """
+    DataFrameにカテゴリ列を付与
+
+    keyword_colを指定（または 'キーワード' / 'keyword' 列がある）場合は カテゴリ・Groups を、
+    hash_colを指定（または 'query_hash' / 'r_hash' 列がある）場合は
+    query_keyword・query_location・category を付与します。
+    既に値が入っている行はそのまま残し、欠損している行だけをインデックスから補います。
+
+    Args:
+        df: 対象のDataFrame
+        keyword_col: キーワード列名
+        hash_col: query_hash列名
+        index: カテゴリインデックス（省略時はget_category_index()）
+
+    Returns:
+        カテゴリ列を付与したDataFrame（元のDataFrameは変更しません）
+    """
+    if keyword_col is None and hash_col is None:
+        keyword_col = next((col for col in ('キーワード', 'keyword') if col in df.columns), None)
+        hash_col = next((col for col in ('query_hash', 'r_hash') if col in df.columns), None)
+
+    df = df.copy()
+    lookups = []
+    if keyword_col is not None:
+        lookups.append(lookup_keywords(df[keyword_col], index))
+    if hash_col is not None:
+        lookups.append(lookup_hashes(df[hash_col], index))
+
+    for found in lookups:
+        for column in found.columns:
+            if column in df.columns:
+                existing = df[column]
+                missing = existing.isna() | (existing.astype(str) == '')
+                df[column] = existing.astype(object).where(~missing, found[column])
+            else:
+                df[column] = found[column]
+
+    return df
@@ -30,10 +30,10 @@ echo "削除中..."
 rm -f data/analysis/*.csv data/analysis/*.txt
 echo "✓ data/analysis/ をクリア"
 
-rm -f data/processed/*.csv
+rm -f data/processed/*.csv data/processed/*.arrow
 echo "✓ data/processed/ をクリア"
 
-rm -f data/dify_export/*.md
+rm -f data/dify_export/*.md data/dify_export/shard_manifest.json
 echo "✓ data/dify_export/ をクリア"
 
 echo ""
@@ -1,61 +1,43 @@
 import os
-import pickle
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
 import io
 from pathlib import Path
 
+from seo_etl import google_api
+from setup_drive_folders import load_folder_ids
+from stage_metrics import count_api_call, instrumented
+
 # Google Drive設定
 SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
 OUTPUT_DIR = './data/raw'
 
-# フォルダIDをロード
-import json
-if os.path.exists('drive_folder_ids.json'):
-    with open('drive_folder_ids.json', 'r') as f:
-        FOLDER_IDS = json.load(f)
-    # 00_raw_dataフォルダからダウンロード
-    FOLDER_ID = FOLDER_IDS.get('00_raw_data', '1sSy8mDQgtkmyODigpIiWiNh6hOJxG1Pt')
-    print(f"ダウンロード元: 00_raw_data フォルダ")
-else:
-    # 後方互換性: フォルダIDが見つからない場合は元のフォルダを使用
-    FOLDER_ID = '1sSy8mDQgtkmyODigpIiWiNh6hOJxG1Pt'
+# フォルダIDが見つからない場合のダウンロード元（後方互換: 元の親フォルダ）
+DEFAULT_FOLDER_ID = '1sSy8mDQgtkmyODigpIiWiNh6hOJxG1Pt'
+
+def get_folder_id():
+    """ダウンロード元のフォルダID（00_raw_dataフォルダ）"""
+    folder_ids = load_folder_ids()
+    if folder_ids:
+        print(f"ダウンロード元: 00_raw_data フォルダ")
+        return folder_ids.get('00_raw_data', DEFAULT_FOLDER_ID)
+
     print(f"ダウンロード元: 親フォルダ（後方互換モード）")
+    return DEFAULT_FOLDER_ID
 
 def authenticate():
     """Google Drive APIの認証（OAuth）"""
-    creds = None
-
-    # token.pickleファイルがあれば読み込む
-    if os.path.exists('token.pickle'):
-        with open('token.pickle', 'rb') as token:
-            creds = pickle.load(token)
-
-    # 認証情報が無効または存在しない場合
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            # OAuth認証フローを開始
-            flow = InstalledAppFlow.from_client_secrets_file(
-                'credentials.json', SCOPES)
-            creds = flow.run_local_server(port=0)
-
-        # 認証情報を保存
-        with open('token.pickle', 'wb') as token:
-            pickle.dump(creds, token)
-
-    return build('drive', 'v3', credentials=creds)
+    return google_api.drive_service(SCOPES)
 
+@instrumented()
 def download_files_from_folder(service, folder_id, output_dir):
     """指定されたGoogle DriveフォルダからCSVファイルをダウンロード"""
+    from googleapiclient.http import MediaIoBaseDownload
+
     Path(output_dir).mkdir(parents=True, exist_ok=True)
 
     # まずフォルダ内の全ファイルを取得してデバッグ
     print(f"フォルダID: {folder_id} を確認中...")
     query_all = f"'{folder_id}' in parents"
+    count_api_call('drive')
     results_all = service.files().list(
         q=query_all,
         fields="files(id, name, mimeType, modifiedTime)",
@@ -70,6 +52,7 @@ def download_files_from_folder(service, folder_id, output_dir):
 
     # CSVファイルのみを取得（複数のmimeTypeに対応）
     query = f"'{folder_id}' in parents and (mimeType='text/csv' or mimeType='application/vnd.ms-excel' or mimeType='text/plain')"
+    count_api_call('drive')
     results = service.files().list(
         q=query,
         fields="files(id, name, mimeType, modifiedTime)",
@@ -98,6 +81,7 @@ def download_files_from_folder(service, folder_id, output_dir):
 
         done = False
         while not done:
+            count_api_call('drive')
             status, done = downloader.next_chunk()
 
         fh.seek(0)
@@ -108,8 +92,9 @@ def download_files_from_folder(service, folder_id, output_dir):
 
 if __name__ == '__main__':
     try:
+        folder_id = get_folder_id()
         service = authenticate()
-        download_files_from_folder(service, FOLDER_ID, OUTPUT_DIR)
+        download_files_from_folder(service, folder_id, OUTPUT_DIR)
         print('\nダウンロード完了')
     except Exception as e:
         print(f'エラー: {e}')
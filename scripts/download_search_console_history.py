@@ -1,54 +1,18 @@
 import os
-import pickle
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
 import io
 from pathlib import Path
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+
+from seo_etl import files, google_api
+from setup_drive_folders import load_folder_ids
 
 # Google Drive設定
 SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
 OUTPUT_DIR = './data/search_console'
 
-# フォルダIDをロード
-import json
-if os.path.exists('drive_folder_ids.json'):
-    with open('drive_folder_ids.json', 'r') as f:
-        FOLDER_IDS = json.load(f)
-    FOLDER_ID = FOLDER_IDS.get('02_search_console_analysis')
-    if not FOLDER_ID:
-        print("エラー: 02_search_console_analysisフォルダIDが見つかりません")
-        exit(1)
-else:
-    print("エラー: drive_folder_ids.jsonが見つかりません")
-    exit(1)
-
 def authenticate():
     """Google Drive APIの認証（OAuth）"""
-    creds = None
-
-    # token.pickleファイルがあれば読み込む
-    if os.path.exists('token.pickle'):
-        with open('token.pickle', 'rb') as token:
-            creds = pickle.load(token)
-
-    # 認証情報が無効または存在しない場合
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            # OAuth認証フローを開始
-            flow = InstalledAppFlow.from_client_secrets_file(
-                'credentials.json', SCOPES)
-            creds = flow.run_local_server(port=0)
-
-        # 認証情報を保存
-        with open('token.pickle', 'wb') as token:
-            pickle.dump(creds, token)
-
-    return build('drive', 'v3', credentials=creds)
+    return google_api.drive_service(SCOPES)
 
 def download_search_console_history(service, folder_id, output_dir, months=3):
     """
@@ -60,6 +24,8 @@ def download_search_console_history(service, folder_id, output_dir, months=3):
         output_dir: 出力ディレクトリ
         months: ダウンロードする期間（月数）
     """
+    from googleapiclient.http import MediaIoBaseDownload
+
     Path(output_dir).mkdir(parents=True, exist_ok=True)
 
     # 過去N ヶ月の日付を計算
@@ -79,17 +45,17 @@ def download_search_console_history(service, folder_id, output_dir, months=3):
         orderBy="modifiedTime desc"
     ).execute()
 
-    files = results.get('files', [])
+    drive_files = results.get('files', [])
 
-    if not files:
+    if not drive_files:
         print('Search Console週次データが見つかりませんでした')
         return
 
-    print(f'{len(files)}個のSearch Console週次ファイルを検出しました\n')
+    print(f'{len(drive_files)}個のSearch Console週次ファイルを検出しました\n')
 
     # 過去N ヶ月以内のファイルのみダウンロード
     downloaded_count = 0
-    for file in files:
+    for file in drive_files:
         file_id = file['id']
         file_name = file['name']
         modified_time = datetime.strptime(file['modifiedTime'], '%Y-%m-%dT%H:%M:%S.%fZ')
@@ -115,6 +81,10 @@ def download_search_console_history(service, folder_id, output_dir, months=3):
         with open(file_path, 'wb') as f:
             f.write(fh.read())
 
+        # Driveの更新日時を作成時刻として出力カタログに記録（最新の判定に使用）
+        files.record_output(file_path, files.SEARCH_CONSOLE_WEEKLY, params={'source': 'drive'},
+                            created_at=modified_time.replace(tzinfo=timezone.utc).timestamp())
+
         print(f'✓ 完了: {file_name}')
         downloaded_count += 1
 
@@ -122,9 +92,15 @@ def download_search_console_history(service, folder_id, output_dir, months=3):
     return downloaded_count
 
 if __name__ == '__main__':
+    # フォルダIDをロード
+    folder_id = load_folder_ids().get('02_search_console_analysis')
+    if not folder_id:
+        print("エラー: 02_search_console_analysisフォルダIDが見つかりません（drive_folder_ids.json）")
+        exit(1)
+
     try:
         service = authenticate()
-        download_search_console_history(service, FOLDER_ID, OUTPUT_DIR, months=3)
+        download_search_console_history(service, folder_id, OUTPUT_DIR, months=3)
     except Exception as e:
         print(f'エラー: {e}')
         import traceback
@@ -1,33 +1,224 @@
 """
 DifyのナレッジベースにアップロードするためのMarkdownファイルを生成
 """
-import pandas as pd
 import os
+import re
+import json
+import hashlib
+import argparse
 from datetime import datetime
-import glob
+
+from lazy_imports import lazy_import
+from category_index import attach_categories
+from profiling import enable_profiling
+from seo_etl import files, stages
+from stage_metrics import current_stage, instrumented
+
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
 
 OUTPUT_DIR = './data/dify_export'
 
-def export_seo_rank_analysis():
-    """SEOランク分析データをMarkdown形式でエクスポート"""
+# 詳細テーブルの行数上限（Noneの場合は全件）
+SEO_DETAIL_ROWS = 100
+SEARCH_CONSOLE_TOP_ROWS = 20
+
+# シャード出力の設定
+SHARD_MODES = ('category', 'week', 'category-week')
+DEFAULT_MAX_SHARD_KB = 200
+SHARD_MANIFEST_FILE = 'shard_manifest.json'
+UNCATEGORIZED = '未分類'
+
+# エクスポートしたドキュメントの更新日時などを記録するマニフェスト
+# （ドキュメント本文に日時を入れると、データが同じでも毎回Difyで再埋め込みされるため）
+EXPORT_MANIFEST_FILE = 'export_manifest.json'
+
+# 完了時に一覧表示するファイル数の上限
+MAX_LISTED_FILES = 13
+
+# printf形式（np.char.mod）に置き換えられる数値の書式（符号・桁区切り・小数桁数）
+FIXED_SPEC_PATTERN = re.compile(r'([+ ]?)(,?)\.(\d+)f')
+
+def _format_fixed(values, spec):
+    """
+    数値の列を書式specで一括整形（セルごとのformat呼び出しを使わない）
+
+    printf形式に置き換えられない書式・数値に変換できない列はNone
+    """
+    match = FIXED_SPEC_PATTERN.fullmatch(spec)
+    if match is None:
+        return None
+    sign, grouping, precision = match.groups()
+    if grouping and precision != '0':
+        return None
+    try:
+        numbers = values.to_numpy(dtype=np.float64, na_value=np.nan)
+    except (TypeError, ValueError):
+        return None
+
+    formatted = pd.Series(np.char.mod(f'%{sign}.{precision}f', numbers), index=values.index, dtype=object)
+    if grouping:
+        # 整数部を3桁ごとに区切る（小数桁なしのため数字の並びは整数部だけ）
+        formatted = formatted.str.replace(r'(?<=\d)(?=(?:\d{3})+$)', ',', regex=True)
+    return formatted
+
+def format_column(values, spec='', suffix='', max_length=None):
+    """
+    列全体を一括で文字列に整形
+
+    Args:
+        values: 整形する列（Series）
+        spec: 数値の書式（例: '.0f', '+,.0f'）
+        suffix: 末尾に付ける文字列（例: '%'）
+        max_length: 指定した場合は先頭max_length文字に切り詰めて '...' を付ける
+    """
+    if max_length is not None:
+        formatted = values.astype(str).str.slice(0, max_length) + '...'
+    elif spec:
+        formatted = _format_fixed(values, spec)
+        if formatted is None:
+            formatted = values.map(f'{{:{spec}}}'.format)
+    else:
+        formatted = values.astype(str)
+
+    if suffix:
+        formatted = formatted + suffix
+
+    # セル内の | はMarkdownの列区切りと衝突するためエスケープ
+    return formatted.astype(str).str.replace('|', '\\|', regex=False)
+
+def render_table_header(headers):
+    """テーブルの見出し行と区切り行を生成"""
+    lines = "| " + " | ".join(headers) + " |\n"
+    lines += "|" + "|".join("-" * max(3, len(header) + 2) for header in headers) + "|\n"
+    return lines
+
+def render_table_rows(columns):
+    """
+    (見出し, format_columnで整形した列) のリストから行文字列の配列を生成
+
+    行ごとのループを使わず、列単位の文字列連結で全行を一度に組み立てる。
+    """
+    if len(columns[0][1]) == 0:
+        return np.empty(0, dtype=object)
+
+    rows = columns[0][1].to_numpy(dtype=object)
+    for _, cells in columns[1:]:
+        rows = rows + " | " + cells.to_numpy(dtype=object)
+
+    return "| " + rows + " |\n"
+
+def render_markdown_table(columns):
+    """(見出し, format_columnで整形した列) のリストからMarkdownテーブルを生成"""
+    header = render_table_header([header for header, _ in columns])
+    return header + "".join(render_table_rows(columns).tolist())
+
+def seo_detail_columns(df):
+    """SEOランク分析の詳細テーブルの列定義"""
+    return [
+        ('キーワード', format_column(df['keyword'])),
+        ('URL', format_column(df['url'], max_length=50)),
+        ('日付', format_column(df['date'])),
+        ('前回順位', format_column(df['previous_rank'], '.0f')),
+        ('現在順位', format_column(df['current_rank'], '.0f')),
+        ('順位変化', format_column(df['rank_diff'], '+.0f')),
+        ('前回距離', format_column(df['previous_distance'], '.0f')),
+        ('現在距離', format_column(df['current_distance'], '.0f')),
+        ('距離変化', format_column(df['distance_diff'], '+.0f')),
+    ]
+
+def search_console_detail_columns(df):
+    """Search Console分析の詳細テーブル（シャード用）の列定義"""
+    return [
+        ('r_hash', format_column(df['r_hash'])),
+        ('週開始日', format_column(df['week_start'])),
+        ('今週imp', format_column(df['total_impressions'], ',.0f')),
+        ('前週imp', format_column(df['prev_impressions'], ',.0f')),
+        ('imp差分', format_column(df['imp_diff'], '+,.0f')),
+        ('今週CTR', format_column(df['avg_ctr'], '.4f')),
+        ('CTR差分', format_column(df['ctr_diff'], '+.4f')),
+        ('今週順位', format_column(df['avg_position'], '.1f')),
+        ('順位差分', format_column(df['position_diff'], '+.1f')),
+    ]
+
+def _write_json(path, data):
+    """JSONを一時ファイル経由で書き込み"""
+    tmp_file = path + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, path)
+
+def write_document(name, output, sources=(), output_dir=None):
+    """
+    ドキュメントを保存し、エクスポートマニフェストに更新日時を記録
+
+    本文には実行日時を含めず、更新日時は EXPORT_MANIFEST_FILE に記録します。
+    内容が前回と同じ場合はファイルを書き換えず、更新日時もそのままにします。
+
+    Args:
+        name: ファイル名
+        output: 本文（文字列のリスト）
+        sources: 元データのファイル（マニフェストに記録）
+        output_dir: 出力ディレクトリ（省略時はOUTPUT_DIR）
+
+    Returns:
+        保存したファイルのパス
+    """
+    output_dir = output_dir or OUTPUT_DIR
+    os.makedirs(output_dir, exist_ok=True)
+    output_file = os.path.join(output_dir, name)
+    data = "".join(output).encode('utf-8')
+    content_hash = hashlib.sha256(data).hexdigest()
+
+    manifest_file = os.path.join(output_dir, EXPORT_MANIFEST_FILE)
+    manifest = {'documents': {}}
+    if os.path.exists(manifest_file):
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    documents = manifest.setdefault('documents', {})
+
+    previous = documents.get(name, {})
+    now = datetime.now().isoformat(timespec='seconds')
+    if previous.get('sha256') != content_hash or not os.path.exists(output_file):
+        with open(output_file, 'wb') as f:
+            f.write(data)
+        previous = {'updated_at': now}
+
+    documents[name] = {
+        'sha256': content_hash,
+        'bytes': len(data),
+        'updated_at': previous.get('updated_at', now),
+        'generated_at': now,
+        'sources': [os.path.basename(path) for path in sources if path],
+    }
+    _write_json(manifest_file, manifest)
+
+    return output_file
+
+@instrumented()
+def export_seo_rank_analysis(max_rows=SEO_DETAIL_ROWS):
+    """
+    SEOランク分析データをMarkdown形式でエクスポート
+
+    Args:
+        max_rows: 詳細データの行数上限（Noneの場合は全件）
+    """
     # 最新のCSVとレポートを取得
-    csv_files = sorted(glob.glob('./data/analysis/weekly_analysis_*.csv'))
-    txt_files = sorted(glob.glob('./data/analysis/insights_report_*.txt'))
+    latest_csv = files.latest_output(files.WEEKLY_ANALYSIS)
+    latest_txt = files.latest_output(files.INSIGHTS_REPORT)
 
-    if not csv_files:
+    if not latest_csv:
         print("SEOランク分析データが見つかりません")
         return
 
-    latest_csv = csv_files[-1]
-    latest_txt = txt_files[-1] if txt_files else None
-
     # CSVデータを読み込み
     df = pd.read_csv(latest_csv)
+    current_stage().read(latest_csv)
+    current_stage().rows_in = len(df)
 
     # Markdown形式で出力
     output = []
     output.append("# SEOランク分析データ\n")
-    output.append(f"**最終更新**: {datetime.now().strftime('%Y-%m-%d %H:%M')}\n")
     output.append(f"**データ期間**: {df['date'].min()} ～ {df['date'].max()}\n")
     output.append(f"**総データ数**: {len(df):,}件\n\n")
 
@@ -38,76 +229,85 @@ def export_seo_rank_analysis():
             output.append(f.read())
         output.append("\n\n")
 
-    # 詳細データ（サンプル）
-    output.append("## 詳細データ（最新100件）\n\n")
-    output.append("| キーワード | URL | 日付 | 前回順位 | 現在順位 | 順位変化 | 前回距離 | 現在距離 | 距離変化 |\n")
-    output.append("|----------|-----|------|---------|---------|---------|---------|---------|----------|\n")
+    # 詳細データ
+    detail = df if max_rows is None else df.head(max_rows)
+    if len(detail) == len(df):
+        output.append(f"## 詳細データ（全{len(detail):,}件）\n\n")
+    else:
+        output.append(f"## 詳細データ（最新{len(detail):,}件）\n\n")
 
-    for _, row in df.head(100).iterrows():
-        output.append(f"| {row['keyword']} | {row['url'][:50]}... | {row['date']} | "
-                     f"{row['previous_rank']:.0f} | {row['current_rank']:.0f} | {row['rank_diff']:+.0f} | "
-                     f"{row['previous_distance']:.0f} | {row['current_distance']:.0f} | {row['distance_diff']:+.0f} |\n")
+    output.append(render_markdown_table(seo_detail_columns(detail)))
 
     # ファイルに保存
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    output_file = os.path.join(OUTPUT_DIR, 'seo_rank_analysis.md')
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.writelines(output)
+    output_file = write_document('seo_rank_analysis.md', output, sources=[latest_csv, latest_txt])
 
+    current_stage().wrote(output_file)
     print(f"✓ SEOランク分析データをエクスポート: {output_file}")
     return output_file
 
-def export_search_console_analysis():
-    """Search Console分析データをMarkdown形式でエクスポート"""
+@instrumented()
+def export_search_console_analysis(max_rows=SEARCH_CONSOLE_TOP_ROWS):
+    """
+    Search Console分析データをMarkdown形式でエクスポート
+
+    Args:
+        max_rows: 各ランキングの行数上限（Noneの場合は全件）
+    """
     # 最新のCSVを取得
-    csv_files = sorted(glob.glob('./data/search_console/search_console_weekly_*.csv'))
+    latest_csv = files.latest_output(files.SEARCH_CONSOLE_WEEKLY)
 
-    if not csv_files:
+    if not latest_csv:
         print("Search Consoleデータが見つかりません")
         return
 
-    latest_csv = csv_files[-1]
     df = pd.read_csv(latest_csv)
+    current_stage().read(latest_csv)
+    current_stage().rows_in = len(df)
 
     # Markdown形式で出力
     output = []
     output.append("# Search Console週次分析データ（r_hash別）\n")
-    output.append(f"**最終更新**: {datetime.now().strftime('%Y-%m-%d %H:%M')}\n")
     output.append(f"**データ期間**: {df['week_start'].min()} ～ {df['week_start'].max()}\n")
     output.append(f"**総レコード数**: {len(df):,}件\n")
     output.append(f"**ユニークr_hash数**: {df['r_hash'].nunique():,}件\n\n")
 
+    n = len(df) if max_rows is None else max_rows
+    label = "全件" if max_rows is None else f"Top {max_rows}"
+
     # トップパフォーマー
-    output.append("## インプレッション増加 Top 20\n\n")
-    output.append("| r_hash | 週開始日 | 今週imp | 前週imp | 差分 | 変化率(%) |\n")
-    output.append("|--------|---------|---------|---------|------|----------|\n")
-
-    top_imp = df.nlargest(20, 'imp_diff')
-    for _, row in top_imp.iterrows():
-        output.append(f"| {row['r_hash'][:16]}... | {row['week_start']} | "
-                     f"{row['total_impressions']:,.0f} | {row['prev_impressions']:,.0f} | "
-                     f"{row['imp_diff']:+,.0f} | {row['imp_change_rate']:+.1f}% |\n")
-
-    output.append("\n## CTR改善 Top 20\n\n")
-    output.append("| r_hash | 週開始日 | 今週CTR | 前週CTR | 差分 | 変化率(%) |\n")
-    output.append("|--------|---------|---------|---------|------|----------|\n")
-
-    top_ctr = df.nlargest(20, 'ctr_diff')
-    for _, row in top_ctr.iterrows():
-        output.append(f"| {row['r_hash'][:16]}... | {row['week_start']} | "
-                     f"{row['avg_ctr']:.4f} | {row['prev_ctr']:.4f} | "
-                     f"{row['ctr_diff']:+.4f} | {row['ctr_change_rate']:+.1f}% |\n")
-
-    output.append("\n## 順位改善 Top 20\n\n")
-    output.append("| r_hash | 週開始日 | 今週順位 | 前週順位 | 差分 | 変化率(%) |\n")
-    output.append("|--------|---------|---------|---------|------|----------|\n")
+    top_imp = df.nlargest(n, 'imp_diff')
+    output.append(f"## インプレッション増加 {label}\n\n")
+    output.append(render_markdown_table([
+        ('r_hash', format_column(top_imp['r_hash'], max_length=16)),
+        ('週開始日', format_column(top_imp['week_start'])),
+        ('今週imp', format_column(top_imp['total_impressions'], ',.0f')),
+        ('前週imp', format_column(top_imp['prev_impressions'], ',.0f')),
+        ('差分', format_column(top_imp['imp_diff'], '+,.0f')),
+        ('変化率(%)', format_column(top_imp['imp_change_rate'], '+.1f', suffix='%')),
+    ]))
+
+    top_ctr = df.nlargest(n, 'ctr_diff')
+    output.append(f"\n## CTR改善 {label}\n\n")
+    output.append(render_markdown_table([
+        ('r_hash', format_column(top_ctr['r_hash'], max_length=16)),
+        ('週開始日', format_column(top_ctr['week_start'])),
+        ('今週CTR', format_column(top_ctr['avg_ctr'], '.4f')),
+        ('前週CTR', format_column(top_ctr['prev_ctr'], '.4f')),
+        ('差分', format_column(top_ctr['ctr_diff'], '+.4f')),
+        ('変化率(%)', format_column(top_ctr['ctr_change_rate'], '+.1f', suffix='%')),
+    ]))
 
     # 順位は小さいほど良いので、position_diffが負の方が改善
-    top_pos = df.nsmallest(20, 'position_diff')
-    for _, row in top_pos.iterrows():
-        output.append(f"| {row['r_hash'][:16]}... | {row['week_start']} | "
-                     f"{row['avg_position']:.1f} | {row['prev_position']:.1f} | "
-                     f"{row['position_diff']:+.1f} | {row['position_change_rate']:+.1f}% |\n")
+    top_pos = df.nsmallest(n, 'position_diff')
+    output.append(f"\n## 順位改善 {label}\n\n")
+    output.append(render_markdown_table([
+        ('r_hash', format_column(top_pos['r_hash'], max_length=16)),
+        ('週開始日', format_column(top_pos['week_start'])),
+        ('今週順位', format_column(top_pos['avg_position'], '.1f')),
+        ('前週順位', format_column(top_pos['prev_position'], '.1f')),
+        ('差分', format_column(top_pos['position_diff'], '+.1f')),
+        ('変化率(%)', format_column(top_pos['position_change_rate'], '+.1f', suffix='%')),
+    ]))
 
     # 統計サマリー
     output.append("\n## 統計サマリー\n\n")
@@ -118,14 +318,240 @@ def export_search_console_analysis():
     output.append(f"- **インプレッション減少r_hash数**: {(df['imp_diff'] < 0).sum():,}件\n")
 
     # ファイルに保存
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    output_file = os.path.join(OUTPUT_DIR, 'search_console_analysis.md')
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.writelines(output)
+    output_file = write_document('search_console_analysis.md', output, sources=[latest_csv])
 
+    current_stage().wrote(output_file)
     print(f"✓ Search Console分析データをエクスポート: {output_file}")
     return output_file
 
+def _week_start(dates):
+    """日付列を週の開始日（月曜日）の文字列に変換"""
+    dates = pd.to_datetime(dates, errors='coerce')
+    return (dates - pd.to_timedelta(dates.dt.weekday, unit='D')).dt.strftime('%Y-%m-%d').fillna('unknown')
+
+def _shard_slug(value):
+    """シャード名に使えるように値を整形（日本語はそのまま残す）"""
+    slug = re.sub(r'[\\/:*?"<>|\s]+', '_', str(value)).strip('_')
+    return slug or 'none'
+
+def row_hashes(rows):
+    """行文字列ごとの64bitハッシュ（実行ごとに変わらない）"""
+    return pd.util.hash_pandas_object(pd.Series(rows, dtype=object), index=False).to_numpy()
+
+def split_rows_by_content(rows, max_bytes, hashes=None):
+    """
+    行文字列の配列を、行の内容で決まる境界でパートに分割（コンテンツ定義チャンキング）
+
+    各行は (行のハッシュ / 2^64) < 行のバイト数 / (max_bytes / 4) のときにパートの末尾になります。
+    境界はその行だけで決まるため、先頭付近の行を追加・変更・削除しても変わるのは
+    その行を含むパート（と境界が消えた場合は隣のパート）だけで、以降のパートは同じ内容のままです。
+    パートは平均で max_bytes / 4 程度になり、max_bytes を超える場合はそこで区切ります。
+    1行でmax_bytesを超える場合はその行だけで1パートになります。
+
+    Args:
+        rows: 行文字列の配列
+        max_bytes: 1パートあたりの最大バイト数
+        hashes: row_hashes(rows)（計算済みの場合）
+
+    Returns:
+        各パートの (開始位置, 終了位置) のリスト
+    """
+    sizes = pd.Series(rows, dtype=object).str.encode('utf-8').str.len().to_numpy(dtype=np.float64)
+    hashes = row_hashes(rows) if hashes is None else hashes
+
+    # 行の内容による境界（ハッシュを[0, 1)の一様乱数とみなし、行のバイト数に比例した確率で区切る）
+    target_bytes = max(max_bytes / 4, 1)
+    is_boundary = (hashes >> np.uint64(11)).astype(np.float64) / float(1 << 53) < sizes / target_bytes
+
+    parts = []
+    start = 0
+    total = 0
+    for i, size in enumerate(sizes):
+        if i > start and total + size > max_bytes:
+            parts.append((start, i))
+            start = i
+            total = 0
+        total += size
+        if is_boundary[i]:
+            parts.append((start, i + 1))
+            start = i + 1
+            total = 0
+
+    if start < len(sizes):
+        parts.append((start, len(sizes)))
+
+    return parts
+
+def build_shards(df, source, title, group_columns, columns_func, max_bytes):
+    """
+    DataFrameをグループ×サイズ上限でシャードに分割してMarkdownを生成
+
+    シャードの内容には実行日時などを含めず、同じデータからは常に同じ
+    バイト列が生成されるようにしています（コンテンツハッシュの安定化）。
+    パートの境界は行の内容で決め（split_rows_by_content）、パート名は直前の境界の行の
+    ハッシュから付けるため、一部の行が変わっても他のパートの名前・内容は変わりません。
+
+    Args:
+        df: シャード化するデータ（ソート済み）
+        source: シャード名の接頭辞（例: 'seo_rank_analysis'）
+        title: ドキュメントの見出し
+        group_columns: {ラベル: 列名} のグループ化キー
+        columns_func: DataFrameからテーブルの列定義を返す関数
+        max_bytes: 1シャードあたりの最大バイト数
+
+    Returns:
+        {シャード名: {'content': str, 'rows': int, 'group': dict}}
+    """
+    shards = {}
+    keys = list(group_columns.values())
+
+    for group_values, group_df in df.groupby(keys, sort=True, observed=True):
+        if not isinstance(group_values, tuple):
+            group_values = (group_values,)
+        group = dict(zip(group_columns.keys(), group_values))
+
+        heading = f"# {title}（" + " / ".join(f"{label}: {value}" for label, value in group.items()) + "）\n\n"
+        table_header = render_table_header([header for header, _ in columns_func(group_df.head(0))])
+        rows = render_table_rows(columns_func(group_df))
+        hashes = row_hashes(rows)
+
+        header_bytes = len((heading + table_header).encode('utf-8')) + 64
+        parts = split_rows_by_content(rows, max(max_bytes - header_bytes, 1), hashes)
+        base_name = source + "".join(f"__{_shard_slug(value)}" for value in group_values)
+
+        for start, end in parts:
+            # 先頭のパートは p00000000、以降は直前のパートの最終行のハッシュ（上位32bit）で命名
+            part_id = f"{int(hashes[start - 1]) >> 32:08x}" if start > 0 else '00000000'
+            name = f"{base_name}__p{part_id}.md"
+            suffix = 2
+            while name in shards:
+                name = f"{base_name}__p{part_id}_{suffix}.md"
+                suffix += 1
+
+            content = heading
+            content += f"**データ数**: {end - start:,}件\n\n"
+            content += table_header + "".join(rows[start:end].tolist())
+            shards[name] = {'content': content, 'rows': end - start, 'group': group}
+
+    return shards
+
+def _load_shard_manifest(output_dir):
+    """前回のシャードマニフェストを読み込み（存在しない場合は空）"""
+    manifest_file = os.path.join(output_dir, SHARD_MANIFEST_FILE)
+    if not os.path.exists(manifest_file):
+        return {'shards': {}}
+
+    with open(manifest_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def write_shards(shards, output_dir=OUTPUT_DIR, max_bytes=None):
+    """
+    シャードをファイルに書き出し、マニフェストを更新
+
+    内容が前回と同じシャードは書き換えず、前回あって今回ないシャードは削除します。
+    マニフェストにはシャード名ごとのコンテンツハッシュ（sha256）を記録します。
+
+    Returns:
+        (変更・追加されたシャード名のリスト, 削除されたシャード名のリスト)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    previous = _load_shard_manifest(output_dir).get('shards', {})
+
+    entries = {}
+    changed = []
+    for name, shard in sorted(shards.items()):
+        data = shard['content'].encode('utf-8')
+        content_hash = hashlib.sha256(data).hexdigest()
+        path = os.path.join(output_dir, name)
+
+        if previous.get(name, {}).get('sha256') != content_hash or not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.write(data)
+            changed.append(name)
+
+        entries[name] = {
+            'sha256': content_hash,
+            'bytes': len(data),
+            'rows': shard['rows'],
+            'group': {label: str(value) for label, value in shard['group'].items()},
+        }
+
+    removed = []
+    for name in sorted(set(previous) - set(entries)):
+        path = os.path.join(output_dir, name)
+        if os.path.exists(path):
+            os.remove(path)
+        removed.append(name)
+
+    manifest = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'max_shard_bytes': max_bytes,
+        'shards': entries,
+    }
+    _write_json(os.path.join(output_dir, SHARD_MANIFEST_FILE), manifest)
+
+    return changed, removed
+
+@instrumented()
+def export_shards(shard_by='category-week', max_shard_kb=DEFAULT_MAX_SHARD_KB, output_dir=OUTPUT_DIR):
+    """
+    SEOランク分析・Search Consoleデータをカテゴリ／週ごとのシャードに分割してエクスポート
+
+    1行の変更でナレッジベース全体が再埋め込みされないよう、シャード単位で
+    ドキュメントを分けます。Search Consoleデータにはカテゴリがないため週で分割します。
+
+    Args:
+        shard_by: 'category' / 'week' / 'category-week'
+        max_shard_kb: 1シャードあたりの最大サイズ（KB）
+        output_dir: 出力ディレクトリ
+
+    Returns:
+        出力されたシャードファイルのリスト
+    """
+    if shard_by not in SHARD_MODES:
+        raise ValueError(f"shard_byは {SHARD_MODES} のいずれかを指定してください: {shard_by}")
+
+    max_bytes = max_shard_kb * 1024
+    shards = {}
+
+    latest_csv = files.latest_output(files.WEEKLY_ANALYSIS)
+    if latest_csv:
+        df = pd.read_csv(latest_csv)
+        df = attach_categories(df, keyword_col='keyword')
+        df['カテゴリ'] = df['カテゴリ'].fillna(UNCATEGORIZED)
+        df['_week'] = _week_start(df['date'])
+        df = df.sort_values(['keyword', 'url', 'date'], kind='stable')
+
+        group_columns = {}
+        if shard_by in ('category', 'category-week'):
+            group_columns['カテゴリ'] = 'カテゴリ'
+        if shard_by in ('week', 'category-week'):
+            group_columns['週'] = '_week'
+
+        shards.update(build_shards(df, 'seo_rank_analysis', 'SEOランク分析データ',
+                                   group_columns, seo_detail_columns, max_bytes))
+    else:
+        print("SEOランク分析データが見つかりません")
+
+    latest_csv = files.latest_output(files.SEARCH_CONSOLE_WEEKLY)
+    if latest_csv:
+        df = pd.read_csv(latest_csv)
+        df = df.sort_values(['week_start', 'r_hash'], kind='stable')
+        shards.update(build_shards(df, 'search_console_analysis', 'Search Console週次分析データ',
+                                   {'週': 'week_start'}, search_console_detail_columns, max_bytes))
+    else:
+        print("Search Consoleデータが見つかりません")
+
+    changed, removed = write_shards(shards, output_dir, max_bytes)
+    current_stage().set(shards=len(shards), changed=len(changed), removed=len(removed))
+    for name in changed:
+        current_stage().wrote(os.path.join(output_dir, name))
+
+    print(f"✓ シャードをエクスポート: {len(shards)}件（変更 {len(changed)}件 / 削除 {len(removed)}件）")
+    print(f"  マニフェスト: {os.path.join(output_dir, SHARD_MANIFEST_FILE)}")
+    return [os.path.join(output_dir, name) for name in sorted(shards)]
+
+@instrumented()
 def export_metadata():
     """メタデータとデータ説明を生成"""
     output = []
@@ -178,36 +604,35 @@ def export_metadata():
     output.append("A: 検索結果との関連性を示すスコアです。距離が小さいほど、検索クエリに対してより関連性が高いと判断されています。\n\n")
 
     # ファイルに保存
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    output_file = os.path.join(OUTPUT_DIR, 'data_dictionary.md')
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.writelines(output)
+    output_file = write_document('data_dictionary.md', output)
 
+    current_stage().wrote(output_file)
     print(f"✓ データ辞書をエクスポート: {output_file}")
     return output_file
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Dify用データエクスポート')
+    parser.add_argument('--all-rows', action='store_true',
+                        help='詳細テーブル・ランキングを件数で切らずに全件出力')
+    parser.add_argument('--shard-by', choices=SHARD_MODES,
+                        help='詳細データをカテゴリ／週ごとのシャードに分割して出力')
+    parser.add_argument('--max-shard-kb', type=int, default=DEFAULT_MAX_SHARD_KB,
+                        help=f'1シャードあたりの最大サイズ（KB、デフォルト: {DEFAULT_MAX_SHARD_KB}）')
+    parser.add_argument('--profile', action='store_true', help='処理をプロファイルして data/profiles/ に保存')
+    args = parser.parse_args()
+    enable_profiling(args.profile)
+
     print("=" * 50)
     print("Dify用データエクスポート")
     print("=" * 50)
     print()
 
-    files = []
-
-    # SEOランク分析データ
-    file1 = export_seo_rank_analysis()
-    if file1:
-        files.append(file1)
-
-    # Search Console分析データ
-    file2 = export_search_console_analysis()
-    if file2:
-        files.append(file2)
+    exported = stages.export_dify(all_rows=args.all_rows, shard_by=args.shard_by, max_shard_kb=args.max_shard_kb)
 
-    # メタデータ
-    file3 = export_metadata()
-    if file3:
-        files.append(file3)
+    # シャードが多い場合は先頭の一部だけ表示
+    shown = exported[:MAX_LISTED_FILES]
+    if len(exported) > len(shown):
+        shown.append(f"...ほか{len(exported) - len(shown)}件")
 
     print()
     print("=" * 50)
@@ -218,7 +643,7 @@ if __name__ == '__main__':
     print("1. https://dify.ai にアクセスしてアカウント作成")
     print("2. 新しいナレッジベースを作成")
     print("3. 以下のファイルをアップロード:")
-    for f in files:
-        print(f"   - {f}")
+    for path in shown:
+        print(f"   - {path}")
     print("4. チャットアプリを作成してナレッジベースを接続")
     print()
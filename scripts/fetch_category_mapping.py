@@ -1,60 +1,130 @@
+"""
+Google スプレッドシートからカテゴリマッピング（キーワード → カテゴリ）を取得
+
+必要な列だけを values.batchGet で取得し、スプレッドシートが前回取得時から
+更新されていない場合はダウンロード自体をスキップします。
+
+- GID → シート名の解決結果は data/cache/sheets_metadata.json にキャッシュ
+- 更新有無は Drive API のファイルの version（編集のたびに増える番号）で判定
+- 取得状態は data/cache/category_mapping_state.json に保存
+"""
 import os
-import pickle
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
+import argparse
+from datetime import datetime
 import json
 import csv
 
+from seo_etl import google_api
+from stage_metrics import count_api_call, instrumented
+
 # Google Sheets設定
-SCOPES = ['https://www.googleapis.com/auth/spreadsheets.readonly']
+# version（更新番号）の取得にDriveのメタデータ読み取り権限を使用
+SCOPES = [
+    'https://www.googleapis.com/auth/spreadsheets.readonly',
+    'https://www.googleapis.com/auth/drive.metadata.readonly',
+]
 SPREADSHEET_ID = '1Lin1EJSuwgkNfPrEMBydTFTvXeGBpLrT'
 SHEET_GID = '1134122120'
 
+# Sheets用のトークン（Driveのアップロード・ダウンロード用の token.pickle とはスコープが異なる）
+SHEETS_TOKEN_FILE = 'token_sheets.pickle'
+
+# 取得する列（ヘッダー名）
+MAPPING_COLUMNS = ['キーワード', 'カテゴリ', 'Groups']
+
 # 出力先
 OUTPUT_FILE = './data/category_mapping.csv'
 
+# キャッシュ
+SHEETS_METADATA_CACHE = './data/cache/sheets_metadata.json'
+MAPPING_STATE_FILE = './data/cache/category_mapping_state.json'
+
 def authenticate_sheets():
-    """Google Sheets APIの認証"""
-    creds = None
-
-    # token_sheets.pickleファイルがあれば読み込む
-    if os.path.exists('token_sheets.pickle'):
-        with open('token_sheets.pickle', 'rb') as token:
-            creds = pickle.load(token)
-
-    # 認証情報が無効または存在しない場合
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            # OAuth認証フローを開始
-            flow = InstalledAppFlow.from_client_secrets_file(
-                'credentials.json', SCOPES)
-            creds = flow.run_local_server(port=0)
+    """Google Sheets / Drive APIの認証"""
+    creds = google_api.get_credentials(SCOPES, token_file=SHEETS_TOKEN_FILE, require_scopes=True)
+    sheets_service = google_api.build_service('sheets', 'v4', credentials=creds)
+    drive_service = google_api.build_service('drive', 'v3', credentials=creds)
+    return sheets_service, drive_service
 
-        # 認証情報を保存
-        with open('token_sheets.pickle', 'wb') as token:
-            pickle.dump(creds, token)
+def _load_json(path):
+    """JSONファイルを読み込み（存在しない・壊れている場合は空）"""
+    if not os.path.exists(path):
+        return {}
+
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
 
-    return build('sheets', 'v4', credentials=creds)
+def _save_json(data, path):
+    """JSONファイルを保存（一時ファイル経由で置き換え）"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_file = path + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, path)
 
-def get_sheet_name_from_gid(service, spreadsheet_id, gid):
-    """GIDからシート名を取得"""
-    spreadsheet = service.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
+def get_sheet_name_from_gid(service, spreadsheet_id, gid, refresh=False):
+    """
+    GIDからシート名を取得
 
-    for sheet in spreadsheet.get('sheets', []):
-        properties = sheet.get('properties', {})
-        if str(properties.get('sheetId')) == gid:
-            return properties.get('title')
+    解決結果はキャッシュし、キャッシュにない場合だけシートのプロパティ
+    （sheetId・title）に絞ってメタデータを取得します。
+    """
+    cache = _load_json(SHEETS_METADATA_CACHE)
+    sheets = cache.get(spreadsheet_id, {})
+
+    if not refresh and gid in sheets:
+        return sheets[gid]
+
+    count_api_call('sheets')
+    spreadsheet = service.spreadsheets().get(
+        spreadsheetId=spreadsheet_id,
+        fields='sheets.properties(sheetId,title)'
+    ).execute()
+
+    sheets = {
+        str(sheet['properties']['sheetId']): sheet['properties']['title']
+        for sheet in spreadsheet.get('sheets', [])
+    }
+    cache[spreadsheet_id] = sheets
+    _save_json(cache, SHEETS_METADATA_CACHE)
+
+    return sheets.get(gid)
+
+def get_spreadsheet_version(drive_service, spreadsheet_id):
+    """スプレッドシートのversion（編集のたびに増える更新番号）を取得"""
+    count_api_call('drive')
+    metadata = drive_service.files().get(
+        fileId=spreadsheet_id,
+        fields='version,modifiedTime'
+    ).execute()
+    return metadata.get('version'), metadata.get('modifiedTime')
 
-    return None
+def _column_letter(index):
+    """0始まりの列番号をA1形式の列名に変換（0 → A, 26 → AA）"""
+    letters = ''
+    index += 1
+    while index > 0:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
 
-def fetch_category_mapping(service, spreadsheet_id, gid):
-    """スプレッドシートからカテゴリマッピングを取得"""
+def fetch_category_mapping(service, spreadsheet_id, gid, columns=MAPPING_COLUMNS):
+    """
+    スプレッドシートからカテゴリマッピングを取得
 
+    ヘッダー行で列位置を確認し、必要な列だけを values.batchGet で取得します。
+
+    Returns:
+        ヘッダー行を先頭にした行のリスト（列はcolumnsの順）
+    """
     # GIDからシート名を取得
     sheet_name = get_sheet_name_from_gid(service, spreadsheet_id, gid)
+    if not sheet_name:
+        # シートの追加・名前変更に備えてキャッシュを更新して再確認
+        sheet_name = get_sheet_name_from_gid(service, spreadsheet_id, gid, refresh=True)
 
     if not sheet_name:
         print(f"エラー: GID {gid} に対応するシートが見つかりません")
@@ -62,26 +132,54 @@ def fetch_category_mapping(service, spreadsheet_id, gid):
 
     print(f"シート名: {sheet_name}")
 
-    # シートのデータを取得
-    range_name = f"'{sheet_name}'!A:Z"  # A列からZ列まで取得
-    result = service.spreadsheets().values().get(
+    # ヘッダー行から列位置を確認
+    count_api_call('sheets')
+    header_result = service.spreadsheets().values().get(
+        spreadsheetId=spreadsheet_id,
+        range=f"'{sheet_name}'!1:1",
+        fields='values'
+    ).execute()
+    header = header_result.get('values', [[]])[0]
+
+    missing = [column for column in columns if column not in header]
+    if missing:
+        print(f"エラー: 列が見つかりません: {missing}（ヘッダー: {header}）")
+        return []
+
+    # 必要な列だけを列単位で取得
+    ranges = [f"'{sheet_name}'!{_column_letter(header.index(column))}:{_column_letter(header.index(column))}"
+              for column in columns]
+    count_api_call('sheets')
+    result = service.spreadsheets().values().batchGet(
         spreadsheetId=spreadsheet_id,
-        range=range_name
+        ranges=ranges,
+        majorDimension='COLUMNS',
+        fields='valueRanges(values)'
     ).execute()
 
-    values = result.get('values', [])
+    column_values = []
+    for value_range in result.get('valueRanges', []):
+        values = value_range.get('values', [[]])
+        column_values.append(values[0][1:] if values else [])
+
+    # 末尾の空セルは返ってこないため、最長の列に合わせて埋める
+    n_rows = max((len(values) for values in column_values), default=0)
+    rows = [
+        [values[i] if i < len(values) else '' for values in column_values]
+        for i in range(n_rows)
+    ]
+    rows = [row for row in rows if row[0]]
 
-    if not values:
+    if not rows:
         print('データが見つかりません')
         return []
 
-    print(f'{len(values)}行のデータを取得しました')
-    print(f'ヘッダー: {values[0]}')
+    print(f'{len(rows)}行のデータを取得しました（列: {columns}）')
     print(f'サンプル（最初の5行）:')
-    for i, row in enumerate(values[1:6], 1):
+    for i, row in enumerate(rows[:5], 1):
         print(f'{i}. {row}')
 
-    return values
+    return [list(columns)] + rows
 
 def save_mapping_to_csv(data, output_file):
     """マッピングデータをCSVに保存"""
@@ -89,7 +187,7 @@ def save_mapping_to_csv(data, output_file):
         print('保存するデータがありません')
         return
 
-    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
 
     with open(output_file, 'w', encoding='utf-8-sig', newline='') as f:
         writer = csv.writer(f)
@@ -97,14 +195,60 @@ def save_mapping_to_csv(data, output_file):
 
     print(f'\nマッピングデータを保存しました: {output_file}')
 
+@instrumented()
+def update_category_mapping(spreadsheet_id=SPREADSHEET_ID, gid=SHEET_GID,
+                            output_file=OUTPUT_FILE, force=False):
+    """
+    カテゴリマッピングを更新（スプレッドシートに変更がなければスキップ）
+
+    Returns:
+        True: 更新した / False: 変更なしでスキップ / None: 取得失敗
+    """
+    sheets_service, drive_service = authenticate_sheets()
+
+    version, modified_time = get_spreadsheet_version(drive_service, spreadsheet_id)
+    state = _load_json(MAPPING_STATE_FILE)
+
+    unchanged = (state.get('spreadsheet_id') == spreadsheet_id
+                 and state.get('gid') == gid
+                 and state.get('columns') == MAPPING_COLUMNS
+                 and state.get('version') == version
+                 and os.path.exists(output_file))
+    if unchanged and not force:
+        print(f"スプレッドシートに変更がないためスキップします（version: {version}, 更新日時: {modified_time}）")
+        return False
+
+    mapping_data = fetch_category_mapping(sheets_service, spreadsheet_id, gid)
+    if not mapping_data:
+        return None
+
+    save_mapping_to_csv(mapping_data, output_file)
+    _save_json({
+        'spreadsheet_id': spreadsheet_id,
+        'gid': gid,
+        'columns': MAPPING_COLUMNS,
+        'version': version,
+        'modified_time': modified_time,
+        'rows': len(mapping_data) - 1,
+        'fetched_at': datetime.now().isoformat(timespec='seconds'),
+    }, MAPPING_STATE_FILE)
+    return True
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='カテゴリマッピングをスプレッドシートから取得')
+    parser.add_argument('--force', action='store_true', help='変更がなくても再取得')
+    parser.add_argument('--output', default=OUTPUT_FILE, help=f'出力先（デフォルト: {OUTPUT_FILE}）')
+    args = parser.parse_args()
+
     try:
-        service = authenticate_sheets()
-        mapping_data = fetch_category_mapping(service, SPREADSHEET_ID, SHEET_GID)
+        updated = update_category_mapping(output_file=args.output, force=args.force)
 
-        if mapping_data:
-            save_mapping_to_csv(mapping_data, OUTPUT_FILE)
+        if updated is None:
+            exit(1)
+        if updated:
             print('\n✓ カテゴリマッピングの取得完了')
+        else:
+            print('\n✓ カテゴリマッピングは最新です')
     except Exception as e:
         print(f'エラー: {e}')
         import traceback
@@ -0,0 +1,491 @@
+#!/usr/bin/env python3
+"""
+ランログ（data/logs/run_log.jsonl）から実行履歴のパフォーマンスダッシュボード（HTML）を生成するスクリプト
+
+過去の実行ごとに、ステージ別の処理時間・行数・最大RSS・外部APIの呼び出し回数を集計し、
+直前の数回の実行（中央値）より閾値以上悪化したステージを回帰として強調表示します。
+ローカルのランログだけを読み、グラフもインラインSVGで描画するため、オフラインで表示できます。
+"""
+import sys
+import html
+import argparse
+import statistics
+from datetime import datetime
+from pathlib import Path
+
+from stage_metrics import RUN_LOG_FILE, get_run_log_file, load_run_log
+
+OUTPUT_FILE = './data/logs/performance_dashboard.html'
+
+# 表示する実行の数（新しい順）
+DEFAULT_RUNS = 30
+
+# 回帰の判定: 直前のBASELINE_RUNS回の中央値からREGRESSION_THRESHOLD%以上悪化、かつ差が最小値以上
+BASELINE_RUNS = 5
+REGRESSION_THRESHOLD = 20.0
+REGRESSION_MIN_SEC = 0.5
+REGRESSION_MIN_MB = 50.0
+
+# 回帰の判定対象（ラベル, 単位, 差の最小値の引数名）
+REGRESSION_METRICS = {
+    'wall_sec': ('処理時間', '秒', 'min_sec'),
+    'max_rss_mb': ('最大RSS', 'MB', 'min_mb'),
+}
+
+# 表に含めるステージの深さ（0: スクリプトの処理全体, 1: その手順）
+MAX_DEPTH = 1
+
+
+def _add(a, b):
+    """Noneを欠損として扱う加算"""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return a + b
+
+
+def summarize_runs(records, max_runs=DEFAULT_RUNS):
+    """
+    ランログを実行（run_id）ごとに集計
+
+    同じ実行で同じステージが複数回記録されている場合は、時間・行数・API呼び出しを合計し、
+    最大RSSは最大値を採用します。
+
+    Returns:
+        実行のリスト（開始時刻の古い順、最新のmax_runs件）
+    """
+    runs = {}
+    for r in records:
+        if r.get('depth', 0) > MAX_DEPTH:
+            continue
+
+        run = runs.setdefault(r['run_id'], {
+            'run_id': r['run_id'],
+            'started_at': r['started_at'],
+            'scripts': [],
+            'stages': {},
+            'wall_sec': 0.0,
+            'max_rss_mb': None,
+            'api_calls': {},
+            'errors': 0,
+        })
+        run['started_at'] = min(run['started_at'], r['started_at'])
+
+        stage = run['stages'].setdefault(r['stage'], {
+            'stage': r['stage'], 'depth': r['depth'], 'started_at': r['started_at'], 'count': 0,
+            'wall_sec': 0.0, 'cpu_sec': 0.0, 'max_rss_mb': None,
+            'rows_in': None, 'rows_out': None, 'api_calls': {}, 'status': 'ok',
+        })
+        stage['count'] += 1
+        stage['wall_sec'] += r['wall_sec']
+        stage['cpu_sec'] += r['cpu_sec']
+        if r.get('max_rss_mb') is not None:
+            stage['max_rss_mb'] = max(stage['max_rss_mb'] or 0.0, r['max_rss_mb'])
+        stage['rows_in'] = _add(stage['rows_in'], r.get('rows_in'))
+        stage['rows_out'] = _add(stage['rows_out'], r.get('rows_out'))
+        for service, calls in (r.get('api_calls') or {}).items():
+            stage['api_calls'][service] = stage['api_calls'].get(service, 0) + calls
+        if r['status'] != 'ok':
+            stage['status'] = r['status']
+
+        if r['depth'] == 0:
+            run['wall_sec'] += r['wall_sec']
+            if r.get('max_rss_mb') is not None:
+                run['max_rss_mb'] = max(run['max_rss_mb'] or 0.0, r['max_rss_mb'])
+            for service, calls in (r.get('api_calls') or {}).items():
+                run['api_calls'][service] = run['api_calls'].get(service, 0) + calls
+            if r.get('script') and r['script'] not in run['scripts']:
+                run['scripts'].append(r['script'])
+            if r['status'] != 'ok':
+                run['errors'] += 1
+
+    return sorted(runs.values(), key=lambda run: run['started_at'])[-max_runs:]
+
+
+def detect_regressions(runs, threshold=REGRESSION_THRESHOLD, baseline_runs=BASELINE_RUNS,
+                       min_sec=REGRESSION_MIN_SEC, min_mb=REGRESSION_MIN_MB):
+    """
+    各実行のステージを直前の実行と比較して回帰を検出
+
+    比較対象は、そのステージを含む直前のbaseline_runs回の実行の中央値です。
+
+    Returns:
+        回帰のリスト（run_id, stage, metric, value, baseline, change_pct）
+    """
+    min_diff = {'min_sec': min_sec, 'min_mb': min_mb}
+    history = {}
+    regressions = []
+
+    for run in runs:
+        for stage in run['stages'].values():
+            for metric, (_, _, min_key) in REGRESSION_METRICS.items():
+                value = stage[metric]
+                past = history.setdefault((stage['stage'], metric), [])
+
+                if value is not None and past and stage['status'] == 'ok':
+                    baseline = statistics.median(past[-baseline_runs:])
+                    if (baseline > 0 and value - baseline >= min_diff[min_key]
+                            and value > baseline * (1 + threshold / 100)):
+                        regressions.append({
+                            'run_id': run['run_id'],
+                            'stage': stage['stage'],
+                            'metric': metric,
+                            'value': value,
+                            'baseline': baseline,
+                            'change_pct': (value / baseline - 1) * 100,
+                        })
+
+                if value is not None and stage['status'] == 'ok':
+                    past.append(value)
+
+    return regressions
+
+
+def _format_number(value, digits=0):
+    if value is None:
+        return '-'
+    return f"{value:,.{digits}f}"
+
+
+def _format_api_calls(api_calls):
+    if not api_calls:
+        return '-'
+    return ', '.join(f"{service} {calls:,}" for service, calls in sorted(api_calls.items()))
+
+
+def _line_chart(points, unit, width=560, height=150):
+    """
+    インラインSVGの折れ線グラフ
+
+    Args:
+        points: (ラベル, 値, 回帰かどうか) のリスト（値がNoneの実行は線を途切れさせる）
+        unit: 値の単位
+    """
+    pad_left, pad_right, pad_top, pad_bottom = 56, 12, 12, 24
+    plot_width = width - pad_left - pad_right
+    plot_height = height - pad_top - pad_bottom
+
+    values = [value for _, value, _ in points if value is not None]
+    if not values:
+        return '<p class="muted">データがありません</p>'
+
+    y_max = max(values) * 1.1 or 1.0
+    step = plot_width / max(len(points) - 1, 1)
+
+    def xy(i, value):
+        return pad_left + i * step, pad_top + plot_height * (1 - value / y_max)
+
+    parts = [
+        f'<svg width="{width}" height="{height}" viewBox="0 0 {width} {height}" role="img">',
+        f'<line x1="{pad_left}" y1="{pad_top + plot_height}" x2="{width - pad_right}" y2="{pad_top + plot_height}" class="axis"/>',
+        f'<line x1="{pad_left}" y1="{pad_top}" x2="{pad_left}" y2="{pad_top + plot_height}" class="axis"/>',
+        f'<text x="{pad_left - 6}" y="{pad_top + 4}" class="tick" text-anchor="end">{_format_number(y_max, 1)}</text>',
+        f'<text x="{pad_left - 6}" y="{pad_top + plot_height}" class="tick" text-anchor="end">0 {html.escape(unit)}</text>',
+        f'<text x="{pad_left}" y="{height - 6}" class="tick">{html.escape(points[0][0])}</text>',
+        f'<text x="{width - pad_right}" y="{height - 6}" class="tick" text-anchor="end">{html.escape(points[-1][0])}</text>',
+    ]
+
+    # 欠損で区切った折れ線
+    segment = []
+    for i, (_, value, _) in enumerate(points + [('', None, False)]):
+        if value is None:
+            if len(segment) > 1:
+                coords = ' '.join(f"{x:.1f},{y:.1f}" for x, y in segment)
+                parts.append(f'<polyline points="{coords}" class="line"/>')
+            segment = []
+        else:
+            segment.append(xy(i, value))
+
+    for i, (label, value, regressed) in enumerate(points):
+        if value is None:
+            continue
+        x, y = xy(i, value)
+        css_class = 'point regressed' if regressed else 'point'
+        parts.append(f'<circle cx="{x:.1f}" cy="{y:.1f}" r="{5 if regressed else 3}" class="{css_class}">'
+                     f'<title>{html.escape(label)}: {_format_number(value, 2)} {html.escape(unit)}</title></circle>')
+
+    parts.append('</svg>')
+    return ''.join(parts)
+
+
+def _regressions_table(regressions, runs_by_id):
+    if not regressions:
+        return '<p class="ok">閾値を超えて悪化したステージはありません。</p>'
+
+    rows = []
+    for reg in sorted(regressions, key=lambda reg: (runs_by_id[reg['run_id']]['started_at'], reg['change_pct']), reverse=True):
+        label, unit, _ = REGRESSION_METRICS[reg['metric']]
+        rows.append(
+            f"<tr><td>{html.escape(reg['run_id'])}</td><td>{html.escape(reg['stage'])}</td><td>{label}</td>"
+            f"<td class='num'>{_format_number(reg['baseline'], 2)} {unit}</td>"
+            f"<td class='num'>{_format_number(reg['value'], 2)} {unit}</td>"
+            f"<td class='num regressed-text'>+{reg['change_pct']:.0f}%</td></tr>"
+        )
+    return ('<table><tr><th>run_id</th><th>ステージ</th><th>指標</th><th>基準（中央値）</th>'
+            '<th>今回</th><th>変化</th></tr>' + ''.join(rows) + '</table>')
+
+
+def _runs_table(runs, regression_counts):
+    rows = []
+    for run in reversed(runs):
+        count = regression_counts.get(run['run_id'], 0)
+        css_class = ' class="regressed-row"' if count else ''
+        rows.append(
+            f"<tr{css_class}><td>{html.escape(run['run_id'])}</td><td>{html.escape(run['started_at'][:19])}</td>"
+            f"<td>{html.escape(', '.join(run['scripts']))}</td>"
+            f"<td class='num'>{_format_number(run['wall_sec'], 2)}</td>"
+            f"<td class='num'>{_format_number(run['max_rss_mb'])}</td>"
+            f"<td>{_format_api_calls(run['api_calls'])}</td>"
+            f"<td class='num'>{count or '-'}</td><td class='num'>{run['errors'] or '-'}</td></tr>"
+        )
+    return ('<table><tr><th>run_id</th><th>開始</th><th>スクリプト</th><th>合計時間(秒)</th>'
+            '<th>最大RSS(MB)</th><th>API呼び出し</th><th>回帰</th><th>エラー</th></tr>' + ''.join(rows) + '</table>')
+
+
+def _stage_trends(runs, regressions):
+    regressed = {(reg['run_id'], reg['stage'], reg['metric']) for reg in regressions}
+    stage_names = sorted({name for run in runs for name, stage in run['stages'].items() if stage['depth'] == 0})
+
+    sections = []
+    for name in stage_names:
+        charts = []
+        for metric, (label, unit, _) in REGRESSION_METRICS.items():
+            points = [
+                (run['run_id'],
+                 run['stages'][name][metric] if name in run['stages'] else None,
+                 (run['run_id'], name, metric) in regressed)
+                for run in runs
+            ]
+            charts.append(f'<div class="chart"><h4>{label}（{unit}）</h4>{_line_chart(points, unit)}</div>')
+
+        latest = next(run['stages'][name] for run in reversed(runs) if name in run['stages'])
+        summary = (f"最新: {_format_number(latest['wall_sec'], 2)}秒 / "
+                   f"行数 {_format_number(latest['rows_in'])} → {_format_number(latest['rows_out'])} / "
+                   f"API {_format_api_calls(latest['api_calls'])}")
+        sections.append(f'<div class="stage"><h3>{html.escape(name)}</h3><p class="muted">{summary}</p>'
+                        f'<div class="charts">{"".join(charts)}</div></div>')
+
+    return ''.join(sections)
+
+
+def _latest_run_table(run, regressions):
+    regressed = {reg['stage'] for reg in regressions if reg['run_id'] == run['run_id']}
+    rows = []
+    for stage in sorted(run['stages'].values(), key=lambda stage: (stage['started_at'], stage['depth'])):
+        label = stage['stage'].rsplit('/', 1)[-1]
+        css_class = ' class="regressed-row"' if stage['stage'] in regressed else ''
+        mark = ' ✗' if stage['status'] != 'ok' else ''
+        rows.append(
+            f"<tr{css_class}><td style='padding-left:{8 + stage['depth'] * 20}px'>{html.escape(label)}{mark}</td>"
+            f"<td class='num'>{_format_number(stage['wall_sec'], 2)}</td>"
+            f"<td class='num'>{_format_number(stage['cpu_sec'], 2)}</td>"
+            f"<td class='num'>{_format_number(stage['max_rss_mb'])}</td>"
+            f"<td class='num'>{_format_number(stage['rows_in'])}</td>"
+            f"<td class='num'>{_format_number(stage['rows_out'])}</td>"
+            f"<td>{_format_api_calls(stage['api_calls'])}</td></tr>"
+        )
+    return ('<table><tr><th>ステージ</th><th>時間(秒)</th><th>CPU(秒)</th><th>最大RSS(MB)</th>'
+            '<th>入力行数</th><th>出力行数</th><th>API呼び出し</th></tr>' + ''.join(rows) + '</table>')
+
+
+def generate_dashboard(log_file, output_file, max_runs=DEFAULT_RUNS, threshold=REGRESSION_THRESHOLD,
+                       baseline_runs=BASELINE_RUNS, min_sec=REGRESSION_MIN_SEC, min_mb=REGRESSION_MIN_MB):
+    """
+    ランログからダッシュボードのHTMLを生成
+
+    Returns:
+        最新の実行で検出した回帰のリスト（ランログがない場合はNone）
+    """
+    runs = summarize_runs(load_run_log(log_file), max_runs)
+    if not runs:
+        print(f"ランログがありません: {log_file}")
+        return None
+
+    regressions = detect_regressions(runs, threshold, baseline_runs, min_sec, min_mb)
+    runs_by_id = {run['run_id']: run for run in runs}
+    regression_counts = {}
+    for reg in regressions:
+        regression_counts[reg['run_id']] = regression_counts.get(reg['run_id'], 0) + 1
+
+    latest = runs[-1]
+    latest_regressions = [reg for reg in regressions if reg['run_id'] == latest['run_id']]
+
+    html_template = f"""<!DOCTYPE html>
+<html lang="ja">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>SEO ETL Pipeline - パフォーマンスダッシュボード</title>
+    <style>
+        body {{
+            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+            margin: 0;
+            padding: 20px;
+            background-color: #f5f5f5;
+        }}
+        .container {{
+            max-width: 1400px;
+            margin: 0 auto;
+            background: white;
+            padding: 30px;
+            border-radius: 8px;
+            box-shadow: 0 2px 8px rgba(0,0,0,0.1);
+        }}
+        h1 {{
+            color: #333;
+            border-bottom: 3px solid #01579b;
+            padding-bottom: 10px;
+            margin-bottom: 20px;
+        }}
+        h2 {{
+            color: #01579b;
+            margin-top: 40px;
+        }}
+        h3 {{
+            margin-bottom: 4px;
+        }}
+        h4 {{
+            margin: 8px 0 4px;
+            color: #666;
+            font-weight: normal;
+        }}
+        .description, .muted {{
+            color: #666;
+            line-height: 1.6;
+        }}
+        table {{
+            border-collapse: collapse;
+            width: 100%;
+            font-size: 0.9em;
+        }}
+        th, td {{
+            border-bottom: 1px solid #ddd;
+            padding: 6px 8px;
+            text-align: left;
+        }}
+        th {{
+            background: #eef3f8;
+        }}
+        td.num {{
+            text-align: right;
+            font-variant-numeric: tabular-nums;
+        }}
+        .regressed-row {{
+            background: #fdecea;
+        }}
+        .regressed-text {{
+            color: #c62828;
+            font-weight: bold;
+        }}
+        .ok {{
+            color: #2e7d32;
+        }}
+        .stage {{
+            margin-top: 24px;
+        }}
+        .charts {{
+            display: flex;
+            flex-wrap: wrap;
+            gap: 24px;
+        }}
+        .axis {{
+            stroke: #bbb;
+        }}
+        .tick {{
+            font-size: 10px;
+            fill: #999;
+        }}
+        .line {{
+            fill: none;
+            stroke: #01579b;
+            stroke-width: 2;
+        }}
+        .point {{
+            fill: #01579b;
+        }}
+        .point.regressed {{
+            fill: #c62828;
+        }}
+        .footer {{
+            margin-top: 30px;
+            padding-top: 20px;
+            border-top: 1px solid #ddd;
+            color: #999;
+            font-size: 0.9em;
+            text-align: center;
+        }}
+    </style>
+</head>
+<body>
+    <div class="container">
+        <h1>SEO ETL Pipeline - パフォーマンスダッシュボード</h1>
+        <div class="description">
+            <ul>
+                <li><strong>対象</strong>: 直近{len(runs)}回の実行（ランログ: <code>{html.escape(str(log_file))}</code>）</li>
+                <li><strong>最新の実行</strong>: {html.escape(latest['run_id'])}（{_format_number(latest['wall_sec'], 2)}秒、回帰 {len(latest_regressions)}件）</li>
+                <li><strong>回帰の判定</strong>: 直前{baseline_runs}回の中央値から{threshold:.0f}%以上悪化
+                    （処理時間は{min_sec}秒以上、最大RSSは{min_mb:.0f}MB以上の差）</li>
+            </ul>
+        </div>
+
+        <h2>回帰</h2>
+        {_regressions_table(regressions, runs_by_id)}
+
+        <h2>実行履歴</h2>
+        {_runs_table(runs, regression_counts)}
+
+        <h2>ステージ別の推移</h2>
+        {_stage_trends(runs, regressions)}
+
+        <h2>最新の実行の内訳</h2>
+        {_latest_run_table(latest, regressions)}
+
+        <div class="footer">
+            Generated by SEO ETL Pipeline | {datetime.now().strftime('%Y-%m-%d %H:%M')} | 実行: <code>make dashboard</code>
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+    output_file = Path(output_file)
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write(html_template)
+
+    print(f"✓ ダッシュボードを生成しました: {output_file}（{len(runs)}回の実行）")
+    print(f"  ブラウザで開く: open {output_file}")
+
+    if latest_regressions:
+        print(f"\n⚠ 最新の実行（{latest['run_id']}）で{len(latest_regressions)}件の回帰を検出しました:")
+        for reg in latest_regressions:
+            label, unit, _ = REGRESSION_METRICS[reg['metric']]
+            print(f"  - {reg['stage']} {label}: {reg['baseline']:.2f}{unit} → {reg['value']:.2f}{unit}（+{reg['change_pct']:.0f}%）")
+
+    return latest_regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='ランログから実行履歴のパフォーマンスダッシュボードを生成')
+    parser.add_argument('--log', default=get_run_log_file() or RUN_LOG_FILE, help=f'ランログ（デフォルト: {RUN_LOG_FILE}）')
+    parser.add_argument('--output', default=OUTPUT_FILE, help=f'出力先（デフォルト: {OUTPUT_FILE}）')
+    parser.add_argument('--runs', type=int, default=DEFAULT_RUNS, help=f'表示する実行の数（デフォルト: {DEFAULT_RUNS}）')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help=f'回帰とみなす悪化率（%%、デフォルト: {REGRESSION_THRESHOLD}）')
+    parser.add_argument('--baseline-runs', type=int, default=BASELINE_RUNS,
+                        help=f'比較対象にする直前の実行の数（デフォルト: {BASELINE_RUNS}）')
+    parser.add_argument('--min-sec', type=float, default=REGRESSION_MIN_SEC,
+                        help=f'回帰とみなす処理時間の最小の差（秒、デフォルト: {REGRESSION_MIN_SEC}）')
+    parser.add_argument('--min-mb', type=float, default=REGRESSION_MIN_MB,
+                        help=f'回帰とみなす最大RSSの最小の差（MB、デフォルト: {REGRESSION_MIN_MB}）')
+    parser.add_argument('--fail-on-regression', action='store_true', help='最新の実行に回帰があれば終了コード1で終了')
+    args = parser.parse_args()
+
+    latest_regressions = generate_dashboard(args.log, args.output, args.runs, args.threshold,
+                                            args.baseline_runs, args.min_sec, args.min_mb)
+
+    if latest_regressions is None:
+        sys.exit(1)
+    if latest_regressions and args.fail_on_regression:
+        sys.exit(1)
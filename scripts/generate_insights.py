@@ -10,68 +10,100 @@ Claude Codeを使って前処理済みデータから考察を生成
 
     # Search Consoleデータも含める
     python scripts/generate_insights.py --search-console data/search_console/search_console_weekly_20251114.csv
+
+    # キャッシュを使わずに再生成
+    python scripts/generate_insights.py --no-cache
+
+    # ストリーミングで生成（受信した分から順にファイルへ書き込む）
+    python scripts/generate_insights.py --stream
+
+    # カテゴリ別の深掘り考察を並列に生成
+    python scripts/generate_insights.py --by-category --concurrency 4
 """
 import os
 import sys
 import glob
-import pandas as pd
+import asyncio
+import hashlib
+import json
+import math
+import random
+import shutil
+import time
 from datetime import datetime
-import anthropic
-
-# 環境変数から設定を読み込み
-def load_env():
-    """簡易的な.envファイル読み込み"""
-    env_file = '.env'
-    if os.path.exists(env_file):
-        with open(env_file, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#') and '=' in line:
-                    key, value = line.split('=', 1)
-                    os.environ[key] = value
+
+from lazy_imports import lazy_import
+from category_index import attach_categories
+from profiling import enable_profiling
+from seo_etl import files
+from seo_etl.env import load_env
+from stage_metrics import count_api_call, instrumented
+
+pd = lazy_import('pandas')
+anthropic = lazy_import('anthropic')
+
+# Claude API設定
+CLAUDE_MODEL = "claude-3-5-sonnet-20241022"
+MAX_OUTPUT_TOKENS = 4000
+TEMPERATURE = 0.3
+
+# プロンプト（入力）のトークン上限。超える場合は重要度の低い行から削る
+PROMPT_TOKEN_BUDGET = 8000
+
+# 考察のキャッシュ（同じプロンプトの再実行ではAPIを呼ばない）
+CACHE_DIR = './data/cache/claude_insights'
+CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+# カテゴリ別考察（非同期・並列実行）
+CATEGORY_MAX_OUTPUT_TOKENS = 1500
+DEFAULT_CONCURRENCY = 4
+MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 2.0
+RETRY_MAX_DELAY = 60.0
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504, 529)
 
 def get_latest_files():
     """最新の分析結果ファイルを取得"""
-    seo_files = sorted(glob.glob('./data/analysis/weekly_analysis_*.csv'))
-    search_console_files = sorted(glob.glob('./data/search_console/search_console_weekly_*.csv'))
-    insights_files = sorted(glob.glob('./data/analysis/insights_report_*.txt'))
-
-    result = {}
-
-    if seo_files:
-        result['seo_csv'] = seo_files[-1]
-    if insights_files:
-        result['seo_txt'] = insights_files[-1]
-    if search_console_files:
-        result['search_console'] = search_console_files[-1]
-
-    return result
-
-def load_seo_data(csv_path, txt_path=None):
-    """SEOランク分析データを読み込み"""
-    data_summary = {}
+    latest = {
+        'seo_csv': files.latest_output(files.WEEKLY_ANALYSIS),
+        'seo_txt': files.latest_output(files.INSIGHTS_REPORT),
+        'search_console': files.latest_output(files.SEARCH_CONSOLE_WEEKLY),
+    }
+    return {key: path for key, path in latest.items() if path}
 
-    # CSVデータを読み込み
-    if os.path.exists(csv_path):
-        df = pd.read_csv(csv_path)
-        data_summary['total_records'] = len(df)
-        data_summary['date_range'] = f"{df['date'].min()} ～ {df['date'].max()}"
+def summarize_seo_frame(df):
+    """SEOランク分析データ（weekly_analysis）の要約を作成"""
+    return {
+        'total_records': len(df),
+        'date_range': f"{df['date'].min()} ～ {df['date'].max()}",
 
         # Top改善/下落
-        data_summary['top_improved'] = df.nsmallest(10, 'rank_diff')[
+        'top_improved': df.nsmallest(10, 'rank_diff')[
             ['keyword', 'url', 'previous_rank', 'current_rank', 'rank_diff']
-        ].to_dict('records')
+        ].to_dict('records'),
 
-        data_summary['top_declined'] = df.nlargest(10, 'rank_diff')[
+        'top_declined': df.nlargest(10, 'rank_diff')[
             ['keyword', 'url', 'previous_rank', 'current_rank', 'rank_diff']
-        ].to_dict('records')
+        ].to_dict('records'),
 
         # 統計
-        data_summary['stats'] = {
+        'stats': {
             'avg_rank_change': df['rank_diff'].mean(),
             'improved_count': (df['rank_diff'] < 0).sum(),
             'declined_count': (df['rank_diff'] > 0).sum(),
-        }
+        },
+    }
+
+@instrumented()
+def load_seo_data(csv_path, txt_path=None):
+    """SEOランク分析データを読み込み"""
+    data_summary = {}
+
+    # CSVデータを読み込み
+    if os.path.exists(csv_path):
+        df = pd.read_csv(csv_path)
+        data_summary.update(summarize_seo_frame(df))
 
     # テキストレポートを読み込み
     if txt_path and os.path.exists(txt_path):
@@ -80,6 +112,33 @@ def load_seo_data(csv_path, txt_path=None):
 
     return data_summary
 
+@instrumented()
+def load_seo_category_data(csv_path, max_categories=None):
+    """
+    SEOランク分析データをカテゴリ（カテゴリ列）別に要約
+
+    Args:
+        csv_path: weekly_analysis CSVのパス
+        max_categories: データ数の多い順に対象とするカテゴリ数（Noneの場合は全カテゴリ）
+
+    Returns:
+        {カテゴリ名: summarize_seo_frameの結果}（データ数の多い順）
+    """
+    # カテゴリ列がない・欠けている行はカテゴリインデックスから補完
+    df = attach_categories(pd.read_csv(csv_path), keyword_col='keyword')
+
+    if 'カテゴリ' not in df.columns or df['カテゴリ'].notna().sum() == 0:
+        return {}
+
+    df = df[df['カテゴリ'].notna()]
+    categories = df['カテゴリ'].value_counts().index
+    if max_categories:
+        categories = categories[:max_categories]
+
+    grouped = dict(tuple(df[df['カテゴリ'].isin(categories)].groupby('カテゴリ')))
+    return {category: summarize_seo_frame(grouped[category]) for category in categories}
+
+@instrumented()
 def load_search_console_data(csv_path):
     """Search Console分析データを読み込み（サンプルのみ）"""
     if not os.path.exists(csv_path):
@@ -119,10 +178,8 @@ def load_search_console_data(csv_path):
 
     return data_summary
 
-def generate_insights_with_claude(seo_data, search_console_data=None):
-    """Claude APIを使って考察を生成"""
-
-    # APIキーを取得
+def require_api_key():
+    """環境変数のAPIキー（設定されていない場合はセットアップ手順を表示して終了）"""
     api_key = os.getenv('ANTHROPIC_API_KEY')
     if not api_key:
         print("❌ エラー: ANTHROPIC_API_KEYが設定されていません")
@@ -134,20 +191,120 @@ def generate_insights_with_claude(seo_data, search_console_data=None):
         print("   ANTHROPIC_API_KEY=sk-ant-xxxxx")
         sys.exit(1)
 
+    return api_key
+
+def create_client():
+    """環境変数のAPIキーからClaude APIクライアントを作成"""
+    return anthropic.Anthropic(api_key=require_api_key())
+
+def response_cache_key(model, temperature, max_tokens, prompt):
+    """キャッシュキー（モデル・temperature・max_tokens・プロンプトのハッシュ）"""
+    prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+    key_source = json.dumps([model, temperature, max_tokens, prompt_hash])
+    return hashlib.sha256(key_source.encode('utf-8')).hexdigest()
+
+def load_cached_response(key, cache_dir=CACHE_DIR, ttl_seconds=CACHE_TTL_SECONDS):
+    """キャッシュ済みの考察を取得（存在しない・期限切れの場合はNone）"""
+    cache_file = os.path.join(cache_dir, f'{key}.json')
+    if not os.path.exists(cache_file):
+        return None
+
+    # 壊れたエントリ（JSONでない・created_at/textがない・型が違う）はキャッシュミスとして扱う
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+        expired = time.time() - float(entry['created_at']) > ttl_seconds
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+    if expired:
+        try:
+            os.remove(cache_file)
+        except OSError:
+            pass
+        return None
+
+    text = entry.get('text')
+    return text if isinstance(text, str) else None
+
+def save_cached_response(key, text, metadata, cache_dir=CACHE_DIR):
+    """考察をキャッシュに保存"""
+    os.makedirs(cache_dir, exist_ok=True)
+
+    entry = dict(metadata, created_at=time.time(), text=text)
+    cache_file = os.path.join(cache_dir, f'{key}.json')
+    tmp_file = cache_file + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(entry, f, ensure_ascii=False)
+    os.replace(tmp_file, cache_file)
+
+def evict_cache(cache_dir=CACHE_DIR, ttl_seconds=CACHE_TTL_SECONDS, max_bytes=CACHE_MAX_BYTES):
+    """期限切れのキャッシュを削除し、合計サイズが上限を超える場合は古い順に削除"""
+    if not os.path.isdir(cache_dir):
+        return 0
+
+    now = time.time()
+    entries = []
+    removed = 0
+
+    for cache_file in glob.glob(os.path.join(cache_dir, '*.json')):
+        stat = os.stat(cache_file)
+        if now - stat.st_mtime > ttl_seconds:
+            os.remove(cache_file)
+            removed += 1
+        else:
+            entries.append((stat.st_mtime, stat.st_size, cache_file))
+
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, cache_file in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        os.remove(cache_file)
+        total_bytes -= size
+        removed += 1
+
+    return removed
+
+@instrumented()
+def generate_insights_with_claude(seo_data, search_console_data=None, token_budget=PROMPT_TOKEN_BUDGET,
+                                  use_cache=True, client=None, cache_dir=CACHE_DIR):
+    """
+    Claude APIを使って考察を生成
+
+    同じモデル・temperature・プロンプトの結果がキャッシュにあればAPIを呼ばずに返す。
+
+    Args:
+        seo_data: load_seo_dataの結果
+        search_console_data: load_search_console_dataの結果
+        token_budget: プロンプトのトークン上限
+        use_cache: Falseの場合はキャッシュを参照・保存しない
+        client: Claude APIクライアント（Noneの場合はANTHROPIC_API_KEYから作成）
+        cache_dir: キャッシュディレクトリ
+    """
     # プロンプトを構築
-    prompt = build_prompt(seo_data, search_console_data)
+    prompt = build_prompt(seo_data, search_console_data, token_budget=token_budget)
+    print(f"プロンプト: 約{estimate_tokens(prompt):,}トークン（上限: {token_budget:,}）")
+
+    cache_key = response_cache_key(CLAUDE_MODEL, TEMPERATURE, MAX_OUTPUT_TOKENS, prompt)
+    if use_cache:
+        cached = load_cached_response(cache_key, cache_dir)
+        if cached is not None:
+            print(f"✓ キャッシュ済みの考察を使用します（キー: {cache_key[:12]}）")
+            return cached
 
     # Claude APIクライアントを作成
-    client = anthropic.Anthropic(api_key=api_key)
+    if client is None:
+        client = create_client()
 
     print("Claude APIで考察を生成中...")
-    print(f"モデル: claude-3-5-sonnet-20241022")
+    print(f"モデル: {CLAUDE_MODEL}")
 
     # APIリクエスト
+    count_api_call('claude')
     message = client.messages.create(
-        model="claude-3-5-sonnet-20241022",
-        max_tokens=4000,
-        temperature=0.3,
+        model=CLAUDE_MODEL,
+        max_tokens=MAX_OUTPUT_TOKENS,
+        temperature=TEMPERATURE,
         messages=[
             {
                 "role": "user",
@@ -156,12 +313,108 @@ def generate_insights_with_claude(seo_data, search_console_data=None):
         ]
     )
 
-    return message.content[0].text
-
-def build_prompt(seo_data, search_console_data=None):
-    """考察生成用のプロンプトを構築"""
-
-    prompt = f"""あなたはSEOデータ分析の専門家です。以下のデータを分析して、包括的な考察レポートを日本語で作成してください。
+    text = message.content[0].text
+
+    if use_cache:
+        save_cached_response(cache_key, text, {
+            'model': CLAUDE_MODEL,
+            'temperature': TEMPERATURE,
+            'max_tokens': MAX_OUTPUT_TOKENS,
+        }, cache_dir)
+        evict_cache(cache_dir)
+
+    return text
+
+def estimate_tokens(text):
+    """
+    トークン数をローカルで概算
+
+    Claudeのトークナイザは日本語（非ASCII文字）がおおむね1文字1トークン、
+    英数字・記号がおおむね4文字1トークンなので、その比率で見積もる。
+    """
+    return math.ceil(_token_cost(text))
+
+def _token_cost(text):
+    """estimate_tokensの切り上げ前の値（セクション単位の積み上げ用）"""
+    ascii_chars = len(text.encode('ascii', errors='ignore'))
+    return (len(text) - ascii_chars) + ascii_chars / 4
+
+def _prompt_section(priority, header, rows=None, footer=''):
+    """
+    プロンプトのセクションを作成
+
+    Args:
+        priority: 優先度（小さいほど重要、0は削らない）
+        header: 行の前に置く固定テキスト
+        rows: 重要度順の行（予算超過時は末尾から削る）
+        footer: 行の後に置く固定テキスト
+    """
+    return {'priority': priority, 'header': header, 'rows': list(rows or []), 'footer': footer}
+
+def _split_report_sections(text_report):
+    """
+    analyze_trends.pyの示唆レポートを【見出し】単位に分割
+
+    Returns:
+        (見出し, 注記・表ヘッダー行, データ行) のリスト
+    """
+    sections = []
+
+    for line in text_report.splitlines():
+        stripped = line.strip()
+        if stripped.startswith('【'):
+            sections.append({'title': stripped, 'header_lines': [], 'rows': [], 'state': 'notes'})
+            continue
+        # 最初の見出しより前（分析期間・総データ数）は基本情報と重複するため使わない
+        if not sections or not stripped:
+            continue
+
+        section = sections[-1]
+        if section['state'] == 'notes' and stripped.startswith('（'):
+            section['header_lines'].append(line)
+        elif section['state'] == 'notes' and ':' not in stripped and stripped != '該当なし':
+            # DataFrame.to_stringの列見出し行
+            section['header_lines'].append(line)
+            section['state'] = 'table_header'
+        elif section['state'] == 'table_header' and len(stripped.split()) == 1:
+            # groupby結果のインデックス名行（例: カテゴリ）
+            section['header_lines'].append(line)
+            section['state'] = 'rows'
+        else:
+            section['rows'].append(line)
+            section['state'] = 'rows'
+
+    return [(s['title'], s['header_lines'], s['rows']) for s in sections]
+
+def _dedupe_report_rows(rows, keywords):
+    """Top10の表に既に載っているキーワードの行と、同一行の重複を除く"""
+    seen = set()
+    deduped = []
+    for row in rows:
+        stripped = row.strip()
+        if stripped in seen:
+            continue
+        if any(stripped == kw or stripped.startswith(kw + ' ') for kw in keywords):
+            continue
+        seen.add(stripped)
+        deduped.append(row)
+    return deduped
+
+# 示唆レポートの見出しごとの優先度（小さいほど重要）
+REPORT_SECTION_PRIORITY = {
+    '統計サマリー': 3,
+    'カテゴリ別サマリー': 4,
+    '継続的に順位が改善': 5,
+    '継続的に順位が悪化': 5,
+    '最も改善した': 6,
+    '最も悪化した': 6,
+}
+
+def build_prompt_sections(seo_data, search_console_data=None):
+    """考察生成用のプロンプトをセクション単位で構築"""
+    sections = []
+
+    sections.append(_prompt_section(0, f"""あなたはSEOデータ分析の専門家です。以下のデータを分析して、包括的な考察レポートを日本語で作成してください。
 
 # SEOランク分析データ
 
@@ -171,20 +424,37 @@ def build_prompt(seo_data, search_console_data=None):
 - 順位改善: {seo_data.get('stats', {}).get('improved_count', 0)}件
 - 順位下落: {seo_data.get('stats', {}).get('declined_count', 0)}件
 - 平均順位変化: {seo_data.get('stats', {}).get('avg_rank_change', 0):.2f}
-
-## Top 10 順位改善キーワード
-"""
-
-    for i, item in enumerate(seo_data.get('top_improved', [])[:10], 1):
-        prompt += f"{i}. {item['keyword']}: {item['previous_rank']:.0f}位→{item['current_rank']:.0f}位 ({item['rank_diff']:+.0f})\n"
-
-    prompt += "\n## Top 10 順位下落キーワード\n"
-    for i, item in enumerate(seo_data.get('top_declined', [])[:10], 1):
-        prompt += f"{i}. {item['keyword']}: {item['previous_rank']:.0f}位→{item['current_rank']:.0f}位 ({item['rank_diff']:+.0f})\n"
+"""))
+
+    top_improved = seo_data.get('top_improved', [])[:10]
+    top_declined = seo_data.get('top_declined', [])[:10]
+
+    sections.append(_prompt_section(1, "\n## Top 10 順位改善キーワード\n", [
+        f"{i}. {item['keyword']}: {item['previous_rank']:.0f}位→{item['current_rank']:.0f}位 ({item['rank_diff']:+.0f})\n"
+        for i, item in enumerate(top_improved, 1)
+    ]))
+    sections.append(_prompt_section(1, "\n## Top 10 順位下落キーワード\n", [
+        f"{i}. {item['keyword']}: {item['previous_rank']:.0f}位→{item['current_rank']:.0f}位 ({item['rank_diff']:+.0f})\n"
+        for i, item in enumerate(top_declined, 1)
+    ]))
+
+    # 示唆レポート（推移分析）を見出し単位で追加。Top10の表と重複する行は除く
+    if seo_data.get('text_report'):
+        keywords = {str(item['keyword']) for item in top_improved + top_declined}
+        for title, header_lines, rows in _split_report_sections(seo_data['text_report']):
+            priority = next(
+                (p for key, p in REPORT_SECTION_PRIORITY.items() if key in title),
+                max(REPORT_SECTION_PRIORITY.values()) + 1
+            )
+            rows = _dedupe_report_rows(rows, keywords)
+            if not rows:
+                continue
+            header = f"\n## 推移分析: {title.strip('【】')}\n" + ''.join(f"{line}\n" for line in header_lines)
+            sections.append(_prompt_section(priority, header, [f"{row}\n" for row in rows]))
 
     # Search Consoleデータがあれば追加
     if search_console_data:
-        prompt += f"""
+        sections.append(_prompt_section(0, f"""
 
 # Search Console週次分析データ
 
@@ -195,17 +465,66 @@ def build_prompt(seo_data, search_console_data=None):
 - 平均インプレッション変化: {search_console_data.get('stats', {}).get('avg_imp_change', 0):+.1f}
 - 平均CTR変化: {search_console_data.get('stats', {}).get('avg_ctr_change', 0):+.4f}
 - 平均順位変化: {search_console_data.get('stats', {}).get('avg_position_change', 0):+.2f}
+"""))
+        sections.append(_prompt_section(2, "\n## Top 5 インプレッション増加\n", [
+            f"{i}. r_hash: {item['r_hash'][:16]}... | {item['week_start']} | {item['prev_impressions']:,.0f}→{item['total_impressions']:,.0f} ({item['imp_change_rate']:+.1f}%)\n"
+            for i, item in enumerate(search_console_data.get('top_impression_increase', [])[:5], 1)
+        ]))
+        sections.append(_prompt_section(2, "\n## Top 5 CTR改善\n", [
+            f"{i}. r_hash: {item['r_hash'][:16]}... | {item['week_start']} | CTR: {item['prev_ctr']:.4f}→{item['avg_ctr']:.4f} ({item['ctr_change_rate']:+.1f}%)\n"
+            for i, item in enumerate(search_console_data.get('top_ctr_improvement', [])[:5], 1)
+        ]))
+
+    sections.append(_prompt_section(0, build_request_text(search_console_data is not None)))
+
+    return sections
+
+def fit_sections_to_budget(sections, token_budget):
+    """
+    プロンプトが予算内に収まるよう、優先度の低いセクションの末尾の行から削る
+
+    行がすべて削られたセクションは見出しごと除く。優先度0のセクションは削らない。
+    """
+    sections = [dict(s, rows=list(s['rows'])) for s in sections]
+
+    def section_cost(section):
+        if not section['rows'] and section['priority'] > 0:
+            return 0
+        return _token_cost(section['header']) + _token_cost(section['footer'])
+
+    row_costs = [[_token_cost(row) for row in s['rows']] for s in sections]
+    total = sum(section_cost(s) + sum(costs) for s, costs in zip(sections, row_costs))
+
+    # 優先度の低い順（同じ優先度なら後ろのセクションから）
+    trim_order = sorted(
+        (i for i, s in enumerate(sections) if s['priority'] > 0),
+        key=lambda i: (sections[i]['priority'], i),
+        reverse=True
+    )
 
-## Top 5 インプレッション増加
-"""
-        for i, item in enumerate(search_console_data.get('top_impression_increase', [])[:5], 1):
-            prompt += f"{i}. r_hash: {item['r_hash'][:16]}... | {item['week_start']} | {item['prev_impressions']:,.0f}→{item['total_impressions']:,.0f} ({item['imp_change_rate']:+.1f}%)\n"
+    for i in trim_order:
+        while total > token_budget and sections[i]['rows']:
+            sections[i]['rows'].pop()
+            total -= row_costs[i].pop()
+            if not sections[i]['rows']:
+                total -= _token_cost(sections[i]['header']) + _token_cost(sections[i]['footer'])
+        if total <= token_budget:
+            break
 
-        prompt += "\n## Top 5 CTR改善\n"
-        for i, item in enumerate(search_console_data.get('top_ctr_improvement', [])[:5], 1):
-            prompt += f"{i}. r_hash: {item['r_hash'][:16]}... | {item['week_start']} | CTR: {item['prev_ctr']:.4f}→{item['avg_ctr']:.4f} ({item['ctr_change_rate']:+.1f}%)\n"
+    return [s for s in sections if s['rows'] or s['priority'] == 0]
 
-    prompt += """
+def render_prompt(sections):
+    """セクションを連結してプロンプト文字列にする"""
+    return ''.join(s['header'] + ''.join(s['rows']) + s['footer'] for s in sections)
+
+def build_prompt(seo_data, search_console_data=None, token_budget=PROMPT_TOKEN_BUDGET):
+    """考察生成用のプロンプトを構築（token_budgetを超える場合は重要度の低い行から削る）"""
+    sections = build_prompt_sections(seo_data, search_console_data)
+    return render_prompt(fit_sections_to_budget(sections, token_budget))
+
+def build_request_text(include_search_console):
+    """依頼内容（出力形式の指示）"""
+    prompt = """
 
 # 依頼内容
 
@@ -224,7 +543,7 @@ def build_prompt(seo_data, search_console_data=None):
   - 競合の影響や市場変化の可能性
 """
 
-    if search_console_data:
+    if include_search_console:
         prompt += """
 ### 2.2 Search Console分析
 - インプレッション動向
@@ -264,22 +583,329 @@ def build_prompt(seo_data, search_console_data=None):
 
     return prompt
 
-def save_insights(insights_text, output_dir='./data/insights'):
-    """考察結果を保存"""
-    os.makedirs(output_dir, exist_ok=True)
+def build_category_prompt(category, category_data, token_budget=PROMPT_TOKEN_BUDGET):
+    """カテゴリ別の深掘り考察用プロンプトを構築"""
+    stats = category_data.get('stats', {})
+    sections = [
+        _prompt_section(0, f"""あなたはSEOデータ分析の専門家です。以下は「{category}」カテゴリのSEOランク分析データです。このカテゴリに絞った深掘り考察を日本語で作成してください。
+
+# 「{category}」カテゴリのSEOランク分析データ
+
+## 基本情報
+- データ期間: {category_data.get('date_range', 'N/A')}
+- 総レコード数: {category_data.get('total_records', 0):,}件
+- 順位改善: {stats.get('improved_count', 0)}件
+- 順位下落: {stats.get('declined_count', 0)}件
+- 平均順位変化: {stats.get('avg_rank_change', 0):.2f}
+"""),
+        _prompt_section(1, "\n## Top 10 順位改善キーワード\n", [
+            f"{i}. {item['keyword']}: {item['previous_rank']:.0f}位→{item['current_rank']:.0f}位 ({item['rank_diff']:+.0f})\n"
+            for i, item in enumerate(category_data.get('top_improved', [])[:10], 1)
+        ]),
+        _prompt_section(1, "\n## Top 10 順位下落キーワード\n", [
+            f"{i}. {item['keyword']}: {item['previous_rank']:.0f}位→{item['current_rank']:.0f}位 ({item['rank_diff']:+.0f})\n"
+            for i, item in enumerate(category_data.get('top_declined', [])[:10], 1)
+        ]),
+        _prompt_section(0, """
+
+# 依頼内容
+
+以下の形式で、このカテゴリの考察を簡潔に作成してください（見出しは###から始める）：
+
+### 概況
+- このカテゴリの順位動向を2-3行で要約
+
+### 順位改善・下落のパターン
+- 改善/下落したキーワードの共通点（地域名・職種など）
+- 考えられる要因
 
+### 改善提案
+- このカテゴリで優先すべきアクション（2-3個）
+
+**注意事項:**
+- データに基づいた客観的な分析を行う
+- 推測する場合は「～と考えられる」「～の可能性がある」など明示
+- 具体的なキーワード名と数値を引用
+"""),
+    ]
+
+    return render_prompt(fit_sections_to_budget(sections, token_budget))
+
+def _insights_header():
+    """考察レポートの先頭部分"""
+    return (
+        "# SEOデータ分析 - Claude考察レポート\n\n"
+        f"**生成日時**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+        "---\n\n"
+    )
+
+def _insights_output_file(output_dir):
+    """考察レポートの出力先パス（タイムスタンプ付き）"""
+    os.makedirs(output_dir, exist_ok=True)
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_file = os.path.join(output_dir, f'claude_insights_{timestamp}.md')
+    return os.path.join(output_dir, f'claude_insights_{timestamp}.md')
+
+def save_insights(insights_text, output_dir='./data/insights'):
+    """考察結果を保存"""
+    output_file = _insights_output_file(output_dir)
 
     with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(f"# SEOデータ分析 - Claude考察レポート\n\n")
-        f.write(f"**生成日時**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-        f.write("---\n\n")
+        f.write(_insights_header())
         f.write(insights_text)
 
+    files.record_output(output_file, files.CLAUDE_INSIGHTS, params={'model': CLAUDE_MODEL})
     print(f"\n✅ 考察レポートを保存しました: {output_file}")
     return output_file
 
+@instrumented()
+def generate_insights_streaming(seo_data, search_console_data=None, token_budget=PROMPT_TOKEN_BUDGET,
+                                use_cache=True, client=None, cache_dir=CACHE_DIR, output_dir='./data/insights'):
+    """
+    考察をストリーミングで生成し、届いた順にレポートファイルへ書き込む
+
+    生成中は claude_insights_*.md.partial に書き込み、完了時に claude_insights_*.md へ
+    置き換える（途中でタイムアウトしても受信済みの部分は .partial に残る）。
+    最初のトークンまでの時間（TTFT）と生成速度（tokens/秒）を表示する。
+
+    Returns:
+        (考察テキスト, 保存したファイルのパス)
+    """
+    prompt = build_prompt(seo_data, search_console_data, token_budget=token_budget)
+    print(f"プロンプト: 約{estimate_tokens(prompt):,}トークン（上限: {token_budget:,}）")
+
+    cache_key = response_cache_key(CLAUDE_MODEL, TEMPERATURE, MAX_OUTPUT_TOKENS, prompt)
+    if use_cache:
+        cached = load_cached_response(cache_key, cache_dir)
+        if cached is not None:
+            print(f"✓ キャッシュ済みの考察を使用します（キー: {cache_key[:12]}）")
+            return cached, save_insights(cached, output_dir)
+
+    if client is None:
+        client = create_client()
+
+    output_file = _insights_output_file(output_dir)
+    partial_file = output_file + '.partial'
+
+    print("Claude APIで考察を生成中（ストリーミング）...")
+    print(f"モデル: {CLAUDE_MODEL}")
+    print(f"書き込み先: {partial_file}")
+
+    chunks = []
+    start_time = time.perf_counter()
+    first_token_time = None
+
+    with open(partial_file, 'w', encoding='utf-8') as f:
+        f.write(_insights_header())
+        f.flush()
+
+        count_api_call('claude')
+        with client.messages.stream(
+            model=CLAUDE_MODEL,
+            max_tokens=MAX_OUTPUT_TOKENS,
+            temperature=TEMPERATURE,
+            messages=[{"role": "user", "content": prompt}]
+        ) as stream:
+            for text in stream.text_stream:
+                if first_token_time is None:
+                    first_token_time = time.perf_counter()
+                    print(f"  最初のトークンまで: {first_token_time - start_time:.2f}秒")
+                f.write(text)
+                f.flush()
+                chunks.append(text)
+
+            final_message = stream.get_final_message()
+
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(partial_file, output_file)
+    files.record_output(output_file, files.CLAUDE_INSIGHTS, params={'model': CLAUDE_MODEL})
+
+    end_time = time.perf_counter()
+    output_tokens = final_message.usage.output_tokens
+    generation_time = end_time - (first_token_time or start_time)
+    print(f"  合計: {end_time - start_time:.2f}秒 / 出力 {output_tokens:,}トークン"
+          f"（{output_tokens / generation_time if generation_time > 0 else 0:.1f} tokens/秒）")
+
+    insights = ''.join(chunks)
+
+    if use_cache:
+        save_cached_response(cache_key, insights, {
+            'model': CLAUDE_MODEL,
+            'temperature': TEMPERATURE,
+            'max_tokens': MAX_OUTPUT_TOKENS,
+        }, cache_dir)
+        evict_cache(cache_dir)
+
+    print(f"\n✅ 考察レポートを保存しました: {output_file}")
+    return insights, output_file
+
+def _retry_delay(error, attempt):
+    """リトライまでの待機秒数（retry-afterヘッダーがあれば優先、なければ指数バックオフ）"""
+    response = getattr(error, 'response', None)
+    if response is not None:
+        retry_after = response.headers.get('retry-after')
+        try:
+            return min(float(retry_after), RETRY_MAX_DELAY)
+        except (TypeError, ValueError):
+            pass
+
+    delay = min(RETRY_BASE_DELAY * (2 ** (attempt - 1)), RETRY_MAX_DELAY)
+    return delay + random.uniform(0, delay / 2)
+
+def _is_retryable(error):
+    """レート制限・過負荷・一時的なサーバーエラーかどうか"""
+    if isinstance(error, (anthropic.APIConnectionError, anthropic.RateLimitError, anthropic.InternalServerError)):
+        return True
+    return isinstance(error, anthropic.APIStatusError) and error.status_code in RETRYABLE_STATUS_CODES
+
+async def stream_category_insight(client, semaphore, category, prompt, part_file, use_cache=True,
+                                  cache_dir=CACHE_DIR):
+    """
+    1カテゴリ分の考察をストリーミングで生成し、届いた順にファイルへ書き込む
+
+    書き込み中は part_file + '.partial' に出力し、完了後に part_file へ置き換える。
+    レート制限・一時的なエラーの場合は待機して最初から再試行する。
+    """
+    cache_key = response_cache_key(CLAUDE_MODEL, TEMPERATURE, CATEGORY_MAX_OUTPUT_TOKENS, prompt)
+    if use_cache:
+        cached = load_cached_response(cache_key, cache_dir)
+        if cached is not None:
+            with open(part_file, 'w', encoding='utf-8') as f:
+                f.write(cached)
+            print(f"  ✓ {category}: キャッシュを使用")
+            return cached
+
+    partial_file = part_file + '.partial'
+
+    async with semaphore:
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                start_time = time.time()
+                count_api_call('claude')
+                with open(partial_file, 'w', encoding='utf-8') as f:
+                    async with client.messages.stream(
+                        model=CLAUDE_MODEL,
+                        max_tokens=CATEGORY_MAX_OUTPUT_TOKENS,
+                        temperature=TEMPERATURE,
+                        messages=[{"role": "user", "content": prompt}]
+                    ) as stream:
+                        async for text in stream.text_stream:
+                            f.write(text)
+                            f.flush()
+                break
+            except Exception as e:
+                if not _is_retryable(e) or attempt == MAX_ATTEMPTS:
+                    raise
+                delay = _retry_delay(e, attempt)
+                print(f"  ⚠ {category}: {type(e).__name__}（{attempt}/{MAX_ATTEMPTS}回目）{delay:.1f}秒後に再試行")
+                await asyncio.sleep(delay)
+
+    os.replace(partial_file, part_file)
+    with open(part_file, 'r', encoding='utf-8') as f:
+        text = f.read()
+
+    print(f"  ✓ {category}: 完了（{time.time() - start_time:.1f}秒）")
+
+    if use_cache:
+        save_cached_response(cache_key, text, {
+            'model': CLAUDE_MODEL,
+            'temperature': TEMPERATURE,
+            'max_tokens': CATEGORY_MAX_OUTPUT_TOKENS,
+            'category': str(category),
+        }, cache_dir)
+
+    return text
+
+async def generate_category_insights_async(category_data, parts_dir, concurrency=DEFAULT_CONCURRENCY,
+                                           token_budget=PROMPT_TOKEN_BUDGET, use_cache=True, client=None,
+                                           cache_dir=CACHE_DIR):
+    """
+    カテゴリごとに1リクエストずつ並列に考察を生成
+
+    Args:
+        category_data: load_seo_category_dataの結果
+        parts_dir: カテゴリ別の途中結果を書き込むディレクトリ
+        concurrency: 同時に実行するリクエスト数の上限
+        client: 非同期Claude APIクライアント（Noneの場合はANTHROPIC_API_KEYから作成）
+
+    Returns:
+        {カテゴリ名: 考察テキスト または 例外}
+    """
+    os.makedirs(parts_dir, exist_ok=True)
+
+    if client is None:
+        client = anthropic.AsyncAnthropic(api_key=require_api_key(), max_retries=0)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    categories = list(category_data)
+
+    tasks = []
+    for i, category in enumerate(categories, 1):
+        prompt = build_category_prompt(category, category_data[category], token_budget=token_budget)
+        part_file = os.path.join(parts_dir, f'{i:03d}.md')
+        tasks.append(stream_category_insight(
+            client, semaphore, category, prompt, part_file, use_cache=use_cache, cache_dir=cache_dir
+        ))
+
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    if use_cache:
+        evict_cache(cache_dir)
+
+    return dict(zip(categories, results))
+
+def merge_category_insights(category_data, category_results):
+    """カテゴリ別の考察を1つのMarkdownにまとめる"""
+    lines = ["## カテゴリ別考察\n\n"]
+
+    lines.append("| カテゴリ | レコード数 | 順位改善 | 順位下落 | 平均順位変化 |\n")
+    lines.append("|---------|-----------|---------|---------|-------------|\n")
+    for category, data in category_data.items():
+        stats = data['stats']
+        lines.append(f"| {category} | {data['total_records']:,} | {stats['improved_count']} | "
+                     f"{stats['declined_count']} | {stats['avg_rank_change']:+.2f} |\n")
+
+    for category, result in category_results.items():
+        lines.append(f"\n---\n\n## カテゴリ: {category}\n\n")
+        if isinstance(result, Exception):
+            lines.append(f"⚠ 考察の生成に失敗しました: {result}\n")
+        else:
+            lines.append(result.strip() + "\n")
+
+    return ''.join(lines)
+
+@instrumented()
+def generate_category_insights(category_data, concurrency=DEFAULT_CONCURRENCY, token_budget=PROMPT_TOKEN_BUDGET,
+                               use_cache=True, output_dir='./data/insights'):
+    """カテゴリ別考察を並列生成し、claude_insights_*.md にまとめて保存"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    parts_dir = os.path.join(output_dir, f'parts_{timestamp}')
+
+    print(f"カテゴリ別考察を生成中: {len(category_data)}カテゴリ（同時実行数: {concurrency}）")
+    print(f"モデル: {CLAUDE_MODEL}")
+    print(f"途中結果: {parts_dir}")
+
+    start_time = time.time()
+    category_results = asyncio.run(generate_category_insights_async(
+        category_data, parts_dir, concurrency=concurrency, token_budget=token_budget, use_cache=use_cache
+    ))
+
+    failed = [c for c, r in category_results.items() if isinstance(r, Exception)]
+    print(f"\n✓ {len(category_results) - len(failed)}/{len(category_results)}カテゴリ完了"
+          f"（{time.time() - start_time:.1f}秒）")
+    for category in failed:
+        print(f"  ✗ {category}: {category_results[category]}")
+
+    insights = merge_category_insights(category_data, category_results)
+    output_file = save_insights(insights, output_dir)
+
+    # 全カテゴリ成功した場合のみ途中結果を削除
+    if not failed:
+        shutil.rmtree(parts_dir, ignore_errors=True)
+
+    return insights, output_file
+
 if __name__ == '__main__':
     import argparse
 
@@ -287,8 +913,19 @@ if __name__ == '__main__':
     parser.add_argument('--seo', type=str, help='SEOランク分析CSVファイルのパス')
     parser.add_argument('--seo-txt', type=str, help='SEOランク分析レポートtxtファイルのパス')
     parser.add_argument('--search-console', type=str, help='Search Console分析CSVファイルのパス')
+    parser.add_argument('--no-cache', action='store_true', help='キャッシュを使わずにClaude APIを呼び出す')
+    parser.add_argument('--prompt-budget', type=int, default=PROMPT_TOKEN_BUDGET,
+                        help=f'プロンプトのトークン上限（デフォルト: {PROMPT_TOKEN_BUDGET}）')
+    parser.add_argument('--stream', action='store_true',
+                        help='ストリーミングで生成し、届いた順にレポートファイルへ書き込む')
+    parser.add_argument('--by-category', action='store_true', help='カテゴリ別の深掘り考察を並列に生成')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f'カテゴリ別考察の同時リクエスト数（デフォルト: {DEFAULT_CONCURRENCY}）')
+    parser.add_argument('--max-categories', type=int, help='カテゴリ別考察の対象カテゴリ数（データ数の多い順）')
+    parser.add_argument('--profile', action='store_true', help='処理をプロファイルして data/profiles/ に保存')
 
     args = parser.parse_args()
+    enable_profiling(args.profile)
 
     print("=" * 70)
     print("Claude Code考察生成")
@@ -307,10 +944,10 @@ if __name__ == '__main__':
     else:
         # 最新ファイルを自動検出
         print("最新の分析結果を自動検出中...")
-        files = get_latest_files()
-        seo_csv = files.get('seo_csv')
-        seo_txt = files.get('seo_txt')
-        search_console_csv = files.get('search_console')
+        latest = get_latest_files()
+        seo_csv = latest.get('seo_csv')
+        seo_txt = latest.get('seo_txt')
+        search_console_csv = latest.get('search_console')
 
     # データを読み込み
     print("\nデータ読み込み中...")
@@ -321,6 +958,29 @@ if __name__ == '__main__':
         sys.exit(1)
 
     print(f"  SEOランク分析: {seo_csv}")
+
+    if args.by_category:
+        # カテゴリ別考察モード
+        category_data = load_seo_category_data(seo_csv, max_categories=args.max_categories)
+        if not category_data:
+            print("❌ エラー: カテゴリ情報がありません（category_mapping.csvを用意して make analyze-seo を実行してください）")
+            sys.exit(1)
+
+        try:
+            insights, output_file = generate_category_insights(
+                category_data,
+                concurrency=args.concurrency,
+                token_budget=args.prompt_budget,
+                use_cache=not args.no_cache
+            )
+            print(f"完全版: {output_file}")
+        except Exception as e:
+            print(f"\n❌ エラー: {e}")
+            import traceback
+            traceback.print_exc()
+            sys.exit(1)
+        sys.exit(0)
+
     seo_data = load_seo_data(seo_csv, seo_txt)
 
     search_console_data = None
@@ -334,10 +994,22 @@ if __name__ == '__main__':
 
     # Claude APIで考察を生成
     try:
-        insights = generate_insights_with_claude(seo_data, search_console_data)
-
-        # 結果を保存
-        output_file = save_insights(insights)
+        if args.stream:
+            # 生成しながらファイルに書き込む
+            insights, output_file = generate_insights_streaming(
+                seo_data, search_console_data,
+                token_budget=args.prompt_budget,
+                use_cache=not args.no_cache
+            )
+        else:
+            insights = generate_insights_with_claude(
+                seo_data, search_console_data,
+                token_budget=args.prompt_budget,
+                use_cache=not args.no_cache
+            )
+
+            # 結果を保存
+            output_file = save_insights(insights)
 
         # プレビュー表示
         print("\n" + "=" * 70)
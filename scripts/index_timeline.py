@@ -0,0 +1,428 @@
+"""
+r_hash別のインデックス状況タイムライン（長期推移）
+
+site:結果のスナップショットごとに「どのr_hashがインデックスされていたか」を
+r_hash × スナップショットのビットセットとして永続化し、新しいスナップショットが
+届くたびに追記します。全ワークブックを読み直さずに以下を集計できます。
+
+- r_hashごとのインデックス期間・再インデックス回数（フラッピング）
+- 現在のインデックス落ち継続期間
+- 初回インデックス時期（コホート）別の継続率（生存曲線）
+- 連続してインデックスされていた区間（ランレングス表現）
+
+保存形式（.npz）:
+    snapshots: スナップショット名（時系列順）
+    hashes:    r_hashの128bitキー（初出順、インデックスが行番号）
+    presence:  行=r_hash、列=スナップショットのビットセット（np.packbits, little）
+
+スナップショット名（シート名）に年を含む日付（20250106、2025-01-06、2025年1月6日 など）がある場合、
+時系列の順序は名前の文字列ではなく、名前から読み取った日付で判定します（order_snapshots）。
+日付を読み取れない名前（0923・9.23 など年のないもの）を含むブックは名前順に並べ、
+タイムラインには追記しません（警告を表示して、インデックス落ち分析はそのまま続行）。
+
+使い方:
+    # 集計レポートを出力（タイムラインは analyze_index_drop.py が更新）
+    python scripts/index_timeline.py
+
+    # 2回以上インデックス落ちしたr_hashをフラッピングとして抽出
+    python scripts/index_timeline.py --min-flaps 2
+"""
+import os
+import re
+from datetime import date, datetime
+from pathlib import Path
+
+
+from lazy_imports import lazy_import
+from rhash_codec import RHASH_KEY_DTYPE, keys_to_hex
+from profiling import enable_profiling
+from seo_etl import files, stages
+from stage_metrics import instrumented
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# 設定
+TIMELINE_FILE = './data/index_timeline/index_timeline.npz'
+OUTPUT_DIR = './data/analysis'
+
+# 集計時に一度に展開する行数（メモリ使用量の上限）
+CHUNK_ROWS = 100_000
+
+# スナップショット名に含まれる日付（20250106 / 2025-01-06 / 2025/1/6 / 2025年1月6日）
+SNAPSHOT_DATE_PATTERN = re.compile(r'(\d{4})(?:(\d{2})(\d{2})|[-/._年](\d{1,2})[-/._月](\d{1,2}))')
+
+
+def parse_snapshot_date(snapshot_name):
+    """スナップショット名から日付を読み取る（読み取れない場合はNone）"""
+    match = SNAPSHOT_DATE_PATTERN.search(str(snapshot_name))
+    if match:
+        year, month, day = (int(value) for value in match.groups() if value is not None)
+        try:
+            return date(year, month, day)
+        except ValueError:
+            pass
+    return None
+
+
+def snapshot_date(snapshot_name):
+    """
+    スナップショット名から日付を読み取る（時系列の順序のキー）
+
+    Raises:
+        ValueError: 名前に日付が含まれない場合
+    """
+    found = parse_snapshot_date(snapshot_name)
+    if found is None:
+        raise ValueError(f"スナップショット名 {snapshot_name} から日付を読み取れません（例: 20250106、2025-01-06）")
+    return found
+
+
+def order_snapshots(snapshot_names):
+    """
+    スナップショット名を時系列順に並べる
+
+    すべての名前から日付を読み取れる場合は日付順、1つでも読み取れない場合は名前順
+    （analyze_index_drop.py のシートの比較順とタイムラインで同じ順序を使う）
+    """
+    names = list(snapshot_names)
+    dates = [parse_snapshot_date(name) for name in names]
+    if names and all(found is not None for found in dates):
+        return [name for _, name in sorted(zip(dates, names))]
+    return sorted(names)
+
+
+def empty_timeline():
+    """空のタイムラインを作成"""
+    return {
+        'snapshots': np.empty(0, dtype=str),
+        'hashes': np.empty(0, dtype=RHASH_KEY_DTYPE),
+        'presence': np.empty((0, 0), dtype=np.uint8),
+    }
+
+
+def load_timeline(path=TIMELINE_FILE):
+    """保存済みのタイムラインを読み込み（存在しない場合は空）"""
+    if not os.path.exists(path):
+        return empty_timeline()
+
+    with np.load(path) as data:
+        return {
+            'snapshots': data['snapshots'],
+            'hashes': data['hashes'].view(RHASH_KEY_DTYPE),
+            'presence': data['presence'],
+        }
+
+
+def save_timeline(timeline, path=TIMELINE_FILE):
+    """タイムラインを保存（一時ファイルに書き込んでから置き換え）"""
+    Path(os.path.dirname(path)).mkdir(parents=True, exist_ok=True)
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez_compressed(
+            f,
+            snapshots=timeline['snapshots'],
+            hashes=timeline['hashes'],
+            presence=timeline['presence'],
+        )
+    os.replace(tmp_path, path)
+
+
+def append_snapshot(timeline, snapshot_name, keys):
+    """
+    スナップショット1件分のインデックス状況を追記
+
+    Args:
+        timeline: load_timelineで読み込んだタイムライン
+        snapshot_name: スナップショット名（日付が既存の最新スナップショットより後であること）
+        keys: インデックスされていたr_hashの128bitキー
+
+    Returns:
+        更新後のタイムライン
+
+    Raises:
+        ValueError: 名前から日付を読み取れない場合、最新スナップショット以前の日付の場合
+    """
+    snapshots = timeline['snapshots']
+    if len(snapshots) > 0 and snapshot_date(snapshot_name) <= snapshot_date(snapshots[-1]):
+        raise ValueError(
+            f"スナップショット {snapshot_name} は最新の {snapshots[-1]} 以前のため追記できません"
+        )
+
+    hashes = timeline['hashes']
+    presence = timeline['presence']
+    keys = np.unique(np.asarray(keys, dtype=RHASH_KEY_DTYPE))
+
+    # 既存r_hashの行番号を検索し、未登録のものは末尾に追加
+    order = np.argsort(hashes)
+    sorted_hashes = hashes[order]
+    pos = np.searchsorted(sorted_hashes, keys)
+    found = pos < len(sorted_hashes)
+    found[found] = sorted_hashes[pos[found]] == keys[found]
+
+    new_keys = keys[~found]
+    rows = np.empty(len(keys), dtype=np.intp)
+    rows[found] = order[pos[found]]
+    rows[~found] = len(hashes) + np.arange(len(new_keys))
+
+    n_snapshots = len(snapshots) + 1
+    n_bytes = (n_snapshots + 7) // 8
+    new_presence = np.zeros((len(hashes) + len(new_keys), n_bytes), dtype=np.uint8)
+    new_presence[:presence.shape[0], :presence.shape[1]] = presence
+
+    col = n_snapshots - 1
+    new_presence[rows, col // 8] |= np.uint8(1 << (col % 8))
+
+    return {
+        'snapshots': np.append(snapshots, str(snapshot_name)),
+        'hashes': np.concatenate([hashes, new_keys]),
+        'presence': new_presence,
+    }
+
+
+@instrumented()
+def update_timeline(snapshot_keys, path=TIMELINE_FILE):
+    """
+    複数スナップショットのうち未登録のものだけをタイムラインに追記して保存
+
+    Args:
+        snapshot_keys: {スナップショット名: 128bitキー配列}
+        path: タイムラインの保存先
+
+    Returns:
+        更新後のタイムライン（日付を読み取れないスナップショット名がある場合は更新せずに保存済みのもの）
+    """
+    timeline = load_timeline(path)
+    recorded = set(timeline['snapshots'].tolist())
+
+    undated = [name for name in snapshot_keys if parse_snapshot_date(name) is None]
+    if undated:
+        print(f"  ⚠ 日付を読み取れないスナップショット名があるため、タイムラインは更新しません: "
+              f"{', '.join(map(str, undated[:5]))}{' ...' if len(undated) > 5 else ''}"
+              "（シート名に年を含む日付を付けてください。例: 20250106）")
+        return timeline
+
+    appended = 0
+    latest = snapshot_date(timeline['snapshots'][-1]) if len(timeline['snapshots']) > 0 else None
+    for snapshot_name in order_snapshots(snapshot_keys):
+        if snapshot_name in recorded:
+            continue
+        if latest is not None and snapshot_date(snapshot_name) <= latest:
+            print(f"  ⚠ スキップ（最新スナップショットより前）: {snapshot_name}")
+            continue
+
+        timeline = append_snapshot(timeline, snapshot_name, snapshot_keys[snapshot_name])
+        latest = snapshot_date(snapshot_name)
+        appended += 1
+
+    if appended > 0:
+        save_timeline(timeline, path)
+
+    print(f"インデックスタイムライン: {appended}件追記 "
+          f"(スナップショット {len(timeline['snapshots'])}件, r_hash {len(timeline['hashes']):,}件)")
+    return timeline
+
+
+def _iter_presence(timeline, chunk_rows=CHUNK_ROWS):
+    """ビットセットを行チャンクごとにbool行列へ展開"""
+    n_snapshots = len(timeline['snapshots'])
+    presence = timeline['presence']
+
+    for start in range(0, presence.shape[0], chunk_rows):
+        bits = np.unpackbits(
+            presence[start:start + chunk_rows], axis=1, count=n_snapshots, bitorder='little'
+        ).astype(bool)
+        yield start, bits
+
+
+def summarize_hashes(timeline):
+    """
+    r_hashごとのインデックス状況を集計
+
+    Returns:
+        r_hash, first_seen, last_seen, indexed_snapshots, first_run_length,
+        drop_count, reindex_count, current_outage, currently_indexed を含むDataFrame
+        （first_seen / last_seen はスナップショットの位置）
+    """
+    n_snapshots = len(timeline['snapshots'])
+    cols = np.arange(n_snapshots)
+    parts = []
+
+    for start, bits in _iter_presence(timeline):
+        first_idx = bits.argmax(axis=1)
+        last_idx = n_snapshots - 1 - bits[:, ::-1].argmax(axis=1)
+
+        # 初回インデックス後、最初にインデックス落ちした位置
+        gap = ~bits & (cols >= first_idx[:, None])
+        first_gap = np.where(gap.any(axis=1), gap.argmax(axis=1), n_snapshots)
+
+        # transitions[:, j] はスナップショット j → j+1 の変化（初回インデックスの0→1は再インデックスに数えない）
+        transitions = np.diff(bits.astype(np.int8), axis=1)
+        after_first = cols[:-1] >= first_idx[:, None]
+
+        parts.append(pd.DataFrame({
+            'row': np.arange(start, start + len(bits)),
+            'first_seen': first_idx,
+            'last_seen': last_idx,
+            'indexed_snapshots': bits.sum(axis=1),
+            'first_run_length': first_gap - first_idx,
+            'drop_count': (transitions == -1).sum(axis=1),
+            'reindex_count': ((transitions == 1) & after_first).sum(axis=1),
+            'current_outage': n_snapshots - 1 - last_idx,
+        }))
+
+    if not parts:
+        return pd.DataFrame(columns=[
+            'r_hash', 'first_seen', 'last_seen', 'indexed_snapshots', 'first_run_length',
+            'drop_count', 'reindex_count', 'current_outage', 'currently_indexed'
+        ])
+
+    summary = pd.concat(parts, ignore_index=True)
+    summary.insert(0, 'r_hash', keys_to_hex(timeline['hashes'][summary.pop('row').to_numpy()]))
+    summary['currently_indexed'] = summary['current_outage'] == 0
+    return summary
+
+
+def find_flapping(summary, min_flaps=2):
+    """インデックス落ちと再インデックスを繰り返しているr_hashを抽出"""
+    flapping = summary[(summary['drop_count'] >= min_flaps) & (summary['reindex_count'] >= 1)]
+    return flapping.sort_values(['drop_count', 'indexed_snapshots'], ascending=[False, False])
+
+
+def current_outages(summary, min_snapshots=1):
+    """現在インデックス落ちしているr_hashを継続期間の長い順に抽出"""
+    outages = summary[summary['current_outage'] >= min_snapshots]
+    return outages.sort_values('current_outage', ascending=False)
+
+
+def cohort_survival(summary, snapshots):
+    """
+    初回インデックス時期（コホート）別の継続率を計算
+
+    継続率 = 初回インデックスから k スナップショット後まで
+    一度も落ちずにインデックスされ続けたr_hashの割合
+
+    Returns:
+        cohort, cohort_size, age, surviving, survival_rate を含むDataFrame
+    """
+    n_snapshots = len(snapshots)
+    rows = []
+
+    for cohort_idx, group in summary.groupby('first_seen'):
+        max_age = n_snapshots - cohort_idx
+        run_counts = np.bincount(group['first_run_length'].to_numpy(), minlength=max_age + 1)
+        # age kで生存 = 最初の連続区間の長さが k+1 以上
+        surviving = len(group) - np.cumsum(run_counts)[:max_age]
+
+        rows.append(pd.DataFrame({
+            'cohort': snapshots[cohort_idx],
+            'cohort_size': len(group),
+            'age': np.arange(max_age),
+            'surviving': surviving,
+            'survival_rate': (surviving / len(group)).round(4),
+        }))
+
+    if not rows:
+        return pd.DataFrame(columns=['cohort', 'cohort_size', 'age', 'surviving', 'survival_rate'])
+
+    return pd.concat(rows, ignore_index=True)
+
+
+def presence_intervals(timeline):
+    """
+    連続してインデックスされていた区間をランレングス表現で取得
+
+    Returns:
+        r_hash, start, end（endを含む）、length を含むDataFrame
+        （start / end はスナップショット名）
+    """
+    snapshots = timeline['snapshots']
+    parts = []
+
+    for start, bits in _iter_presence(timeline):
+        padded = np.pad(bits.astype(np.int8), ((0, 0), (1, 1)))
+        transitions = np.diff(padded, axis=1)
+        run_rows, run_starts = np.nonzero(transitions == 1)
+        _, run_ends = np.nonzero(transitions == -1)
+
+        parts.append(pd.DataFrame({
+            'row': run_rows + start,
+            'start_idx': run_starts,
+            'length': run_ends - run_starts,
+        }))
+
+    if not parts:
+        return pd.DataFrame(columns=['r_hash', 'start', 'end', 'length'])
+
+    runs = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame({
+        'r_hash': keys_to_hex(timeline['hashes'][runs['row'].to_numpy()]),
+        'start': snapshots[runs['start_idx'].to_numpy()],
+        'end': snapshots[(runs['start_idx'] + runs['length'] - 1).to_numpy()],
+        'length': runs['length'],
+    })
+
+
+@instrumented()
+def export_timeline_reports(timeline, output_dir, min_flaps=2):
+    """タイムラインの集計結果をCSVに保存"""
+    snapshots = timeline['snapshots']
+    if len(snapshots) == 0:
+        print("タイムラインにスナップショットがありません。先に analyze_index_drop.py を実行してください。")
+        return None
+
+    summary = summarize_hashes(timeline)
+    flapping = find_flapping(summary, min_flaps=min_flaps)
+    outages = current_outages(summary)
+    survival = cohort_survival(summary, snapshots)
+
+    print(f"スナップショット: {len(snapshots)}件 ({snapshots[0]} ～ {snapshots[-1]})")
+    print(f"r_hash数: {len(summary):,}件")
+    print(f"現在インデックスあり: {summary['currently_indexed'].sum():,}件")
+    print(f"現在インデックス落ち: {len(outages):,}件")
+    print(f"フラッピング（{min_flaps}回以上インデックス落ち）: {len(flapping):,}件")
+
+    # 出力時にスナップショット位置を名前に戻す
+    for df in (summary, flapping, outages):
+        df['first_seen'] = snapshots[df['first_seen'].to_numpy()]
+        df['last_seen'] = snapshots[df['last_seen'].to_numpy()]
+
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    output_files = {
+        'summary': os.path.join(output_dir, f"index_timeline_summary_{timestamp}.csv"),
+        'flapping': os.path.join(output_dir, f"index_timeline_flapping_{timestamp}.csv"),
+        'outages': os.path.join(output_dir, f"index_timeline_outages_{timestamp}.csv"),
+        'survival': os.path.join(output_dir, f"index_timeline_survival_{timestamp}.csv"),
+    }
+    reports = {'summary': summary, 'flapping': flapping, 'outages': outages, 'survival': survival}
+    for name, report in reports.items():
+        report.to_csv(output_files[name], index=False, encoding='utf-8-sig')
+        files.record_output(output_files[name], f'index_timeline_{name}', params={'min_flaps': min_flaps},
+                            rows=len(report))
+        print(f"✓ 保存: {output_files[name]}")
+
+    return output_files
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='r_hash別インデックス状況タイムラインの集計')
+    parser.add_argument('--timeline', type=str, default=TIMELINE_FILE, help='タイムラインファイルのパス')
+    parser.add_argument('--output-dir', type=str, default=OUTPUT_DIR, help='出力ディレクトリ')
+    parser.add_argument('--min-flaps', type=int, default=2, help='フラッピングとみなすインデックス落ち回数')
+    parser.add_argument('--profile', action='store_true', help='処理をプロファイルして data/profiles/ に保存')
+
+    args = parser.parse_args()
+    enable_profiling(args.profile)
+
+    try:
+        stages.index_timeline_reports(args.timeline, args.output_dir, min_flaps=args.min_flaps)
+    except Exception as e:
+        print(f"\nエラー: {e}")
+        import traceback
+        traceback.print_exc()
+        exit(1)
@@ -0,0 +1,61 @@
+"""
+重いライブラリ（pandas・numpy・pyarrow・anthropic・requests など）の遅延インポート
+
+モジュールの先頭で lazy_import() したライブラリは、最初に属性を参照した時点で
+はじめて読み込まれます。これにより、--help や seo-etl のサブコマンド一覧、
+別のスクリプトからの関数の import では、使わないライブラリの読み込み時間がかかりません。
+
+使い方:
+    from lazy_imports import lazy_import
+
+    pd = lazy_import('pandas')
+    np = lazy_import('numpy')
+    pa = lazy_import('pyarrow', optional=True)   # 未インストールの場合はNone
+
+注意:
+    モジュールの読み込み時に pd.DataFrame などを評価すると、その時点で読み込まれます。
+    型ヒントで使うモジュールには `from __future__ import annotations` を付けてください。
+"""
+import sys
+import types
+import importlib.util
+
+
+class _MissingModule(types.ModuleType):
+    """インストールされていないライブラリ（属性を参照した時点でエラー）"""
+
+    def __getattr__(self, attr):
+        raise ModuleNotFoundError(
+            f"{self.__name__} がインストールされていません（pip install -r requirements.txt）",
+            name=self.__name__,
+        )
+
+
+def lazy_import(name, optional=False):
+    """
+    ライブラリを遅延インポート
+
+    Args:
+        name: モジュール名（'pyarrow.feather' のようなサブモジュールも可。その場合は親パッケージのみ先に読み込まれます）
+        optional: Trueの場合、インストールされていなければNoneを返す
+
+    Returns:
+        最初の属性参照で読み込まれるモジュール
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    try:
+        spec = importlib.util.find_spec(name)
+    except ModuleNotFoundError:
+        spec = None
+
+    if spec is None:
+        return None if optional else _MissingModule(name)
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -2,15 +2,17 @@
 """
 BigQueryからカテゴリマスタを取得してCSVに保存するスクリプト
 """
-from google.cloud import bigquery
-import pandas as pd
 import os
 
+from category_index import build_category_index
+
 # BigQuery設定
 PROJECT_ID = 'stanby-prod'
 
 def load_category_master():
     """カテゴリマスタをBigQueryから取得"""
+    from google.cloud import bigquery
+
     client = bigquery.Client(project=PROJECT_ID)
 
     print("カテゴリマスタをBigQueryから取得中...")
@@ -33,6 +35,9 @@ def load_category_master():
     df.to_csv(output_file, index=False, encoding='utf-8-sig')
     print(f"✓ 保存完了: {output_file}")
 
+    # カテゴリインデックスを再構築（各分析ステージのattach_categoriesで使用）
+    build_category_index()
+
     return df
 
 if __name__ == "__main__":
@@ -1,9 +1,109 @@
-import pandas as pd
+from __future__ import annotations
+
 import glob
 import os
 from pathlib import Path
 from datetime import datetime
 
+from lazy_imports import lazy_import
+from profiling import profile_flag_from_argv
+from seo_etl import files, stages
+from stage_metrics import current_stage, instrumented
+
+pd = lazy_import('pandas')
+
+# pyarrowはオプション（ない場合はArrowファイルを作らずCSVだけを使う）
+pa = lazy_import('pyarrow', optional=True)
+
+# 数値に変換して保存するカラム（"50+" などは欠損値になる）
+NUMERIC_COLUMNS = ['ランク', '距離']
+
+def arrow_path_for(csv_file: str) -> str:
+    """マージ済みCSVに対応するArrow IPCファイルのパス"""
+    return os.path.splitext(csv_file)[0] + '.arrow'
+
+def save_merged_arrow(merged_df: pd.DataFrame, csv_file: str):
+    """
+    マージ済みデータを型付きのArrow IPC（Feather V2）ファイルとして保存
+
+    ランク・距離は数値、dateは日付型に変換済みの状態で保存するため、
+    読み込み側ではCSVのパースや型変換が不要になります
+    （日付として読めないdateがある場合、date列は文字列のまま保存します）。
+    メモリマップで読めるよう圧縮はしません。
+
+    Args:
+        merged_df: マージ済みデータ
+        csv_file: 対応するCSVファイルのパス（拡張子を.arrowにしたパスに保存）
+
+    Returns:
+        保存したファイルのパス（pyarrowがない場合はNone）
+    """
+    if pa is None:
+        print("警告: pyarrowがインストールされていないため、Arrowファイルは作成しません")
+        return None
+
+    import pyarrow.feather as feather
+
+    columns = {}
+    for column in merged_df.columns:
+        if column in NUMERIC_COLUMNS:
+            # NaNはnullにせずそのまま保存（読み込み時にゼロコピーで渡せる）
+            # 欠損がなければint64、あればfloat64になる（CSVから読んだ場合と同じ型）
+            values = pd.to_numeric(merged_df[column], errors='coerce').to_numpy()
+            columns[column] = pa.array(values)
+        elif column == 'date':
+            dates = pd.to_datetime(merged_df[column], errors='coerce')
+            if (dates.notna() | merged_df[column].isna()).all():
+                columns[column] = pa.array(dates.to_numpy(dtype='datetime64[ns]'))
+            else:
+                # ファイル名に日付がない行（dateがファイル名）があればCSVと同じく文字列のまま保存
+                values = merged_df[column].astype(str).where(merged_df[column].notna(), None)
+                columns[column] = pa.array(values, type=pa.large_string(), from_pandas=True)
+        else:
+            try:
+                columns[column] = pa.array(merged_df[column], from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                # 型が混在している列は文字列として保存
+                values = merged_df[column].astype(str).where(merged_df[column].notna(), None)
+                columns[column] = pa.array(values, type=pa.large_string(), from_pandas=True)
+    table = pa.table(columns)
+
+    arrow_file = arrow_path_for(csv_file)
+    tmp_file = arrow_file + '.tmp'
+    feather.write_feather(table, tmp_file, compression='uncompressed')
+    os.replace(tmp_file, arrow_file)
+
+    print(f"保存完了: {arrow_file}")
+    return arrow_file
+
+def load_merged_data(csv_file: str) -> pd.DataFrame:
+    """
+    マージ済みデータを読み込み
+
+    CSVと同じ名前のArrowファイルがあればメモリマップで開き、なければCSVを読んで
+    次回用にArrowファイルを作成します。Arrowから読んだ場合、ランク・距離は数値、
+    dateは日付型になっています。
+
+    Args:
+        csv_file: マージ済みCSVのパス
+
+    Returns:
+        マージ済みデータのDataFrame
+    """
+    arrow_file = arrow_path_for(csv_file)
+
+    if pa is not None and os.path.exists(arrow_file) and os.path.getmtime(arrow_file) >= os.path.getmtime(csv_file):
+        import pyarrow.feather as feather
+        table = feather.read_table(arrow_file, memory_map=True)
+        print(f"Arrowファイルを読み込み: {arrow_file}")
+        return table.to_pandas(split_blocks=True)
+
+    df = pd.read_csv(csv_file)
+    if pa is not None:
+        save_merged_arrow(df, csv_file)
+    return df
+
+@instrumented()
 def merge_weekly_data(input_folder: str, output_folder: str, columns_to_keep: list = None):
     """
     週次のCSVファイルをマージして不要なカラムを削除する
@@ -22,11 +122,15 @@ def merge_weekly_data(input_folder: str, output_folder: str, columns_to_keep: li
 
     print(f"{len(csv_files)}個のCSVファイルを検出しました")
 
+    metrics = current_stage()
+
     # 全てのCSVファイルを読み込んでマージ
+    step = metrics.step('load', files=len(csv_files))
     dataframes = []
     for file in sorted(csv_files):
         print(f"読み込み中: {file}")
         df = pd.read_csv(file)
+        step.read(file)
 
         # ファイル名から日付を抽出（例: Site_65a6192ed395_キーワード_2025-11-08_2025-11-08.csv）
         filename = os.path.basename(file)
@@ -40,8 +144,12 @@ def merge_weekly_data(input_folder: str, output_folder: str, columns_to_keep: li
 
         dataframes.append(df)
 
+    step.rows_out = sum(len(df) for df in dataframes)
+
     # データフレームを結合
+    step = metrics.step('concat', rows_in=step.rows_out)
     merged_df = pd.concat(dataframes, ignore_index=True)
+    step.rows_out = metrics.rows_in = len(merged_df)
     print(f"マージ完了: {len(merged_df)}行のデータ")
 
     # 指定されたカラムのみ保持
@@ -63,24 +171,27 @@ def merge_weekly_data(input_folder: str, output_folder: str, columns_to_keep: li
     output_file = os.path.join(output_folder, f"merged_data_{timestamp}.csv")
 
     # CSVファイルとして保存
+    step = metrics.step('write_csv', rows_in=len(merged_df))
     merged_df.to_csv(output_file, index=False, encoding='utf-8-sig')
+    step.wrote(output_file)
     print(f"保存完了: {output_file}")
-
+    files.record_output(output_file, files.MERGED_DATA, params={'columns': columns_to_keep},
+                        inputs=csv_files, rows=len(merged_df))
+
+    # 後続の分析用に型付きのArrowファイルも保存
+    step = metrics.step('write_arrow', rows_in=len(merged_df))
+    arrow_file = save_merged_arrow(merged_df, output_file)
+    step.wrote(arrow_file)
+    if arrow_file:
+        files.record_output(arrow_file, files.MERGED_ARROW, inputs=[output_file], rows=len(merged_df))
+
+    metrics.rows_out = len(merged_df)
+    metrics.wrote(output_file)
+    metrics.wrote(arrow_file)
     return merged_df
 
 if __name__ == "__main__":
-    # 使用例
-    # 必要に応じて保持するカラムを指定（日本語カラム名に対応）
-    columns_to_keep = [
-        'キーワード',
-        'URL',
-        'ランク',
-        '距離',
-        'date',
-        # 必要なカラムを追加
-    ]
-
-    input_folder = "./data/raw"
-    output_folder = "./data/processed"
-
-    merge_weekly_data(input_folder, output_folder, columns_to_keep)
+    profile_flag_from_argv()
+
+    # キーワード・URL・ランク・距離・date のカラムだけを保持
+    stages.merge("./data/raw", "./data/processed", stages.MERGE_COLUMNS)
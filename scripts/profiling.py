@@ -0,0 +1,176 @@
+"""
+ステージのプロファイリング（オプトイン）
+
+--profile オプションまたは環境変数 SEO_ETL_PROFILE=1 を指定すると、stage_metrics の
+トップレベルのステージ（各スクリプトの処理全体）を次の2つの方法で同時に計測します。
+
+- cProfile: 関数ごとの呼び出し回数・自己時間・累積時間（.pstats）
+- サンプリング: 一定間隔で呼び出しスタックを記録した collapsed stack 形式（.collapsed）
+
+出力先は data/profiles/<run_id>/ で、終了時に自己時間の長い関数の上位を表示します。
+.collapsed は flamegraph.pl や speedscope（https://www.speedscope.app）でそのまま
+フレームグラフとして表示できます。
+
+使い方:
+    python scripts/analyze_search_console_trends.py --profile
+    SEO_ETL_PROFILE=1 make analyze-search-console-trends
+    make analyze-search-console-trends PROFILE=1
+
+    python scripts/profiling.py data/profiles/<run_id>/analyze_search_console_trends.pstats --top 40
+    python -m pstats data/profiles/<run_id>/analyze_search_console_trends.pstats
+"""
+import os
+import sys
+import pstats
+import cProfile
+import argparse
+import threading
+from collections import Counter
+
+PROFILE_DIR = './data/profiles'
+PROFILE_ENV = 'SEO_ETL_PROFILE'
+
+# サマリーに表示する関数の数
+PROFILE_TOP_N = 20
+
+# サンプリング間隔（秒）
+SAMPLE_INTERVAL = 0.005
+
+
+def profiling_enabled():
+    """プロファイリングが有効か（環境変数 SEO_ETL_PROFILE）"""
+    return os.environ.get(PROFILE_ENV, '').lower() in ('1', 'true', 'yes', 'on')
+
+
+def enable_profiling(enabled=True):
+    """
+    以降のトップレベルのステージをプロファイル
+
+    環境変数に設定するため、このプロセスから起動したスクリプトにも引き継がれます。
+    """
+    if enabled:
+        os.environ[PROFILE_ENV] = '1'
+
+
+def profile_flag_from_argv(argv=None):
+    """
+    コマンドライン引数から --profile を取り除き、指定されていればプロファイリングを有効化
+
+    argparseを使っていない（sys.argvを位置引数として読む）スクリプト用です。
+    """
+    argv = sys.argv if argv is None else argv
+    enabled = '--profile' in argv[1:]
+    if enabled:
+        argv[:] = [arg for arg in argv if arg != '--profile']
+        enable_profiling()
+    return enabled
+
+
+def _frame_label(code):
+    """collapsed stack のフレーム名（関数名 (ファイル名:行番号)）"""
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(';', ':')
+
+
+class _StackSampler(threading.Thread):
+    """対象スレッドの呼び出しスタックを一定間隔で記録するスレッド"""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        super().__init__(name='stage-profiler-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if labels:
+                self.stacks[';'.join(reversed(labels))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class StageProfiler:
+    """1つのステージのプロファイラ（cProfile + スタックのサンプリング）"""
+
+    def __init__(self, name, output_dir):
+        self.name = name
+        self.output_dir = output_dir
+        self.profile = cProfile.Profile()
+        self.sampler = _StackSampler(threading.get_ident())
+
+    def start(self):
+        """計測を開始（他のプロファイラが動作中で開始できない場合はFalse）"""
+        try:
+            self.profile.enable()
+        except ValueError as e:
+            print(f"警告: プロファイラを開始できませんでした: {e}")
+            return False
+        self.sampler.start()
+        return True
+
+    def stop(self, top=PROFILE_TOP_N):
+        """
+        計測を終了して .pstats と .collapsed を保存し、上位の関数を表示
+
+        Returns:
+            保存した .pstats ファイルのパス
+        """
+        self.profile.disable()
+        self.sampler.stop()
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, self.name.replace('/', '__'))
+        suffix = 1
+        while os.path.exists(f"{base}.pstats" if suffix == 1 else f"{base}_{suffix}.pstats"):
+            suffix += 1
+        if suffix > 1:
+            base = f"{base}_{suffix}"
+
+        pstats_file = f"{base}.pstats"
+        collapsed_file = f"{base}.collapsed"
+
+        self.profile.dump_stats(pstats_file)
+        with open(collapsed_file, 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self.sampler.stacks.items()):
+                f.write(f"{stack} {count}\n")
+
+        print_top_functions(pstats.Stats(pstats_file), self.name, top)
+        print(f"  プロファイル: {pstats_file}")
+        print(f"  フレームグラフ用: {collapsed_file}（{sum(self.sampler.stacks.values()):,}サンプル）")
+        return pstats_file
+
+
+def _function_label(func):
+    filename, line, name = func
+    if filename == '~':
+        # 組み込み関数（例: <method 'sort' of 'list' objects>）
+        return name
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+def print_top_functions(stats, name, top=PROFILE_TOP_N):
+    """自己時間の長い関数の上位を表示"""
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:top]
+    total = stats.total_tt
+
+    print(f"\n🔥 {name}: 自己時間の長い関数 上位{len(rows)}件（合計 {total:.2f}秒）")
+    print(f"  {'自己時間(秒)':>12} {'割合':>6} {'累積(秒)':>10} {'呼び出し回数':>12}  関数")
+    for func, (primitive_calls, calls, self_time, cumulative_time, _) in rows:
+        share = self_time / total * 100 if total else 0.0
+        print(f"  {self_time:>12.3f} {share:>5.1f}% {cumulative_time:>10.3f} {calls:>12,}  {_function_label(func)}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='保存したプロファイル（.pstats）の上位の関数を表示')
+    parser.add_argument('pstats_file', help='.pstatsファイルのパス')
+    parser.add_argument('--top', type=int, default=PROFILE_TOP_N, help=f'表示する関数の数（デフォルト: {PROFILE_TOP_N}）')
+    args = parser.parse_args()
+
+    print_top_functions(pstats.Stats(args.pstats_file), os.path.basename(args.pstats_file), args.top)
@@ -1,8 +1,15 @@
-from google.cloud import bigquery
-import pandas as pd
+from __future__ import annotations
+
 from datetime import datetime, timedelta
 import os
 
+from lazy_imports import lazy_import
+from profiling import profile_flag_from_argv
+from seo_etl import files
+from stage_metrics import count_api_call, current_stage, instrumented
+
+pd = lazy_import('pandas')
+
 # BigQuery設定
 PROJECT_ID = 'stanby-prod'
 DATASET_ID = 'searchconsole'
@@ -10,6 +17,8 @@ TABLE_ID = 'searchdata_url_impression'
 
 def get_bigquery_client():
     """BigQueryクライアントを取得"""
+    from google.cloud import bigquery
+
     # gcloud auth application-default loginで設定した認証を使用
     client = bigquery.Client(project=PROJECT_ID)
     return client
@@ -40,6 +49,7 @@ def check_table_schema():
 
     return table.schema
 
+@instrumented('bigquery_weekly')
 def get_weekly_search_console_data(weeks: int = 12, min_impressions: int = 10):
     """
     週次のSearch Consoleデータを取得し、前週比を計算
@@ -76,6 +86,9 @@ def get_weekly_search_console_data(weeks: int = 12, min_impressions: int = 10):
     print("※大量データのため、数分かかる場合があります...")
 
     # ジョブを開始
+    metrics = current_stage()
+    step = metrics.step('query')
+    count_api_call('bigquery')
     query_job = client.query(query)
 
     # 進捗を表示しながら待機
@@ -89,9 +102,14 @@ def get_weekly_search_console_data(weeks: int = 12, min_impressions: int = 10):
     elapsed = int(time.time() - start_time)
     print(f"\n✓ クエリ完了 ({elapsed}秒)")
 
+    if query_job.total_bytes_processed is not None:
+        step.set(bytes_processed=query_job.total_bytes_processed)
+
     # 結果を取得
+    step = metrics.step('fetch')
     print("結果を取得中...")
     df = query_job.to_dataframe()
+    step.rows_out = metrics.rows_out = len(df)
     print(f"✓ 取得完了: {len(df):,}行")
 
     if len(df) == 0:
@@ -99,14 +117,18 @@ def get_weekly_search_console_data(weeks: int = 12, min_impressions: int = 10):
 
     return df
 
-def save_to_csv(df: pd.DataFrame, output_dir: str = './data/search_console'):
-    """CSVファイルとして保存"""
+@instrumented()
+def save_to_csv(df: pd.DataFrame, output_dir: str = './data/search_console', params: dict = None):
+    """CSVファイルとして保存（paramsは取得条件。出力カタログに記録）"""
     os.makedirs(output_dir, exist_ok=True)
 
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     output_file = os.path.join(output_dir, f"search_console_weekly_{timestamp}.csv")
 
     df.to_csv(output_file, index=False, encoding='utf-8-sig')
+    current_stage().rows_in = len(df)
+    current_stage().wrote(output_file)
+    files.record_output(output_file, files.SEARCH_CONSOLE_WEEKLY, params=params, rows=len(df))
     print(f"保存完了: {output_file}")
 
     return output_file
@@ -114,6 +136,9 @@ def save_to_csv(df: pd.DataFrame, output_dir: str = './data/search_console'):
 if __name__ == '__main__':
     import sys
 
+    # --profile は位置引数（週数・最小インプレッション）の前に取り除く
+    profile_flag_from_argv()
+
     if len(sys.argv) > 1 and sys.argv[1] == '--check-schema':
         # スキーマ確認モード
         check_table_schema()
@@ -134,7 +159,7 @@ if __name__ == '__main__':
                 print("\n⚠ データが取得できませんでした")
                 sys.exit(0)
 
-            output_file = save_to_csv(df)
+            output_file = save_to_csv(df, params={'weeks': weeks, 'min_impressions': min_imp})
 
             # サマリー表示
             print("\n" + "="*50)
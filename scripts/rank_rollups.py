@@ -0,0 +1,268 @@
+"""
+順位データの週次・月次ロールアップ
+
+マージ済みデータ（元ファイルの粒度。日次のこともある）を、キーワード×URLごとに
+ISO週（月曜始まり）と月の区間に集約して保存します。週次・月次の推移分析は
+全期間の明細ではなく、この小さなロールアップを読みます。
+
+集約する値（区間内の観測について）:
+    rank_mean, rank_median, rank_best（最小）, rank_worst（最大）
+    distance_mean, distance_median, distance_min, distance_max
+    observations（観測数）
+
+ロールアップは data/processed/rank_rollup_{week,month}_<タイムスタンプ>.csv に保存し、
+入力のマージ済みファイルとともに出力カタログに記録します。同じマージ済みファイルから
+作ったロールアップがあれば作り直しません。
+
+使い方:
+    # 最新のマージ済みデータからロールアップを作成し、月次の変化をCSVに保存
+    python scripts/rank_rollups.py
+
+    # 直近24ヶ月の月次変化を中央値で計算
+    python scripts/rank_rollups.py --months 24 --stat median
+"""
+from __future__ import annotations
+
+import os
+from datetime import datetime
+from pathlib import Path
+
+from lazy_imports import lazy_import
+from profiling import enable_profiling
+from seo_etl import catalog, files, stages
+from stage_metrics import instrumented, stage
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# 設定
+OUTPUT_DIR = './data/analysis'
+PERIODS = ('week', 'month')
+STATS = ('mean', 'median')
+
+# 区間 → 出力の種類
+ROLLUP_KINDS = {
+    'week': files.RANK_ROLLUP_WEEK,
+    'month': files.RANK_ROLLUP_MONTH,
+}
+
+
+def period_start(dates: np.ndarray, period: str) -> np.ndarray:
+    """
+    日付が属する区間の開始日（datetime64[D]）
+
+    Args:
+        dates: 日付の配列
+        period: 'week'（ISO週、月曜始まり）または 'month'
+    """
+    days = np.asarray(dates).astype('datetime64[D]')
+    if period == 'week':
+        # 1970-01-01は木曜日のため、(日数 + 3) % 7 が月曜始まりの曜日
+        weekday = (days.astype(np.int64) + 3) % 7
+        return days - weekday.astype('timedelta64[D]')
+    if period == 'month':
+        return days.astype('datetime64[M]').astype('datetime64[D]')
+    raise ValueError(f"不明な区間です: {period}（{', '.join(PERIODS)} のいずれか）")
+
+
+def period_labels(starts: pd.Series, period: str) -> pd.Series:
+    """区間の表示名（週は '2025-W03'、月は '2025-01'）"""
+    unique = pd.Series(pd.to_datetime(starts.unique()))
+    if period == 'week':
+        iso = unique.dt.isocalendar()
+        labels = iso['year'].astype(str) + '-W' + iso['week'].astype(str).str.zfill(2)
+    else:
+        labels = unique.dt.strftime('%Y-%m')
+    return pd.to_datetime(starts).map(dict(zip(unique, labels)))
+
+
+def has_multiple_per_period(rank_frame: pd.DataFrame, period: str = 'week') -> bool:
+    """1つの区間に複数の日付のデータがあるか（日次のファイルをマージした場合など）"""
+    from analyze_trends import prepare_rank_frame
+
+    dates = np.unique(prepare_rank_frame(rank_frame)['date'].to_numpy().astype('datetime64[D]'))
+    starts = period_start(dates, period)
+    return len(np.unique(starts)) < len(dates)
+
+
+def rollup(rank_frame: pd.DataFrame, period: str) -> pd.DataFrame:
+    """
+    キーワード×URL×区間ごとに順位・距離を集約
+
+    Args:
+        rank_frame: マージ済みデータまたはprepare_rank_frameで作成したデータフレーム
+        period: 'week' または 'month'
+
+    Returns:
+        keyword, url, period, period_start と集約値のデータフレーム（keyword, url, period_start の順）
+    """
+    from analyze_trends import prepare_rank_frame
+
+    frame = prepare_rank_frame(rank_frame)
+    grouped = frame.assign(
+        period_start=period_start(frame['date'].to_numpy(), period).astype('datetime64[ns]')
+    ).groupby(['keyword', 'url', 'period_start'], observed=True, sort=True)
+
+    result = grouped.agg(
+        rank_mean=('rank', 'mean'),
+        rank_median=('rank', 'median'),
+        rank_best=('rank', 'min'),
+        rank_worst=('rank', 'max'),
+        distance_mean=('distance', 'mean'),
+        distance_median=('distance', 'median'),
+        distance_min=('distance', 'min'),
+        distance_max=('distance', 'max'),
+        observations=('rank', 'size'),
+    ).reset_index()
+
+    for column in ('rank_mean', 'distance_mean', 'distance_median'):
+        result[column] = result[column].round(2)
+    result.insert(2, 'period', period_labels(result['period_start'], period))
+    return result
+
+
+def rollup_rank_frame(rollup_df: pd.DataFrame, stat: str = 'mean') -> pd.DataFrame:
+    """
+    ロールアップを分析用の順位データの形（date, keyword, url, rank, distance）に変換
+
+    dateは区間の開始日。calculate_weekly_changes などにそのまま渡せます。
+    """
+    if stat not in STATS:
+        raise ValueError(f"不明な集約値です: {stat}（{', '.join(STATS)} のいずれか）")
+
+    return pd.DataFrame({
+        'date': rollup_df['period_start'],
+        'keyword': rollup_df['keyword'],
+        'url': rollup_df['url'],
+        'rank': rollup_df[f'rank_{stat}'],
+        'distance': rollup_df[f'distance_{stat}'],
+    })
+
+
+def period_changes(rollup_df: pd.DataFrame, periods: int = 12, stat: str = 'mean') -> pd.DataFrame:
+    """
+    ロールアップから区間ごとの順位・距離の変化を計算（週次なら前週比、月次なら前月比）
+
+    Args:
+        rollup_df: rollup() または load_rollup() のデータフレーム
+        periods: 遡る区間数
+        stat: 比較に使う集約値（'mean' または 'median'）
+    """
+    from analyze_trends import calculate_weekly_changes
+
+    return calculate_weekly_changes(rollup_rank_frame(rollup_df, stat), weeks=periods)
+
+
+def save_rollup(rollup_df, period, output_dir=files.PROCESSED_DIR, merged_file=None):
+    """ロールアップをCSVに保存して出力カタログに記録"""
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_file = os.path.join(output_dir, f"rank_rollup_{period}_{timestamp}.csv")
+
+    rollup_df.to_csv(output_file, index=False, encoding='utf-8-sig')
+    files.record_output(output_file, ROLLUP_KINDS[period], params={'period': period},
+                        inputs=[merged_file] if merged_file else (), rows=len(rollup_df))
+    print(f"✓ 保存: {output_file}（{len(rollup_df):,}行）")
+    return output_file
+
+
+def _read_rollup(path):
+    rollup_df = pd.read_csv(path, parse_dates=['period_start'])
+    rollup_df['keyword'] = pd.Categorical(rollup_df['keyword'])
+    rollup_df['url'] = pd.Categorical(rollup_df['url'])
+    return rollup_df
+
+
+def load_rollup(period, merged_file=None, directory=files.PROCESSED_DIR):
+    """
+    保存済みの最新のロールアップを読み込み
+
+    merged_file を指定した場合は、そのマージ済みファイルから作ったものだけを返します。
+
+    Returns:
+        ロールアップのデータフレーム（ない場合はNone）
+    """
+    path = files.latest_output(ROLLUP_KINDS[period], directory)
+    if path is None:
+        return None
+
+    if merged_file is not None:
+        found = catalog.lineage(path)
+        inputs = [row['input_path'] for row in found[1]] if found else []
+        if catalog.normalize_path(merged_file) not in inputs:
+            return None
+
+    print(f"ロールアップを読み込み: {path}")
+    return _read_rollup(path)
+
+
+@instrumented()
+def build_rollups(merged: pd.DataFrame | str | None = None, output_dir: str = files.PROCESSED_DIR,
+                  periods=PERIODS, merged_file: str | None = None) -> dict[str, pd.DataFrame]:
+    """
+    週次・月次のロールアップを作成して保存（同じマージ済みファイルから作ったものがあれば再利用）
+
+    Args:
+        merged: マージ済みデータのDataFrame、マージ済みCSVのパス、またはNone（最新のファイル）
+        output_dir: 保存先
+        periods: 作成する区間
+        merged_file: mergedにDataFrameを渡す場合の元のマージ済みファイル（再利用の判定とリネージに使用）
+
+    Returns:
+        {区間: ロールアップ}
+    """
+    if merged is None or isinstance(merged, str):
+        merged_file, merged = merged or stages.latest_merged_file(), None
+
+    rollups = {}
+    if merged_file is not None:
+        for period in periods:
+            cached = load_rollup(period, merged_file, output_dir)
+            if cached is not None:
+                rollups[period] = cached
+
+    missing = [period for period in periods if period not in rollups]
+    if missing and merged is None:
+        merged = stages.load_merged(merged_file)
+
+    for period in missing:
+        with stage(f'rollup_{period}') as step:
+            rollups[period] = rollup(merged, period)
+            step.rows_in, step.rows_out = len(merged), len(rollups[period])
+        save_rollup(rollups[period], period, output_dir, merged_file)
+    return {period: rollups[period] for period in periods}
+
+
+def export_period_changes(rollup_df, period, output_dir=OUTPUT_DIR, periods=12, stat='mean'):
+    """区間ごとの変化をCSVに保存（period_changes_{week,month}_<タイムスタンプ>.csv）"""
+    changes = period_changes(rollup_df, periods=periods, stat=stat)
+
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_file = os.path.join(output_dir, f"period_changes_{period}_{timestamp}.csv")
+    changes.to_csv(output_file, index=False, encoding='utf-8-sig')
+    files.record_output(output_file, files.PERIOD_CHANGES, params={'period': period, 'periods': periods, 'stat': stat},
+                        rows=len(changes))
+    print(f"✓ 保存: {output_file}（{len(changes):,}行）")
+    return output_file
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='順位データの週次・月次ロールアップ')
+    parser.add_argument('--input', type=str, help='マージ済みデータ（省略時は最新のファイル）')
+    parser.add_argument('--output-dir', type=str, default=OUTPUT_DIR, help='月次変化の出力ディレクトリ')
+    parser.add_argument('--months', type=int, default=12, help='月次変化で遡る月数（デフォルト: 12）')
+    parser.add_argument('--stat', choices=STATS, default='mean', help='比較に使う集約値（デフォルト: mean）')
+    parser.add_argument('--profile', action='store_true', help='処理をプロファイルして data/profiles/ に保存')
+
+    args = parser.parse_args()
+    enable_profiling(args.profile)
+
+    try:
+        rollups = build_rollups(args.input)
+        export_period_changes(rollups['month'], 'month', args.output_dir, periods=args.months, stat=args.stat)
+    except FileNotFoundError as e:
+        print(f"エラー: {e}")
+        exit(1)
@@ -0,0 +1,123 @@
+"""
+r_hash（32桁の16進文字列）を固定長の整数キーに変換する共通レイヤー
+
+データ読み込み時に r_hash を 128bit キー（numpy の V16）に変換し、
+複数のデータセットをまたいで比較する場合は int32 の辞書コードに変換します。
+集合演算・結合・集計は固定長配列上で行い、出力時にだけ16進文字列へ戻します。
+
+使い方:
+    keys = hex_to_keys(df['r_hash'])                 # 128bitキー
+    dictionary = build_rhash_dictionary([keys_a, keys_b])
+    codes_a = encode_keys(keys_a, dictionary)        # int32コード
+    dropped = np.setdiff1d(codes_a, codes_b, assume_unique=True)
+    hashes = decode_codes(dropped, dictionary)       # 16進文字列に戻す
+"""
+from __future__ import annotations
+
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+RHASH_PATTERN = r'r_([a-f0-9]{32})'
+RHASH_HEX_LENGTH = 32
+
+# 128bitキー（16バイト固定長）
+# numpyを読み込まずに定義できるよう、dtypeは文字列で指定（np.dtype('V16') と同じ）
+RHASH_KEY_DTYPE = 'V16'
+
+# 辞書エンコード後のコード
+RHASH_CODE_DTYPE = 'int32'
+
+
+def extract_rhash(values: pd.Series) -> pd.Series:
+    """URL等の文字列からr_hashを抽出（見つからない場合はNaN）"""
+    return values.astype('string').str.extract(RHASH_PATTERN, expand=False)
+
+
+def hex_to_keys(hashes) -> np.ndarray:
+    """
+    r_hashの16進文字列を128bitキーの配列に変換
+
+    欠損値・32桁でない値は除外されます。
+
+    Args:
+        hashes: r_hashの16進文字列（Series / 配列 / リスト）
+
+    Returns:
+        dtype V16 のnumpy配列
+    """
+    hashes = pd.Series(hashes, dtype='string').dropna().str.lower()
+    hashes = hashes[hashes.str.fullmatch(r'[0-9a-f]{32}')]
+
+    if len(hashes) == 0:
+        return np.empty(0, dtype=RHASH_KEY_DTYPE)
+
+    return np.frombuffer(bytes.fromhex(''.join(hashes.tolist())), dtype=RHASH_KEY_DTYPE)
+
+
+def keys_to_hex(keys: np.ndarray) -> np.ndarray:
+    """128bitキーの配列をr_hashの16進文字列に戻す"""
+    keys = np.ascontiguousarray(keys, dtype=RHASH_KEY_DTYPE)
+
+    if len(keys) == 0:
+        return np.empty(0, dtype=object)
+
+    hex_bytes = keys.tobytes().hex().encode('ascii')
+    return np.frombuffer(hex_bytes, dtype=f'S{RHASH_HEX_LENGTH}').astype(str).astype(object)
+
+
+def build_rhash_dictionary(key_arrays) -> np.ndarray:
+    """
+    複数の128bitキー配列から共通の辞書（ソート済みユニークキー）を作成
+
+    Args:
+        key_arrays: hex_to_keysで作成したキー配列のリスト
+
+    Returns:
+        ソート済みのユニークな128bitキー配列（インデックスがint32コードになる）
+    """
+    key_arrays = [np.asarray(keys, dtype=RHASH_KEY_DTYPE) for keys in key_arrays]
+
+    if not key_arrays:
+        return np.empty(0, dtype=RHASH_KEY_DTYPE)
+
+    dictionary = np.unique(np.concatenate(key_arrays))
+
+    if len(dictionary) > np.iinfo(RHASH_CODE_DTYPE).max:
+        raise ValueError(f"r_hashの種類数が多すぎます: {len(dictionary):,}件")
+
+    return dictionary
+
+
+def encode_keys(keys: np.ndarray, dictionary: np.ndarray) -> np.ndarray:
+    """
+    128bitキーを辞書のint32コードに変換
+
+    辞書に存在しないキーはValueErrorになります（build_rhash_dictionaryで
+    全データセットのキーから辞書を作成してください）。
+    """
+    keys = np.asarray(keys, dtype=RHASH_KEY_DTYPE)
+    codes = np.searchsorted(dictionary, keys)
+
+    found = codes < len(dictionary)
+    found[found] = dictionary[codes[found]] == keys[found]
+    if not found.all():
+        raise ValueError(f"辞書に存在しないr_hashがあります: {(~found).sum():,}件")
+
+    return codes.astype(RHASH_CODE_DTYPE)
+
+
+def decode_codes(codes: np.ndarray, dictionary: np.ndarray) -> np.ndarray:
+    """int32コードをr_hashの16進文字列に戻す"""
+    return keys_to_hex(dictionary[np.asarray(codes, dtype=np.intp)])
+
+
+def to_rhash_category(hashes: pd.Series) -> pd.Series:
+    """
+    r_hash列を辞書エンコード済みのcategory型に変換
+
+    DataFrameのquery_hash / r_hash列に使用します。カテゴリはソート済みで、
+    値の実体は1種類につき1つだけ保持され、各行はint32以下のコードになります。
+    """
+    return hashes.astype(pd.CategoricalDtype(np.sort(hashes.dropna().unique())))
@@ -0,0 +1,475 @@
+"""
+外部サービスを使わないオフラインの動作確認
+
+Dify APIなど外部サービスを呼ぶ処理を、スタブのセッション・クライアントに差し替えて
+一時ディレクトリ上で実行し、期待どおりに動くかを確認します。APIキーやネットワークは不要です。
+
+確認内容:
+- dify_sync: Difyへの差分同期（変更なしはスキップ、変更は更新、エクスポートからなくなったものは削除）
+- dify_export_stability: Difyエクスポートで、一部の行が変わっても他のシャード・ドキュメントの内容が変わらない
+- insights_streaming: 考察のストリーミング書き込み（生成中は .partial、完了時に置き換え、中断時は .partial が残る）
+- insights_cache: 考察のレスポンスキャッシュ（ヒット・ミス・有効期限・壊れたエントリ）
+- merge_undated: ファイル名に日付がない生データもマージでき、Arrowファイルが作成される
+- trend_labels: 順位推移分析で、キーワード列がない古い週次ファイルの行にも最新のファイルのラベルが付く
+- benchmark_stages: ベンチマークの全ステージ（インデックス落ち分析・タイムラインを含む）が小さな合成データで完走する
+
+使い方:
+    python scripts/selftest.py              # すべての確認を実行
+    python scripts/selftest.py dify_sync    # 指定した確認だけ実行
+"""
+import os
+import sys
+import glob
+import json
+import argparse
+import tempfile
+import time
+import traceback
+import contextlib
+
+# 確認中に書き込むカタログ・ランログ（一時ディレクトリ内のパス、ランログは記録しない）
+CHECK_ENV = {
+    'SEO_ETL_CATALOG': os.path.join('data', 'cache', 'artifact_catalog.sqlite'),
+    'SEO_ETL_RUN_LOG': 'off',
+}
+
+
+@contextlib.contextmanager
+def workspace():
+    """一時ディレクトリをカレントディレクトリにし、カタログ・ランログの環境変数を設定"""
+    previous_dir = os.getcwd()
+    previous_env = {name: os.environ.get(name) for name in CHECK_ENV}
+    with tempfile.TemporaryDirectory(prefix='seo_etl_selftest_') as directory:
+        os.chdir(directory)
+        os.environ.update(CHECK_ENV)
+        try:
+            yield directory
+        finally:
+            os.chdir(previous_dir)
+            for name, value in previous_env.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+
+@contextlib.contextmanager
+def patched(module, **values):
+    """モジュールの変数を一時的に置き換え"""
+    previous = {name: getattr(module, name) for name in values}
+    for name, value in values.items():
+        setattr(module, name, value)
+    try:
+        yield module
+    finally:
+        for name, value in previous.items():
+            setattr(module, name, value)
+
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+class StubResponse:
+    """requests.Response の代わり（status_code・json・raise_for_status のみ）"""
+
+    def __init__(self, payload=None, status_code=200):
+        self.payload = payload or {}
+        self.status_code = status_code
+
+    def json(self):
+        return self.payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+class StubDifySession:
+    """
+    Dify APIのスタブ（ドキュメントの一覧・作成・更新・削除をメモリ上で再現）
+
+    送信されたリクエストは calls に (メソッド, 操作, ファイル名またはドキュメントID) で記録します。
+    """
+
+    def __init__(self):
+        self.documents = {}
+        self.calls = []
+        self.next_id = 1
+
+    def get(self, url, params=None, timeout=None):
+        if url.endswith('/documents'):
+            data = [{'id': doc_id, 'name': name} for doc_id, name in self.documents.items()]
+            self.calls.append(('GET', 'list', None))
+            return StubResponse({'data': data, 'has_more': False, 'total': len(data), 'limit': len(data)})
+        raise AssertionError(f"想定外のGET: {url}")
+
+    def post(self, url, files=None, timeout=None):
+        name = json.loads(files['data'][1])['name']
+        if url.endswith('/document/create_by_file'):
+            doc_id = f'doc-{self.next_id}'
+            self.next_id += 1
+            self.calls.append(('POST', 'create', name))
+        elif url.endswith('/update_by_file'):
+            doc_id = url.split('/')[-2]
+            assert doc_id in self.documents, f"存在しないドキュメントの更新: {doc_id}"
+            self.calls.append(('POST', 'update', name))
+        else:
+            raise AssertionError(f"想定外のPOST: {url}")
+        self.documents[doc_id] = name
+        return StubResponse({'document': {'id': doc_id}, 'batch': f'batch-{doc_id}'})
+
+    def delete(self, url, timeout=None):
+        doc_id = url.rsplit('/', 1)[-1]
+        self.calls.append(('DELETE', 'delete', doc_id))
+        if self.documents.pop(doc_id, None) is None:
+            return StubResponse(status_code=404)
+        return StubResponse()
+
+
+def check_dify_sync():
+    """Difyへの差分同期: 変更なし・変更あり・削除の3種類のドキュメント"""
+    import upload_to_dify_api as dify
+
+    session = StubDifySession()
+    export_dir = 'dify_export'
+    manifest_file = os.path.join('data', 'cache', 'dify_sync_manifest.json')
+
+    def sync():
+        dify._document_cache.clear()
+        dify.upload_documents(export_dir, manifest_file=manifest_file, concurrency=2, wait=False)
+        with open(manifest_file, encoding='utf-8') as f:
+            return json.load(f)['dataset']
+
+    with patched(dify, _session=session, _upload_session=session, DIFY_DATASET_ID='dataset',
+                 DIFY_API_ENDPOINT='https://dify.invalid/v1'):
+        for name in ('unchanged.md', 'changed.md', 'deleted.md'):
+            _write(os.path.join(export_dir, name), f'# {name}\n')
+
+        # 初回はすべて作成
+        synced = sync()
+        created = sorted(name for method, action, name in session.calls if action == 'create')
+        assert created == ['changed.md', 'deleted.md', 'unchanged.md'], created
+        assert sorted(synced) == created, synced
+        doc_ids = {name: entry['doc_id'] for name, entry in synced.items()}
+
+        # 1件を変更、1件をエクスポートから削除して再同期
+        _write(os.path.join(export_dir, 'changed.md'), '# changed.md\n\n変更後\n')
+        os.remove(os.path.join(export_dir, 'deleted.md'))
+        session.calls.clear()
+        synced = sync()
+
+        writes = [(method, action, target) for method, action, target in session.calls if method != 'GET']
+        assert writes == [('POST', 'update', 'changed.md'), ('DELETE', 'delete', doc_ids['deleted.md'])], writes
+        assert sorted(synced) == ['changed.md', 'unchanged.md'], synced
+        assert synced['changed.md']['sha256'] == dify.file_sha256(os.path.join(export_dir, 'changed.md'))
+        assert synced['unchanged.md']['doc_id'] == doc_ids['unchanged.md']
+        assert sorted(session.documents.values()) == ['changed.md', 'unchanged.md'], session.documents
+
+        # 変更がなければAPIへの書き込みなし
+        session.calls.clear()
+        sync()
+        assert all(method == 'GET' for method, _, _ in session.calls), session.calls
+
+
+def check_dify_export_stability():
+    """Difyエクスポートの安定性: 先頭付近の1行の変更・追加で書き換わるシャードはその周辺だけ"""
+    import pandas as pd
+    import export_for_dify as export
+
+    def columns(df):
+        return [('キーワード', export.format_column(df['keyword'])), ('順位', export.format_column(df['rank']))]
+
+    def shards(df):
+        built = export.build_shards(df, 'test', 'テスト', {'週': 'week'}, columns, 2048)
+        return {name: shard['content'] for name, shard in built.items()}
+
+    df = pd.DataFrame({'keyword': [f'keyword-{i:05d}' for i in range(2000)], 'rank': range(2000), 'week': 'w1'})
+    before = shards(df)
+    assert len(before) >= 10, len(before)
+
+    # 先頭付近の1行を変更し、1行を追加
+    edited = df.copy()
+    edited.loc[3, 'rank'] = -1
+    edited = pd.concat([edited.iloc[:10], pd.DataFrame({'keyword': ['inserted'], 'rank': [0], 'week': ['w1']}),
+                        edited.iloc[10:]], ignore_index=True)
+    after = shards(edited)
+
+    changed = {name for name in set(before) | set(after) if before.get(name) != after.get(name)}
+    assert len(changed) <= 3, (len(changed), len(before), sorted(changed))
+
+    # 単体のドキュメントには実行日時を含めず、同じ内容なら更新日時も変わらない
+    with patched(export, OUTPUT_DIR='dify_export'):
+        path = export.export_metadata()
+        with open(path, 'rb') as f:
+            content = f.read()
+        with open(os.path.join('dify_export', export.EXPORT_MANIFEST_FILE), encoding='utf-8') as f:
+            updated_at = json.load(f)['documents']['data_dictionary.md']['updated_at']
+
+        time.sleep(1.1)
+        export.export_metadata()
+        with open(path, 'rb') as f:
+            assert f.read() == content
+        with open(os.path.join('dify_export', export.EXPORT_MANIFEST_FILE), encoding='utf-8') as f:
+            entry = json.load(f)['documents']['data_dictionary.md']
+        assert entry['updated_at'] == updated_at and entry['generated_at'] != updated_at, entry
+
+
+class FakeStream:
+    """
+    client.messages.stream() の代わり（text_stream で chunks を順に返す）
+
+    on_chunk を指定した場合は各チャンクを返す前に呼び出し、fail_after 件を返したところで例外を送出します。
+    """
+
+    def __init__(self, chunks, on_chunk=None, fail_after=None):
+        self.chunks = chunks
+        self.on_chunk = on_chunk
+        self.fail_after = fail_after
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    @property
+    def text_stream(self):
+        for i, chunk in enumerate(self.chunks):
+            if i == self.fail_after:
+                raise TimeoutError("ストリームが途中で切断されました")
+            if self.on_chunk:
+                self.on_chunk(i)
+            yield chunk
+
+    def get_final_message(self):
+        usage = type('Usage', (), {'output_tokens': len(self.chunks)})()
+        return type('Message', (), {'usage': usage})()
+
+
+class FakeClient:
+    """Claude APIクライアントの代わり（messages.stream が FakeStream を返す）"""
+
+    def __init__(self, stream):
+        self.stream_calls = 0
+        self.messages = self
+        self._stream = stream
+
+    def stream(self, **kwargs):
+        self.stream_calls += 1
+        return self._stream
+
+
+def check_insights_streaming():
+    """考察のストリーミング: 生成中は .partial に書き込み、完了時に置き換え、中断時は .partial が残る"""
+    import generate_insights as insights
+
+    chunks = ['## 概要\n', '順位は', '改善傾向です。\n']
+
+    def assert_partial(i):
+        # 生成中は .partial だけがあり、受信済みのチャンクまで書き込まれている
+        partial = glob.glob(os.path.join('completed', '*.md.partial'))
+        assert len(partial) == 1 and not glob.glob(os.path.join('completed', '*.md')), os.listdir('completed')
+        with open(partial[0], encoding='utf-8') as f:
+            assert f.read().endswith(''.join(chunks[:i])), i
+
+    client = FakeClient(FakeStream(chunks, on_chunk=assert_partial))
+    text, output_file = insights.generate_insights_streaming({}, use_cache=False, client=client,
+                                                             output_dir='completed')
+    assert text == ''.join(chunks), text
+    assert os.listdir('completed') == [os.path.basename(output_file)], os.listdir('completed')
+    with open(output_file, encoding='utf-8') as f:
+        content = f.read()
+    assert content.startswith(insights._insights_header()) and content.endswith(text), content
+
+    # 途中で切断された場合は置き換えず、受信済みの部分を .partial に残す
+    client = FakeClient(FakeStream(chunks, fail_after=2))
+    try:
+        insights.generate_insights_streaming({}, use_cache=False, client=client, output_dir='interrupted')
+    except TimeoutError:
+        pass
+    else:
+        raise AssertionError("ストリームの例外が送出されていません")
+    remaining = os.listdir('interrupted')
+    assert len(remaining) == 1 and remaining[0].endswith('.md.partial'), remaining
+    with open(os.path.join('interrupted', remaining[0]), encoding='utf-8') as f:
+        assert f.read().endswith(''.join(chunks[:2]))
+
+
+def check_insights_cache():
+    """考察のキャッシュ: ヒット・ミス・有効期限・壊れたエントリ"""
+    import generate_insights as insights
+
+    cache_dir = os.path.join('data', 'cache', 'claude_insights')
+    key = insights.response_cache_key(insights.CLAUDE_MODEL, insights.TEMPERATURE, insights.MAX_OUTPUT_TOKENS, 'a')
+    other_key = insights.response_cache_key(insights.CLAUDE_MODEL, insights.TEMPERATURE,
+                                            insights.MAX_OUTPUT_TOKENS, 'b')
+    assert key != other_key
+
+    # ヒット・ミス
+    insights.save_cached_response(key, '考察', {'model': insights.CLAUDE_MODEL}, cache_dir)
+    assert insights.load_cached_response(key, cache_dir) == '考察'
+    assert insights.load_cached_response(other_key, cache_dir) is None
+
+    # 有効期限切れはミスになり、エントリを削除
+    cache_file = os.path.join(cache_dir, f'{key}.json')
+    assert insights.load_cached_response(key, cache_dir, ttl_seconds=-1) is None
+    assert not os.path.exists(cache_file)
+
+    # 壊れたエントリ（JSONでない・textがない・textが文字列でない・オブジェクトでない）はミス
+    for entry in ('{broken', json.dumps({'created_at': time.time()}),
+                  json.dumps({'created_at': time.time(), 'text': 1}), json.dumps(['text'])):
+        _write(cache_file, entry)
+        assert insights.load_cached_response(key, cache_dir) is None, entry
+
+    # evict_cache は更新時刻が有効期限より古いエントリを削除
+    insights.save_cached_response(key, '考察', {}, cache_dir)
+    insights.save_cached_response(other_key, '考察', {}, cache_dir)
+    expired = time.time() - insights.CACHE_TTL_SECONDS - 60
+    os.utime(cache_file, (expired, expired))
+    assert insights.evict_cache(cache_dir) == 1
+    assert os.listdir(cache_dir) == [f'{other_key}.json'], os.listdir(cache_dir)
+
+    # 同じプロンプトの2回目はAPIを呼ばずにキャッシュを使う
+    client = FakeClient(FakeStream(['考察']))
+    for _ in range(2):
+        text, _ = insights.generate_insights_streaming({}, client=client, cache_dir=cache_dir, output_dir='insights')
+        assert text == '考察', text
+    assert client.stream_calls == 1, client.stream_calls
+
+
+def check_merge_undated():
+    """マージのArrow保存: ファイル名に日付がない生データがあってもArrowファイルが作成される"""
+    import pandas as pd
+    import merge_data
+
+    header = 'キーワード,URL,ランク,距離\n'
+    _write('raw/Site_0001_キーワード_2025-01-06_2025-01-06.csv', header + 'a,https://example.com/a,3,1\n')
+    _write('raw/keywords_export.csv', header + 'b,https://example.com/b,50+,2\n')
+
+    merged = merge_data.merge_weekly_data('raw', 'processed')
+    assert merged is not None and len(merged) == 2, merged
+
+    csv_file = glob.glob('processed/merged_data_*.csv')[0]
+    assert os.path.exists(merge_data.arrow_path_for(csv_file)), os.listdir('processed')
+
+    # 日付として読めないdateがある場合は文字列のまま保存される
+    loaded = merge_data.load_merged_data(csv_file)
+    assert sorted(loaded['date']) == ['2025-01-06', 'keywords_export'], loaded['date']
+
+    # 日付だけなら日付型で保存される
+    dated = pd.DataFrame({'キーワード': ['a'], 'date': ['2025-01-06']})
+    arrow_file = merge_data.save_merged_arrow(dated, 'processed/dated.csv')
+    loaded = pd.read_feather(arrow_file)
+    assert pd.api.types.is_datetime64_any_dtype(loaded['date']), loaded.dtypes
+
+
+def check_trend_labels():
+    """順位推移分析のラベル補完: 列がない古い週次ファイルも最新のファイルのラベルで1つの系列になる"""
+    import hashlib
+    import pandas as pd
+    import category_index
+    import analyze_search_console_trends as trends
+
+    # 古い3週分はラベル列なし、最新の週だけ query_keyword・query_location・category あり
+    hashes = [hashlib.md5(key.encode()).hexdigest() for key in ('a', 'b')]
+    positions = {hashes[0]: [3, 6, 9, 12], hashes[1]: [40, 30, 20, 10]}
+    weeks = ['2025-01-06', '2025-01-13', '2025-01-20', '2025-01-27']
+    for i, week in enumerate(weeks):
+        rows = []
+        for query_hash, values in positions.items():
+            row = {'query_hash': query_hash, 'week_start': week, 'avg_position': values[i],
+                   'prev_position': values[i - 1] if i else '', 'total_impressions': 10,
+                   'total_clicks': 1, 'position_diff': 0}
+            if i == len(weeks) - 1:
+                row.update(query_keyword=f'kw-{query_hash[:4]}', query_location='東京', category='cat')
+            rows.append(row)
+        os.makedirs('sc', exist_ok=True)
+        pd.DataFrame(rows).to_csv(f'sc/search_console_weekly_2025010{i}.csv', index=False)
+
+    # query_category_master.csv はない
+    with patched(category_index, _index=None):
+        trends.analyze_search_console_trends('sc', 'out')
+
+    result = pd.read_csv(glob.glob('out/search_console_trends_*.csv')[0])
+    assert (result['data_points'] == len(weeks)).all(), result[['query_hash', 'data_points']]
+    assert result['query_keyword'].notna().all(), result['query_keyword']
+
+
+def check_benchmark_stages():
+    """ベンチマークの全ステージ: 小さな合成データで各ステージが例外なく完走する"""
+    import benchmark
+    import index_timeline
+
+    benchmark.generate_dataset('.', scale=0.01, weeks=6)
+    for name, run, setup, _ in benchmark.build_stages():
+        if setup:
+            setup()
+        try:
+            run()
+        except Exception as e:
+            raise AssertionError(f"ステージ {name} が失敗しました: {e}") from e
+
+    # インデックス落ち分析がタイムラインにすべてのシートを追記している
+    timeline = index_timeline.load_timeline('./data/index_timeline/index_timeline.npz')
+    assert len(timeline['snapshots']) == benchmark.DEFAULT_SITE_SHEETS, timeline['snapshots']
+
+
+# 確認名 → 関数
+CHECKS = {
+    'dify_sync': check_dify_sync,
+    'dify_export_stability': check_dify_export_stability,
+    'insights_streaming': check_insights_streaming,
+    'insights_cache': check_insights_cache,
+    'merge_undated': check_merge_undated,
+    'trend_labels': check_trend_labels,
+    'benchmark_stages': check_benchmark_stages,
+}
+
+
+def run_checks(names=None):
+    """
+    確認を実行して結果を表示
+
+    Returns:
+        失敗した確認名のリスト
+    """
+    failed = []
+    for name in names or CHECKS:
+        # 確認中の処理の出力は表示しない
+        with open(os.devnull, 'w', encoding='utf-8') as devnull, workspace(), contextlib.redirect_stdout(devnull):
+            try:
+                CHECKS[name]()
+                error = None
+            except Exception:
+                error = traceback.format_exc()
+
+        if error is None:
+            print(f"  ✓ {name}: {CHECKS[name].__doc__}")
+        else:
+            failed.append(name)
+            print(f"  ✗ {name}: {CHECKS[name].__doc__}\n{error}")
+    return failed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='外部サービスを使わないオフラインの動作確認')
+    parser.add_argument('checks', nargs='*', metavar='CHECK',
+                        help=f"実行する確認（デフォルト: すべて。{', '.join(CHECKS)}）")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.checks if name not in CHECKS]
+    if unknown:
+        parser.error(f"不明な確認です: {', '.join(unknown)}（{', '.join(CHECKS)} のいずれか）")
+
+    print("=" * 60)
+    print("オフラインの動作確認")
+    print("=" * 60)
+
+    failed = run_checks(args.checks)
+    total = len(args.checks or CHECKS)
+    print(f"\n{total - len(failed)}/{total}件成功")
+    if failed:
+        sys.exit(1)
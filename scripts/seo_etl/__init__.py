@@ -0,0 +1,17 @@
+"""
+SEO ETL Pipeline の共通パッケージ
+
+scripts/ 以下の各スクリプトが共有する処理と、各ステージを同じプロセスから呼び出すための
+APIをまとめています（scripts/ を sys.path に入れて `from seo_etl import stages` のように使用）。
+
+- stages:     各ステージの関数（マージ・分析・エクスポート。DataFrameまたはパスを受け取り・返す）
+- files:      タイムスタンプ付きの出力ファイルの記録と検索（最新のファイル・直近N件）
+- catalog:    出力ファイルのカタログ（SQLite。パラメータ・リネージ・保持ポリシー）
+- compact:    過去の出力の重複削除・月ごとのParquetアーカイブ・保持期間
+- google_api: Google API（Drive・Sheets）のOAuth認証
+- drive:      Google Driveのフォルダ作成・ファイルアップロード
+- env:        .envファイルの読み込み
+- cli:        seo-etl コマンド（各スクリプトをサブコマンドとして実行）
+
+各モジュールは必要になった時点で読み込むため、このパッケージ自体の import は軽量です。
+"""
@@ -0,0 +1,357 @@
+"""
+出力ファイル（成果物）のカタログ
+
+各ステージが出力したファイルを、種類・パラメータ・入力ファイル（リネージ）・行数・
+ハッシュとともにローカルのSQLiteに記録します。「種類Xでパラメータが Y の最新の出力」は
+インデックスを引くだけで求まるため、増え続けるディレクトリをglobして名前順に並べる必要が
+なく、同じ秒に作られたファイルがあっても記録順で判定できます。
+
+記録のたびに同じ種類・ディレクトリ・パラメータの古い出力を保持ポリシーに従って削除します
+（新しい RETENTION_KEEP 件と RETENTION_DAYS 日以内のものは残し、保持している出力の入力に
+なっているものも残します）。
+
+保存形式（data/cache/artifact_catalog.sqlite）:
+    artifacts: id, kind, directory, path, params（JSON）, params_key, rows, bytes, sha256,
+               run_id, created_at
+    lineage:   artifact_id → 入力ファイルのpath（カタログにある場合はinput_id）
+
+使い方:
+    ./seo-etl catalog                      # 種類ごとの最新の出力
+    ./seo-etl catalog --kind weekly_analysis --limit 20
+    ./seo-etl catalog --lineage data/analysis/weekly_analysis_20250101_000000.csv
+    ./seo-etl catalog --scan               # カタログ導入前のファイルを登録
+    ./seo-etl catalog --prune              # 保持ポリシーを全体に適用
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import contextlib
+from datetime import datetime
+
+CATALOG_FILE = './data/cache/artifact_catalog.sqlite'
+CATALOG_ENV = 'SEO_ETL_CATALOG'
+
+# 保持ポリシー（種類・ディレクトリ・パラメータごと）
+RETENTION_KEEP = 12     # 新しい順にこの件数は必ず残す（週次で約3ヶ月分）
+RETENTION_DAYS = 90     # この日数以内に作られたものは残す
+
+HASH_CHUNK_BYTES = 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    directory TEXT NOT NULL,
+    path TEXT NOT NULL UNIQUE,
+    params TEXT NOT NULL,
+    params_key TEXT NOT NULL,
+    rows INTEGER,
+    bytes INTEGER,
+    sha256 TEXT,
+    run_id TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS artifacts_latest
+    ON artifacts (kind, directory, params_key, created_at, id);
+CREATE INDEX IF NOT EXISTS artifacts_kind_latest
+    ON artifacts (kind, directory, created_at, id);
+CREATE TABLE IF NOT EXISTS lineage (
+    artifact_id INTEGER NOT NULL REFERENCES artifacts (id) ON DELETE CASCADE,
+    input_path TEXT NOT NULL,
+    input_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS lineage_artifact ON lineage (artifact_id);
+CREATE INDEX IF NOT EXISTS lineage_input ON lineage (input_id);
+"""
+
+
+def get_catalog_file():
+    """カタログの保存先（環境変数 SEO_ETL_CATALOG で変更可）"""
+    return os.environ.get(CATALOG_ENV, CATALOG_FILE)
+
+
+@contextlib.contextmanager
+def connect(catalog_file=None):
+    """カタログに接続（なければ作成）。ブロックを抜けるとコミットして閉じる"""
+    catalog_file = catalog_file or get_catalog_file()
+    os.makedirs(os.path.dirname(catalog_file) or '.', exist_ok=True)
+
+    # 別のスクリプトが同時に書き込んでいる場合は待つ
+    conn = sqlite3.connect(catalog_file, timeout=30)
+    try:
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA foreign_keys=ON')
+        conn.executescript(_SCHEMA)
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def normalize_path(path):
+    """カタログに記録するパス（作業ディレクトリからの相対パス）"""
+    return os.path.relpath(os.path.abspath(path))
+
+
+def params_key(params):
+    """パラメータの比較用キー（キーの順序によらない）"""
+    return json.dumps(params or {}, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def file_sha256(path):
+    """ファイルのSHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def record(path, kind, params=None, inputs=(), rows=None, created_at=None, prune=True, catalog_file=None):
+    """
+    出力ファイルをカタログに記録（同じパスが記録済みの場合は置き換え）
+
+    Args:
+        path: 出力ファイル
+        kind: 種類（'weekly_analysis' など）
+        params: 出力を作ったパラメータ（JSONにできるdict）
+        inputs: 入力ファイルのパス（リネージ）
+        rows: 行数（わからない場合はNone）
+        created_at: 作成時刻（UNIX時間。Noneの場合は現在時刻。過去のファイルを登録する場合に指定）
+        prune: Trueの場合、同じ種類・ディレクトリ・パラメータの古い出力を保持ポリシーに従って削除
+
+    Returns:
+        記録したartifactのid
+    """
+    from stage_metrics import get_run_id
+
+    path = normalize_path(path)
+    directory = os.path.dirname(path) or '.'
+    key = params_key(params)
+    created_at = time.time() if created_at is None else created_at
+    values = (kind, directory, key, key, rows, os.path.getsize(path), file_sha256(path), get_run_id(), created_at)
+
+    with connect(catalog_file) as conn:
+        # 記録済みのパスは同じidのまま置き換え（このファイルを入力として参照するリネージを保つ）
+        existing = conn.execute('SELECT id FROM artifacts WHERE path = ?', (path,)).fetchone()
+        if existing:
+            artifact_id = existing['id']
+            conn.execute(
+                'UPDATE artifacts SET kind = ?, directory = ?, params = ?, params_key = ?, rows = ?, bytes = ?,'
+                ' sha256 = ?, run_id = ?, created_at = ? WHERE id = ?',
+                values + (artifact_id,)
+            )
+            conn.execute('DELETE FROM lineage WHERE artifact_id = ?', (artifact_id,))
+        else:
+            artifact_id = conn.execute(
+                'INSERT INTO artifacts (kind, directory, params, params_key, rows, bytes, sha256, run_id, created_at, path)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                values + (path,)
+            ).lastrowid
+
+        for input_path in inputs:
+            input_path = normalize_path(input_path)
+            found = conn.execute('SELECT id FROM artifacts WHERE path = ?', (input_path,)).fetchone()
+            conn.execute('INSERT INTO lineage (artifact_id, input_path, input_id) VALUES (?, ?, ?)',
+                         (artifact_id, input_path, found['id'] if found else None))
+
+        if prune:
+            prune_group(conn, kind, directory, key)
+
+    return artifact_id
+
+
+def _select(conn, kind, directory=None, params=None, limit=None):
+    """種類（・ディレクトリ・パラメータ）に一致する出力（新しい順）"""
+    query = 'SELECT * FROM artifacts WHERE kind = ?'
+    args = [kind]
+    if directory is not None:
+        query += ' AND directory = ?'
+        args.append(normalize_path(directory))
+    if params is not None:
+        query += ' AND params_key = ?'
+        args.append(params_key(params))
+    query += ' ORDER BY created_at DESC, id DESC'
+    if limit is not None:
+        query += ' LIMIT ?'
+        args.append(limit)
+    return conn.execute(query, args).fetchall()
+
+
+def recent(kind, count, directory=None, params=None, catalog_file=None):
+    """
+    種類（・ディレクトリ・パラメータ）に一致する新しいcount件の出力のパス（古い順）
+
+    手動で削除されたファイルはカタログからも削除し、その分を次に新しいもので補います。
+    """
+    with connect(catalog_file) as conn:
+        while True:
+            found = _select(conn, kind, directory, params, limit=count)
+            missing = [row['id'] for row in found if not os.path.exists(row['path'])]
+            if not missing:
+                return [row['path'] for row in reversed(found)]
+            conn.executemany('DELETE FROM artifacts WHERE id = ?', [(artifact_id,) for artifact_id in missing])
+
+
+def latest(kind, directory=None, params=None, catalog_file=None):
+    """種類（・ディレクトリ・パラメータ）に一致する最新の出力のパス（ない場合はNone）"""
+    found = recent(kind, 1, directory, params, catalog_file)
+    return found[0] if found else None
+
+
+def lineage(path, catalog_file=None):
+    """出力ファイルの記録と入力ファイルの一覧（記録がない場合はNone）"""
+    with connect(catalog_file) as conn:
+        artifact = conn.execute('SELECT * FROM artifacts WHERE path = ?', (normalize_path(path),)).fetchone()
+        if artifact is None:
+            return None
+        inputs = conn.execute('SELECT input_path, input_id FROM lineage WHERE artifact_id = ?',
+                              (artifact['id'],)).fetchall()
+        return dict(artifact), [dict(row) for row in inputs]
+
+
+def prune_group(conn, kind, directory, key, keep=RETENTION_KEEP, max_age_days=RETENTION_DAYS, dry_run=False):
+    """
+    同じ種類・ディレクトリ・パラメータの出力のうち、保持ポリシーの外にあるものを削除
+
+    新しい keep 件、max_age_days 日以内のもの、保持している出力の入力になっているものは残します。
+
+    Returns:
+        削除した（dry_runの場合は削除する）ファイルのパス
+    """
+    cutoff = time.time() - max_age_days * 86400
+    candidates = conn.execute(
+        'SELECT id, path, created_at FROM artifacts WHERE kind = ? AND directory = ? AND params_key = ?'
+        ' ORDER BY created_at DESC, id DESC LIMIT -1 OFFSET ?',
+        (kind, directory, key, keep)
+    ).fetchall()
+
+    removed = []
+    for row in candidates:
+        if row['created_at'] >= cutoff:
+            continue
+        in_use = conn.execute('SELECT 1 FROM lineage WHERE input_id = ? LIMIT 1', (row['id'],)).fetchone()
+        if in_use:
+            continue
+        removed.append(row['path'])
+        if dry_run:
+            continue
+        conn.execute('DELETE FROM artifacts WHERE id = ?', (row['id'],))
+        if os.path.exists(row['path']):
+            os.remove(row['path'])
+    return removed
+
+
+def prune(keep=RETENTION_KEEP, max_age_days=RETENTION_DAYS, dry_run=False, exclude_kinds=(), catalog_file=None):
+    """
+    すべての種類・ディレクトリ・パラメータに保持ポリシーを適用（削除したファイルのパスを返す）
+
+    exclude_kinds の種類（入力データなど）は削除しません。
+    """
+    removed = []
+    with connect(catalog_file) as conn:
+        groups = conn.execute('SELECT DISTINCT kind, directory, params_key FROM artifacts').fetchall()
+        for group in groups:
+            if group['kind'] in exclude_kinds:
+                continue
+            removed.extend(prune_group(conn, group['kind'], group['directory'], group['params_key'],
+                                       keep=keep, max_age_days=max_age_days, dry_run=dry_run))
+    return removed
+
+
+def scan(patterns, catalog_file=None):
+    """
+    カタログにないファイルを登録（カタログ導入前の出力・Driveからダウンロードしたファイルなど）
+
+    作成時刻はファイルの更新時刻を使い、削除は行いません。
+
+    Args:
+        patterns: {種類: (ディレクトリ, ファイル名のパターン)}
+
+    Returns:
+        登録したファイルの件数
+    """
+    import glob
+
+    with connect(catalog_file) as conn:
+        known = {row['path'] for row in conn.execute('SELECT path FROM artifacts')}
+
+    added = 0
+    for kind, (directory, pattern) in patterns.items():
+        for path in sorted(glob.glob(os.path.join(directory, pattern))):
+            if normalize_path(path) in known:
+                continue
+            record(path, kind, created_at=os.path.getmtime(path), prune=False, catalog_file=catalog_file)
+            known.add(normalize_path(path))
+            added += 1
+    return added
+
+
+def summarize(kind=None, limit=None, catalog_file=None):
+    """種類ごとの件数・合計サイズ・最新の出力（kindを指定した場合はその種類の出力の一覧）"""
+    with connect(catalog_file) as conn:
+        if kind:
+            return [dict(row) for row in _select(conn, kind, limit=limit)]
+        return [dict(row) for row in conn.execute(
+            'SELECT kind, directory, COUNT(*) AS count, SUM(bytes) AS bytes, MAX(created_at) AS created_at,'
+            ' (SELECT path FROM artifacts AS latest WHERE latest.kind = a.kind AND latest.directory = a.directory'
+            '  ORDER BY created_at DESC, id DESC LIMIT 1) AS path'
+            ' FROM artifacts AS a GROUP BY kind, directory ORDER BY kind, directory'
+        )]
+
+
+def _format_time(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+
+
+if __name__ == '__main__':
+    from seo_etl import files
+
+    parser = argparse.ArgumentParser(description='出力ファイル（成果物）のカタログ')
+    parser.add_argument('--kind', type=str, help='指定した種類の出力を新しい順に表示')
+    parser.add_argument('--limit', type=int, default=20, help='--kind で表示する件数')
+    parser.add_argument('--lineage', type=str, metavar='PATH', help='出力ファイルの記録と入力ファイルを表示')
+    parser.add_argument('--scan', action='store_true', help='カタログにない既存の出力ファイルを登録')
+    parser.add_argument('--prune', action='store_true', help='保持ポリシーを全体に適用して古い出力を削除')
+    parser.add_argument('--keep', type=int, default=RETENTION_KEEP, help=f'--prune で残す件数（デフォルト: {RETENTION_KEEP}）')
+    parser.add_argument('--days', type=int, default=RETENTION_DAYS, help=f'--prune で残す日数（デフォルト: {RETENTION_DAYS}）')
+    parser.add_argument('--dry-run', action='store_true', help='--prune で削除するファイルを表示するだけにする')
+    args = parser.parse_args()
+
+    if args.scan:
+        added = scan(files.ARTIFACTS)
+        print(f"✓ {added}件のファイルをカタログに登録しました")
+
+    if args.prune:
+        removed = prune(keep=args.keep, max_age_days=args.days, dry_run=args.dry_run,
+                        exclude_kinds=files.INPUT_KINDS)
+        for path in removed:
+            print(f"  {'削除対象' if args.dry_run else '削除'}: {path}")
+        print(f"✓ {len(removed)}件の出力が保持ポリシーの対象外です" if args.dry_run
+              else f"✓ {len(removed)}件の古い出力を削除しました")
+
+    if args.lineage:
+        found = lineage(args.lineage)
+        if found is None:
+            print(f"カタログに記録がありません: {args.lineage}")
+            exit(1)
+        artifact, inputs = found
+        for key in ('kind', 'path', 'params', 'rows', 'bytes', 'sha256', 'run_id'):
+            print(f"  {key:<8} {artifact[key]}")
+        print(f"  {'created':<8} {_format_time(artifact['created_at'])}")
+        print("  入力:")
+        for row in inputs:
+            print(f"    - {row['input_path']}{'' if row['input_id'] else '（カタログ外）'}")
+    elif args.kind:
+        for row in summarize(args.kind, limit=args.limit):
+            rows = '-' if row['rows'] is None else f"{row['rows']:,}"
+            print(f"  {_format_time(row['created_at'])}  {rows:>10}行  {row['path']}  {row['params']}")
+    elif not (args.scan or args.prune):
+        print(f"カタログ: {get_catalog_file()}\n")
+        print(f"  {'種類':<28} {'件数':>6} {'合計(MB)':>10}  最新")
+        for row in summarize():
+            print(f"  {row['kind']:<28} {row['count']:>6} {(row['bytes'] or 0) / 1024 / 1024:>10.1f}  {row['path']}")
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+SEO ETL Pipeline のコマンドラインツール（各スクリプトをサブコマンドとして実行）
+
+サブコマンドの一覧表示と振り分けは標準ライブラリだけで行い、実行するスクリプトだけを
+読み込みます。各スクリプトは重いライブラリを遅延インポートしているため（lazy_imports.py）、
+--help などは pandas・Google API・Anthropic SDK を読み込まずに応答します。
+
+使い方:
+    ./seo-etl                                # サブコマンドの一覧
+    ./seo-etl merge                          # python scripts/merge_data.py と同じ
+    ./seo-etl export-dify --shard-by category
+    ./seo-etl --startup-times                # 各サブコマンドの起動時間（モジュールの読み込み時間）を計測
+"""
+import os
+import sys
+import runpy
+import statistics
+import subprocess
+import time
+
+# 各スクリプトの置き場所（このパッケージの親ディレクトリ）
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# サブコマンド → (モジュール, 説明)
+COMMANDS = {
+    'download': ('download_from_drive_oauth', 'Google Driveから生データをダウンロード'),
+    'merge': ('merge_data', 'CSVファイルをマージ'),
+    'analyze-seo': ('analyze_trends', 'SEOランク分析を実行'),
+    'query-search-console': ('query_search_console', 'BigQueryからSearch Consoleの週次データを取得'),
+    'download-search-console': ('download_search_console_history', 'Search Consoleの過去データをGoogle Driveからダウンロード'),
+    'analyze-search-console-trends': ('analyze_search_console_trends', 'Search Console順位推移傾向を分析'),
+    'analyze-index-drop': ('analyze_index_drop', 'インデックス落ちr_hashを分析'),
+    'index-timeline': ('index_timeline', 'r_hash別インデックス推移を集計'),
+    'trend-state': ('trend_state', 'キーワード×URL別の推移の特徴量を増分更新'),
+    'rollups': ('rank_rollups', '順位データの週次・月次ロールアップと月次変化を作成'),
+    'generate-insights': ('generate_insights', 'Claudeで考察を生成（要API Key）'),
+    'export-dify': ('export_for_dify', 'Dify用データをエクスポート'),
+    'upload': ('upload_to_drive_oauth', '分析結果をGoogle Driveにアップロード'),
+    'setup-folders': ('setup_drive_folders', 'Google Driveフォルダを作成'),
+    'upload-raw-data': ('upload_raw_data', 'ローカルの生データをGoogle Driveにアップロード'),
+    'upload-dify': ('upload_to_dify_api', 'Dify APIにアップロード（要.env設定）'),
+    'category-mapping': ('fetch_category_mapping', 'カテゴリマッピングをスプレッドシートから取得'),
+    'category-master': ('load_category_master', 'カテゴリマスタをBigQueryから取得'),
+    'benchmark': ('benchmark', '合成データで各ステージの処理時間・メモリを計測'),
+    'selftest': ('selftest', '外部サービスをスタブにしたオフラインの動作確認'),
+    'run-log': ('stage_metrics', '直近の実行のステージ別処理時間・メモリを表示'),
+    'profile-report': ('profiling', '保存したプロファイルの上位の関数を表示'),
+    'dashboard': ('generate_dashboard', 'パフォーマンスダッシュボードを生成'),
+    'catalog': ('seo_etl.catalog', '出力ファイルのカタログを表示・保持ポリシーを適用'),
+    'compact': ('seo_etl.compact', '過去の出力を重複削除・アーカイブ（Parquet）にまとめる'),
+    'diagram': ('generate_diagram', 'パイプライン図を生成'),
+    'upload-slides': ('upload_slides_to_drive', 'プレゼン資料をGoogle Slidesにアップロード'),
+}
+
+# 起動時間の計測回数（中央値を表示）
+STARTUP_REPEAT = 5
+
+
+def print_usage():
+    """サブコマンドの一覧を表示"""
+    print("使い方: seo-etl <コマンド> [引数...]")
+    print("       seo-etl --startup-times [コマンド...]   # 起動時間を計測")
+    print()
+    print("コマンド:")
+    width = max(len(name) for name in COMMANDS)
+    for name, (module, description) in COMMANDS.items():
+        print(f"  {name:<{width}}  {description}（scripts/{module.replace('.', '/')}.py）")
+
+
+def run_command(name, args):
+    """サブコマンドのスクリプトを __main__ として実行"""
+    module, _ = COMMANDS[name]
+    if SCRIPTS_DIR not in sys.path:
+        sys.path.insert(0, SCRIPTS_DIR)
+
+    sys.argv = [os.path.join(SCRIPTS_DIR, *module.split('.')) + '.py'] + list(args)
+    runpy.run_module(module, run_name='__main__', alter_sys=True)
+
+
+def _measure(code, repeat):
+    """新しいPythonプロセスでcodeを実行した時間の中央値（ミリ秒）"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [SCRIPTS_DIR, os.environ.get('PYTHONPATH')])))
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True)
+        timings.append((time.perf_counter() - start) * 1000)
+        if result.returncode != 0:
+            error = result.stderr.strip().splitlines()
+            return None, error[-1] if error else f'終了コード {result.returncode}'
+    return statistics.median(timings), None
+
+
+def measure_startup_times(names=None, repeat=STARTUP_REPEAT):
+    """
+    各サブコマンドの起動時間（新しいプロセスでモジュールを読み込むまでの時間）を計測
+
+    Pythonの起動時間を差し引いた値が、そのスクリプトの読み込みにかかる時間です。
+
+    Returns:
+        {コマンド名: 起動時間（ミリ秒、読み込みに失敗した場合はNone）}
+    """
+    names = names or list(COMMANDS)
+    baseline, _ = _measure('pass', repeat)
+    print(f"起動時間（{repeat}回の中央値、Python自体の起動 {baseline:.0f}ms を含む）\n")
+    print(f"  {'コマンド':<32} {'起動(ms)':>9} {'読み込み(ms)':>12}")
+
+    results = {}
+    for name in names:
+        module, _ = COMMANDS[name]
+        elapsed, error = _measure(f'import {module}', repeat)
+        results[name] = elapsed
+        if elapsed is None:
+            print(f"  {name:<32} {'-':>9} {'-':>12}  ✗ {error}")
+        else:
+            print(f"  {name:<32} {elapsed:>9.0f} {elapsed - baseline:>12.0f}")
+
+    return results
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+
+    if not argv or argv[0] in ('-h', '--help', 'help'):
+        print_usage()
+        return 0
+
+    if argv[0] == '--startup-times':
+        unknown = [name for name in argv[1:] if name not in COMMANDS]
+        if unknown:
+            print(f"エラー: 不明なコマンド: {', '.join(unknown)}")
+            return 2
+        measure_startup_times(argv[1:])
+        return 0
+
+    name, args = argv[0], argv[1:]
+    if name not in COMMANDS:
+        print(f"エラー: 不明なコマンド: {name}\n")
+        print_usage()
+        return 2
+
+    run_command(name, args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
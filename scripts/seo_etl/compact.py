@@ -0,0 +1,446 @@
+"""
+過去の出力ファイルのコンパクション（重複の削除・列指向アーカイブへの集約・保持期間）
+
+週次で実行するたびに data/analysis・data/search_console などにタイムスタンプ付きの
+ファイルが増え続けるため、出力カタログ（catalog.py）をもとに次の処理を行います。
+
+1. 重複の削除: 同じ種類・ディレクトリ・パラメータで内容（sha256）が同じ出力は最新の1件だけ残す
+2. アーカイブ: ARCHIVED_KINDS（分析結果などの派生した出力）の新しい HOT_KEEP 件より古い出力を、種類・月ごとのParquetファイル
+   （data/archive/<種類>/month=YYYY-MM/part.parquet）にまとめて元のファイルを削除
+   - CSVは行をそのまま、テキスト（レポート・考察）は1ファイル1行（content列）で保存
+   - どの出力から来た行かは _source・_created_at・_params 列でわかる
+   - 内容がアーカイブ済みの出力と同じ場合は行を追加しない
+3. PRUNED_KINDS（マージ済みデータ・ロールアップ。全期間を含むためアーカイブしない）は新しい HOT_KEEP 件だけ残す
+4. ARCHIVE_MONTHS ヶ月より古いアーカイブの月を削除
+
+Search Consoleの週次データなどの入力データ（files.INPUT_KINDS）は対象外です。また、カタログに
+残っている出力の入力になっている出力（リネージで参照されているもの）はアーカイブ・削除しません。
+
+これにより、出力ディレクトリのファイル数は種類・パラメータごとに HOT_KEEP 件程度、
+アーカイブは月数 × 種類のファイル数で頭打ちになります。アーカイブした出力の一覧は
+カタログの archived テーブルに残ります。
+
+使い方:
+    ./seo-etl compact                  # コンパクションを実行
+    ./seo-etl compact --dry-run        # 対象の確認のみ
+    ./seo-etl compact --keep 8 --months 36
+    ./seo-etl compact --list           # アーカイブの一覧
+
+アーカイブの読み込み:
+    from seo_etl import compact
+    df = compact.read_archive('weekly_analysis', since='2025-01')
+"""
+from __future__ import annotations
+
+import os
+import time
+import shutil
+import argparse
+from collections import defaultdict
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+from lazy_imports import lazy_import
+from seo_etl import catalog, files
+from stage_metrics import instrumented, stage
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# pyarrowはオプション（ない場合はアーカイブせず、重複の削除とマージ済みデータの整理だけを行う）
+pa = lazy_import('pyarrow', optional=True)
+
+ARCHIVE_DIR = './data/archive'
+ARCHIVE_FILE = 'part.parquet'
+HOT_KEEP = 4            # 出力ディレクトリに残す新しい出力の件数（種類・パラメータごと）
+ARCHIVE_MONTHS = 24     # アーカイブを残す月数
+
+# アーカイブする種類（各ステージが作る派生した出力）
+ARCHIVED_KINDS = frozenset({
+    files.WEEKLY_ANALYSIS,
+    files.INSIGHTS_REPORT,
+    files.SEARCH_CONSOLE_TRENDS,
+    files.SEARCH_CONSOLE_TRENDS_REPORT,
+    files.INDEX_DROPS,
+    files.INDEX_DROPS_SUMMARY,
+    files.INDEX_DROPS_FINAL,
+    files.SITE_ANALYSIS,
+    files.SITE_ANALYSIS_REPORT,
+    files.CLAUDE_INSIGHTS,
+    files.TREND_FEATURES,
+    files.PERIOD_CHANGES,
+    *(kind for kind in files.ARTIFACTS if kind.startswith('index_timeline_')),
+})
+
+# アーカイブせずに古いものを削除するだけの種類（マージ済みデータとロールアップは毎回全期間を含むため）
+PRUNED_KINDS = frozenset({files.MERGED_DATA, files.MERGED_ARROW, files.RANK_ROLLUP_WEEK, files.RANK_ROLLUP_MONTH})
+
+# コンパクションの対象（これ以外の種類、特に入力データ files.INPUT_KINDS には触れない）
+COMPACTED_KINDS = ARCHIVED_KINDS | PRUNED_KINDS
+
+# アーカイブの行の由来を示す列
+SOURCE_COLUMNS = ['_source', '_created_at', '_params']
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS archived (
+    source_path TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    rows INTEGER,
+    bytes INTEGER,
+    sha256 TEXT,
+    run_id TEXT,
+    created_at REAL NOT NULL,
+    partition TEXT NOT NULL,
+    archived_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS archived_sha256 ON archived (kind, sha256);
+CREATE INDEX IF NOT EXISTS archived_partition ON archived (partition);
+"""
+
+
+def is_tabular(kind):
+    """CSVの出力かどうか（それ以外はテキストとして1ファイル1行で保存）"""
+    return files.ARTIFACTS[kind][1].endswith('.csv')
+
+
+def partition_for(kind, created_at, archive_dir=ARCHIVE_DIR):
+    """出力をまとめるアーカイブのファイル（作成時刻の月ごと）"""
+    month = datetime.fromtimestamp(created_at).strftime('%Y-%m')
+    return os.path.join(archive_dir, kind, f'month={month}', ARCHIVE_FILE)
+
+
+def _remove_file(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _delete_artifact(conn, row, replacement=None):
+    """出力をカタログとディスクから削除（入力として参照しているリネージは replacement に付け替え）"""
+    if replacement is None:
+        conn.execute('UPDATE lineage SET input_id = NULL WHERE input_id = ?', (row['id'],))
+    else:
+        conn.execute('UPDATE lineage SET input_id = ?, input_path = ? WHERE input_id = ?',
+                     (replacement['id'], replacement['path'], row['id']))
+    conn.execute('DELETE FROM artifacts WHERE id = ?', (row['id'],))
+    _remove_file(row['path'])
+
+
+def dedupe(conn, dry_run=False):
+    """
+    同じ種類・ディレクトリ・パラメータで内容が同じ出力を最新の1件にまとめる（COMPACTED_KINDS のみ）
+
+    Returns:
+        削除した（dry_runの場合は削除する）ファイルのパス
+    """
+    rows = conn.execute(
+        'SELECT * FROM artifacts WHERE sha256 IS NOT NULL'
+        ' ORDER BY kind, directory, params_key, sha256, created_at DESC, id DESC'
+    ).fetchall()
+
+    removed = []
+    kept = None
+    for row in rows:
+        if row['kind'] not in COMPACTED_KINDS:
+            continue
+        group = (row['kind'], row['directory'], row['params_key'], row['sha256'])
+        if kept is None or group != (kept['kind'], kept['directory'], kept['params_key'], kept['sha256']):
+            kept = row
+            continue
+        removed.append(row['path'])
+        if not dry_run:
+            _delete_artifact(conn, row, replacement=kept)
+    return removed
+
+
+def _archive_candidates(conn, keep, exclude=()):
+    """
+    アーカイブする出力（ARCHIVED_KINDS の種類・ディレクトリ・パラメータごとに新しい keep 件より古いもの）
+
+    exclude のパス（dry_runで重複として削除される予定の出力）は件数に数えません。
+    ほかの出力の入力になっているもの（catalog.prune_group と同じく lineage.input_id で参照されているもの）は残します。
+    """
+    candidates = []
+    groups = conn.execute('SELECT DISTINCT kind, directory, params_key FROM artifacts').fetchall()
+    for group in groups:
+        if group['kind'] not in ARCHIVED_KINDS:
+            continue
+        rows = conn.execute(
+            'SELECT * FROM artifacts WHERE kind = ? AND directory = ? AND params_key = ?'
+            ' ORDER BY created_at DESC, id DESC',
+            (group['kind'], group['directory'], group['params_key'])
+        ).fetchall()
+        for row in [row for row in rows if row['path'] not in exclude][keep:]:
+            in_use = conn.execute('SELECT 1 FROM lineage WHERE input_id = ? LIMIT 1', (row['id'],)).fetchone()
+            if in_use is None:
+                candidates.append(row)
+    return candidates
+
+
+def _read_output(kind, row):
+    """出力ファイルを、由来の列を付けたArrowのテーブルとして読み込み"""
+    import pyarrow.csv as pa_csv
+
+    if is_tabular(kind):
+        try:
+            table = pa_csv.read_csv(row['path'])
+        except pa.ArrowInvalid:
+            # 空のファイルなど（由来の記録だけを残す）
+            table = pa.table({})
+    else:
+        with open(row['path'], encoding='utf-8', errors='replace') as f:
+            table = pa.table({'content': [f.read()]})
+
+    source = pa.array([os.path.basename(row['path'])] * table.num_rows, pa.string())
+    created_at = pa.array([int(row['created_at'])] * table.num_rows, pa.timestamp('s'))
+    params = pa.array([row['params']] * table.num_rows, pa.string())
+    for position, (name, column) in enumerate(zip(SOURCE_COLUMNS, (source, created_at, params))):
+        table = table.add_column(position, name, column)
+    return table
+
+
+def _unify(tables):
+    """
+    列の異なるテーブルを連結（ない列はnull、型が食い違う列は数値ならfloat64、それ以外は文字列）
+    """
+    types = {}
+    for table in tables:
+        for field in table.schema:
+            types.setdefault(field.name, set()).add(field.type)
+
+    schema = []
+    for name, column_types in types.items():
+        column_types.discard(pa.null())
+        if not column_types:
+            column_type = pa.string()
+        elif len(column_types) == 1:
+            column_type = next(iter(column_types))
+        elif all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in column_types):
+            column_type = pa.float64()
+        else:
+            column_type = pa.string()
+        schema.append(pa.field(name, column_type))
+    schema = pa.schema(schema)
+
+    aligned = []
+    for table in tables:
+        columns = [
+            table.column(field.name).cast(field.type) if field.name in table.column_names
+            else pa.nulls(table.num_rows, field.type)
+            for field in schema
+        ]
+        aligned.append(pa.Table.from_arrays(columns, schema=schema))
+    return pa.concat_tables(aligned)
+
+
+def _append_partition(partition, tables):
+    """アーカイブの月のファイルに行を追加（同じ出力の行が既にあれば置き換え）"""
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    if os.path.exists(partition):
+        existing = pq.read_table(partition)
+        sources = pa.concat_arrays([table.column('_source').unique() for table in tables])
+        existing = existing.filter(pc.invert(pc.is_in(existing.column('_source'), value_set=sources)))
+        tables = [existing] + tables
+
+    os.makedirs(os.path.dirname(partition), exist_ok=True)
+    tmp_file = partition + '.tmp'
+    pq.write_table(_unify(tables), tmp_file, compression='zstd')
+    os.replace(tmp_file, partition)
+
+
+def archive_outputs(conn, keep=HOT_KEEP, archive_dir=ARCHIVE_DIR, dry_run=False, exclude=()):
+    """
+    新しい keep 件より古い出力を月ごとのアーカイブにまとめ、元のファイルを削除
+
+    Returns:
+        {アーカイブのファイル: まとめた出力のパス}
+    """
+    by_partition = defaultdict(list)
+    for row in _archive_candidates(conn, keep, exclude):
+        by_partition[partition_for(row['kind'], row['created_at'], archive_dir)].append(row)
+
+    archived = {}
+    for partition, rows in sorted(by_partition.items()):
+        archived[partition] = [row['path'] for row in rows]
+        if dry_run:
+            continue
+
+        tables = []
+        for row in rows:
+            # 内容がアーカイブ済みの出力と同じ場合は、記録だけを追加して行は追加しない
+            duplicate = conn.execute('SELECT partition FROM archived WHERE kind = ? AND sha256 = ? LIMIT 1',
+                                     (row['kind'], row['sha256'])).fetchone()
+            if duplicate is None and os.path.exists(row['path']):
+                tables.append(_read_output(row['kind'], row))
+        if tables:
+            _append_partition(partition, tables)
+
+        now = time.time()
+        for row in rows:
+            duplicate = conn.execute('SELECT partition FROM archived WHERE kind = ? AND sha256 = ? LIMIT 1',
+                                     (row['kind'], row['sha256'])).fetchone()
+            conn.execute(
+                'INSERT OR REPLACE INTO archived (source_path, kind, params, rows, bytes, sha256, run_id,'
+                ' created_at, partition, archived_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (row['path'], row['kind'], row['params'], row['rows'], row['bytes'], row['sha256'], row['run_id'],
+                 row['created_at'], duplicate['partition'] if duplicate else catalog.normalize_path(partition), now)
+            )
+            _delete_artifact(conn, row)
+    return archived
+
+
+def prune_merged(conn, keep=HOT_KEEP, dry_run=False):
+    """アーカイブしない種類（マージ済みデータ・ロールアップ）の新しい keep 件より古い出力を削除"""
+    removed = []
+    for kind in sorted(PRUNED_KINDS):
+        groups = conn.execute('SELECT DISTINCT directory, params_key FROM artifacts WHERE kind = ?',
+                              (kind,)).fetchall()
+        for group in groups:
+            removed.extend(catalog.prune_group(conn, kind, group['directory'], group['params_key'],
+                                               keep=keep, max_age_days=0, dry_run=dry_run))
+    return removed
+
+
+def _month_index(month):
+    year, month = month.split('-')
+    return int(year) * 12 + int(month) - 1
+
+
+def list_partitions(archive_dir=ARCHIVE_DIR):
+    """アーカイブの月のディレクトリの一覧 [(種類, 'YYYY-MM', ディレクトリ)]"""
+    partitions = []
+    if not os.path.isdir(archive_dir):
+        return partitions
+    for kind in sorted(os.listdir(archive_dir)):
+        kind_dir = os.path.join(archive_dir, kind)
+        if not os.path.isdir(kind_dir):
+            continue
+        for name in sorted(os.listdir(kind_dir)):
+            if name.startswith('month='):
+                partitions.append((kind, name[len('month='):], os.path.join(kind_dir, name)))
+    return partitions
+
+
+def expire_archives(conn, months=ARCHIVE_MONTHS, archive_dir=ARCHIVE_DIR, dry_run=False):
+    """
+    months ヶ月より古いアーカイブの月を削除
+
+    Returns:
+        削除した（dry_runの場合は削除する）ディレクトリ
+    """
+    now = datetime.now()
+    cutoff = now.year * 12 + now.month - 1 - months
+
+    expired = []
+    for _, month, directory in list_partitions(archive_dir):
+        if _month_index(month) >= cutoff:
+            continue
+        expired.append(directory)
+        if dry_run:
+            continue
+        partition = catalog.normalize_path(os.path.join(directory, ARCHIVE_FILE))
+        conn.execute('DELETE FROM archived WHERE partition = ?', (partition,))
+        shutil.rmtree(directory)
+    return expired
+
+
+@instrumented()
+def compact(keep=HOT_KEEP, months=ARCHIVE_MONTHS, archive_dir=ARCHIVE_DIR, dry_run=False, catalog_file=None):
+    """
+    重複の削除・アーカイブ・マージ済みデータの整理・古いアーカイブの削除をまとめて実行
+
+    Returns:
+        {'duplicates': [...], 'archived': {アーカイブ: [...]}, 'pruned': [...], 'expired': [...]}
+    """
+    with catalog.connect(catalog_file) as conn:
+        conn.executescript(_SCHEMA)
+
+        with stage('dedupe') as step:
+            duplicates = dedupe(conn, dry_run=dry_run)
+            step.rows_out = len(duplicates)
+
+        if pa is None:
+            print("警告: pyarrowがインストールされていないため、アーカイブは作成しません")
+            archived = {}
+        else:
+            with stage('archive') as step:
+                archived = archive_outputs(conn, keep=keep, archive_dir=archive_dir, dry_run=dry_run,
+                                           exclude=set(duplicates))
+                step.rows_in = sum(len(paths) for paths in archived.values())
+                if not dry_run:
+                    for partition in archived:
+                        step.wrote(partition)
+
+        with stage('prune_merged') as step:
+            pruned = prune_merged(conn, keep=keep, dry_run=dry_run)
+            step.rows_out = len(pruned)
+
+        with stage('expire') as step:
+            expired = expire_archives(conn, months=months, archive_dir=archive_dir, dry_run=dry_run)
+            step.rows_out = len(expired)
+
+    return {'duplicates': duplicates, 'archived': archived, 'pruned': pruned, 'expired': expired}
+
+
+def read_archive(kind: str, since: str | None = None, archive_dir: str = ARCHIVE_DIR) -> pd.DataFrame:
+    """
+    アーカイブした出力を読み込み
+
+    Args:
+        kind: 種類（'weekly_analysis' など）
+        since: この月（'YYYY-MM'）以降のアーカイブだけを読む（Noneの場合はすべて）
+
+    Returns:
+        アーカイブの行（_source・_created_at・_params 列で元の出力がわかる）。アーカイブがない場合は空のDataFrame
+    """
+    import pyarrow.parquet as pq
+
+    tables = [
+        pq.read_table(os.path.join(directory, ARCHIVE_FILE))
+        for archived_kind, month, directory in list_partitions(archive_dir)
+        if archived_kind == kind and (since is None or month >= since)
+        and os.path.exists(os.path.join(directory, ARCHIVE_FILE))
+    ]
+    if not tables:
+        import pandas as pd
+        return pd.DataFrame()
+    return _unify(tables).to_pandas()
+
+
+def _format_size(path):
+    return f"{os.path.getsize(path) / 1024:,.0f}KB" if os.path.exists(path) else '-'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='過去の出力ファイルのコンパクション（重複の削除・アーカイブ・保持期間）')
+    parser.add_argument('--keep', type=int, default=HOT_KEEP,
+                        help=f'出力ディレクトリに残す新しい出力の件数（デフォルト: {HOT_KEEP}）')
+    parser.add_argument('--months', type=int, default=ARCHIVE_MONTHS,
+                        help=f'アーカイブを残す月数（デフォルト: {ARCHIVE_MONTHS}）')
+    parser.add_argument('--archive-dir', type=str, default=ARCHIVE_DIR, help='アーカイブの保存先')
+    parser.add_argument('--dry-run', action='store_true', help='対象を表示するだけにする')
+    parser.add_argument('--list', action='store_true', help='アーカイブの一覧を表示')
+    args = parser.parse_args()
+
+    if args.list:
+        print(f"アーカイブ: {args.archive_dir}\n")
+        for kind, month, directory in list_partitions(args.archive_dir):
+            print(f"  {kind:<32} {month}  {_format_size(os.path.join(directory, ARCHIVE_FILE)):>10}")
+        exit(0)
+
+    result = compact(keep=args.keep, months=args.months, archive_dir=args.archive_dir, dry_run=args.dry_run)
+
+    action = '対象' if args.dry_run else '完了'
+    for path in result['duplicates']:
+        print(f"  重複: {path}")
+    for partition, paths in result['archived'].items():
+        print(f"  アーカイブ: {partition} ← {len(paths)}件")
+    for path in result['pruned']:
+        print(f"  削除: {path}")
+    for directory in result['expired']:
+        print(f"  期限切れ: {directory}")
+    print(f"✓ コンパクション{action}: 重複 {len(result['duplicates'])}件、"
+          f"アーカイブ {sum(len(paths) for paths in result['archived'].values())}件、"
+          f"マージ済みデータの削除 {len(result['pruned'])}件、期限切れのアーカイブ {len(result['expired'])}件")
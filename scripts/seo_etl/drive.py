@@ -0,0 +1,117 @@
+"""
+Google Driveのフォルダ作成・ファイルアップロード
+
+アップロード系のスクリプト（upload_to_drive_oauth.py・upload_raw_data.py・
+setup_drive_folders.py・upload_slides_to_drive.py）で共通の処理です。
+同じ名前のファイルがフォルダにあれば上書き更新し、なければ新規作成します。
+"""
+import os
+
+from stage_metrics import count_api_call
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+
+# 拡張子 → アップロード時のMIMEタイプ
+MIME_TYPES = {
+    '.csv': 'text/csv',
+    '.txt': 'text/plain',
+    '.md': 'text/markdown',
+    '.json': 'application/json',
+    '.pdf': 'application/pdf',
+    '.pptx': 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+}
+DEFAULT_MIME_TYPE = 'application/octet-stream'
+
+
+def guess_mime_type(file_path):
+    """ファイルの拡張子からMIMEタイプを判定"""
+    return MIME_TYPES.get(os.path.splitext(file_path)[1].lower(), DEFAULT_MIME_TYPE)
+
+
+def find_files(service, name, folder_id, mime_type=None, fields='files(id, name)'):
+    """フォルダ内の同じ名前のファイル（ゴミ箱を除く）を検索"""
+    query = f"name='{name}' and '{folder_id}' in parents and trashed=false"
+    if mime_type:
+        query += f" and mimeType='{mime_type}'"
+
+    count_api_call('drive')
+    results = service.files().list(q=query, fields=fields).execute()
+    return results.get('files', [])
+
+
+def create_folder(service, folder_name, parent_folder_id):
+    """Google Driveにフォルダを作成"""
+    file_metadata = {
+        'name': folder_name,
+        'mimeType': FOLDER_MIME_TYPE,
+        'parents': [parent_folder_id]
+    }
+
+    count_api_call('drive')
+    return service.files().create(
+        body=file_metadata,
+        fields='id, name, webViewLink'
+    ).execute()
+
+
+def find_or_create_folder(service, folder_name, parent_folder_id):
+    """
+    フォルダを検索、なければ作成
+
+    Returns:
+        (フォルダ, 新規作成したかどうか)
+    """
+    folders = find_files(service, folder_name, parent_folder_id, mime_type=FOLDER_MIME_TYPE,
+                         fields='files(id, name, webViewLink)')
+    if folders:
+        return folders[0], False
+
+    return create_folder(service, folder_name, parent_folder_id), True
+
+
+def upload_file(service, file_path, folder_id, mime_type=None, name=None, target_mime_type=None,
+                fields='id, name, webViewLink'):
+    """
+    ファイルをGoogle Driveにアップロード（同じ名前のファイルがあれば更新）
+
+    Args:
+        service: Google Drive APIのクライアント
+        file_path: アップロードするファイル
+        folder_id: アップロード先のフォルダID
+        mime_type: アップロードするファイルのMIMEタイプ（Noneの場合は拡張子から判定）
+        name: Drive上のファイル名（Noneの場合はファイル名のまま）
+        target_mime_type: Drive上で変換する形式（Google Slidesなど。Noneの場合は変換しない）
+        fields: 返すファイルの項目
+
+    Returns:
+        (ファイル, 既存ファイルを更新したかどうか)
+    """
+    from googleapiclient.http import MediaFileUpload
+
+    name = name or os.path.basename(file_path)
+    existing_files = find_files(service, name, folder_id)
+    media = MediaFileUpload(file_path, mimetype=mime_type or guess_mime_type(file_path), resumable=True)
+
+    count_api_call('drive')
+    if existing_files:
+        # 既存ファイルの内容を更新（ファイルID・URLは維持される）
+        file = service.files().update(
+            fileId=existing_files[0]['id'],
+            media_body=media,
+            fields=fields
+        ).execute()
+        return file, True
+
+    file_metadata = {
+        'name': name,
+        'parents': [folder_id]
+    }
+    if target_mime_type:
+        file_metadata['mimeType'] = target_mime_type
+
+    file = service.files().create(
+        body=file_metadata,
+        media_body=media,
+        fields=fields
+    ).execute()
+    return file, False
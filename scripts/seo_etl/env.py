@@ -0,0 +1,31 @@
+"""
+.envファイルの読み込み
+
+generate_insights.py（ANTHROPIC_API_KEY）と upload_to_dify_api.py（DIFY_API_KEY など）で
+共通の簡易的な読み込みです。python-dotenv は使わず、`KEY=VALUE` の行だけを読みます。
+"""
+import os
+
+ENV_FILE = '.env'
+
+
+def load_env(env_file=ENV_FILE):
+    """
+    .envファイルの `KEY=VALUE` を環境変数に設定（空行・#から始まる行・=のない行は無視）
+
+    Returns:
+        読み込んだ {KEY: VALUE}（ファイルがない場合は空）
+    """
+    loaded = {}
+    if not os.path.exists(env_file):
+        return loaded
+
+    with open(env_file, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#') and '=' in line:
+                key, value = line.split('=', 1)
+                loaded[key] = value
+
+    os.environ.update(loaded)
+    return loaded
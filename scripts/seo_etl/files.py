@@ -0,0 +1,98 @@
+"""
+各ステージの出力ファイル（成果物）の記録と検索
+
+出力は `weekly_analysis_20250101_120000.csv` のようにファイル名にタイムスタンプが付いた
+ファイルで、作成時に出力カタログ（catalog.py、SQLite）へ種類・パラメータ・入力とともに
+記録します。「最新のファイル」「直近N件のファイル」はカタログから求め、カタログに記録が
+ない場合（カタログ導入前の出力・手動で置いたファイル）だけディレクトリをglobして
+名前順で判定します。
+"""
+import glob
+import os
+
+from seo_etl import catalog
+
+# 主な出力ファイルの置き場所
+PROCESSED_DIR = './data/processed'
+ANALYSIS_DIR = './data/analysis'
+SEARCH_CONSOLE_DIR = './data/search_console'
+INSIGHTS_DIR = './data/insights'
+
+# 出力の種類
+MERGED_DATA = 'merged_data'
+MERGED_ARROW = 'merged_arrow'
+WEEKLY_ANALYSIS = 'weekly_analysis'
+INSIGHTS_REPORT = 'insights_report'
+SEARCH_CONSOLE_WEEKLY = 'search_console_weekly'
+SEARCH_CONSOLE_TRENDS = 'search_console_trends'
+SEARCH_CONSOLE_TRENDS_REPORT = 'search_console_trends_report'
+INDEX_DROPS = 'index_drops'
+INDEX_DROPS_SUMMARY = 'index_drops_summary'
+INDEX_DROPS_FINAL = 'index_drops_final'
+SITE_ANALYSIS = 'site_analysis'
+SITE_ANALYSIS_REPORT = 'site_analysis_report'
+CLAUDE_INSIGHTS = 'claude_insights'
+TREND_FEATURES = 'trend_features'
+RANK_ROLLUP_WEEK = 'rank_rollup_week'
+RANK_ROLLUP_MONTH = 'rank_rollup_month'
+PERIOD_CHANGES = 'period_changes'
+
+# 外部から取得した入力データ（保持ポリシーで削除しない。分析が遡る週数分を残す必要がある）
+INPUT_KINDS = frozenset({SEARCH_CONSOLE_WEEKLY})
+
+# 種類 → (既定のディレクトリ, ファイル名のパターン)
+ARTIFACTS = {
+    MERGED_DATA: (PROCESSED_DIR, 'merged_data_*.csv'),
+    MERGED_ARROW: (PROCESSED_DIR, 'merged_data_*.arrow'),
+    WEEKLY_ANALYSIS: (ANALYSIS_DIR, 'weekly_analysis_*.csv'),
+    INSIGHTS_REPORT: (ANALYSIS_DIR, 'insights_report_*.txt'),
+    SEARCH_CONSOLE_WEEKLY: (SEARCH_CONSOLE_DIR, 'search_console_weekly_*.csv'),
+    SEARCH_CONSOLE_TRENDS: (ANALYSIS_DIR, 'search_console_trends_*.csv'),
+    SEARCH_CONSOLE_TRENDS_REPORT: (ANALYSIS_DIR, 'search_console_trends_*.txt'),
+    INDEX_DROPS: (ANALYSIS_DIR, 'index_drops_[0-9]*.csv'),
+    INDEX_DROPS_SUMMARY: (ANALYSIS_DIR, 'index_drops_summary_*.txt'),
+    INDEX_DROPS_FINAL: (ANALYSIS_DIR, 'index_drops_final_*.csv'),
+    SITE_ANALYSIS: (ANALYSIS_DIR, 'site_analysis_*.csv'),
+    SITE_ANALYSIS_REPORT: (ANALYSIS_DIR, 'site_analysis_*.txt'),
+    CLAUDE_INSIGHTS: (INSIGHTS_DIR, 'claude_insights_*.md'),
+    TREND_FEATURES: (ANALYSIS_DIR, 'trend_features_*.csv'),
+    RANK_ROLLUP_WEEK: (PROCESSED_DIR, 'rank_rollup_week_*.csv'),
+    RANK_ROLLUP_MONTH: (PROCESSED_DIR, 'rank_rollup_month_*.csv'),
+    PERIOD_CHANGES: (ANALYSIS_DIR, 'period_changes_*.csv'),
+}
+
+# index_timeline.py の集計レポート（index_timeline_summary など）
+for _report in ('summary', 'flapping', 'outages', 'survival'):
+    ARTIFACTS[f'index_timeline_{_report}'] = (ANALYSIS_DIR, f'index_timeline_{_report}_*.csv')
+
+
+def list_outputs(kind, directory=None):
+    """ディレクトリ内の種類kindのファイル（ファイル名の順 = 古い順）"""
+    default_dir, pattern = ARTIFACTS[kind]
+    return sorted(glob.glob(os.path.join(directory or default_dir, pattern)))
+
+
+def latest_outputs(kind, count, directory=None, params=None):
+    """種類kindの新しいcount件のファイル（古い順）"""
+    if count <= 0:
+        return []
+
+    directory = directory or ARTIFACTS[kind][0]
+    found = catalog.recent(kind, count, directory, params)
+    if len(found) == count or params is not None:
+        return found
+
+    # カタログにない古いファイルも含めて名前順で判定
+    return list_outputs(kind, directory)[-count:]
+
+
+def latest_output(kind, directory=None, params=None):
+    """種類kindの最新のファイル（ない場合はNone）"""
+    found = latest_outputs(kind, 1, directory, params)
+    return found[0] if found else None
+
+
+def record_output(path, kind, params=None, inputs=(), rows=None, created_at=None):
+    """出力ファイルをカタログに記録（入力データ以外は古い出力を保持ポリシーに従って削除）"""
+    return catalog.record(path, kind, params=params, inputs=inputs, rows=rows, created_at=created_at,
+                          prune=kind not in INPUT_KINDS)
@@ -0,0 +1,79 @@
+"""
+Google API（Drive・Sheets）のOAuth認証
+
+各スクリプトで同じ処理をしていた認証（token.pickle の読み込み → 期限切れなら更新 →
+なければ credentials.json でブラウザ認証 → 保存）をまとめたものです。
+google-auth などのライブラリは認証を行う時点で読み込みます。
+"""
+import os
+import pickle
+
+# 認証情報（Google Cloud ConsoleのOAuthクライアント）とトークンの保存先
+CREDENTIALS_FILE = 'credentials.json'
+TOKEN_FILE = 'token.pickle'
+
+
+def get_credentials(scopes, token_file=TOKEN_FILE, credentials_file=CREDENTIALS_FILE, require_scopes=False):
+    """
+    OAuthの認証情報を取得（保存済みのトークンを使い、必要な場合のみ再認証）
+
+    Args:
+        scopes: 必要なスコープのリスト
+        token_file: トークンの保存先
+        credentials_file: OAuthクライアントの認証情報ファイル
+        require_scopes: Trueの場合、保存済みのトークンにscopesが揃っていなければ再認証
+            （token.pickle は drive.readonly と drive.file のスクリプトで共有しているため既定はFalse）
+
+    Returns:
+        google.oauth2.credentials.Credentials
+    """
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    from google.auth.transport.requests import Request
+
+    creds = None
+
+    # 保存済みのトークンがあれば読み込む
+    if os.path.exists(token_file):
+        with open(token_file, 'rb') as token:
+            creds = pickle.load(token)
+
+    # スコープが足りない古いトークンは再認証
+    if require_scopes and creds and not creds.has_scopes(scopes):
+        creds = None
+
+    # 認証情報が無効または存在しない場合
+    if not creds or not creds.valid:
+        if creds and creds.expired and creds.refresh_token:
+            creds.refresh(Request())
+        else:
+            # OAuth認証フローを開始
+            flow = InstalledAppFlow.from_client_secrets_file(credentials_file, scopes)
+            creds = flow.run_local_server(port=0)
+
+        # 認証情報を保存
+        with open(token_file, 'wb') as token:
+            pickle.dump(creds, token)
+
+    return creds
+
+
+def build_service(api, version, scopes=None, token_file=TOKEN_FILE, credentials=None):
+    """
+    認証済みのAPIクライアントを作成
+
+    Args:
+        api: APIの名前（'drive'、'sheets' など）
+        version: APIのバージョン（'v3'、'v4' など）
+        scopes: 必要なスコープのリスト（credentialsを渡す場合は不要）
+        token_file: トークンの保存先
+        credentials: 取得済みの認証情報（同じトークンで複数のAPIを使う場合）
+    """
+    from googleapiclient.discovery import build
+
+    creds = credentials or get_credentials(scopes, token_file)
+    return build(api, version, credentials=creds)
+
+
+def drive_service(scopes, token_file=TOKEN_FILE):
+    """Google Drive APIのクライアント"""
+    return build_service('drive', 'v3', scopes, token_file)
@@ -0,0 +1,302 @@
+"""
+パイプラインの各ステージ（同じプロセスで組み合わせて実行できる関数）
+
+各スクリプトの `__main__` はここの関数を呼ぶだけの薄いラッパーです。
+ステージはDataFrameまたはファイルのパスを受け取り、結果のDataFrameまたは出力ファイルの
+パスを返すため、前のステージの結果をファイルを経由せずに次のステージへ渡したり、
+ステージ単体をベンチマーク・プロファイルしたりできます。
+
+使い方:
+    import sys; sys.path.insert(0, 'scripts')
+    from seo_etl import stages
+
+    merged = stages.merge()                      # data/raw → data/processed
+    outputs = stages.analyze_seo(merged)         # マージ済みデータをそのまま分析
+    stages.search_console_trends()
+    stages.export_dify(shard_by='category')
+
+実装は各スクリプトのモジュール（merge_data.py・analyze_trends.py など）にあり、
+使うステージのモジュールだけを読み込みます。
+"""
+from __future__ import annotations
+
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from seo_etl import files
+from stage_metrics import stage
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# 入出力の既定の場所
+RAW_DIR = './data/raw'
+SITE_RESULTS_FILE = './data/siteコロン結果（取得期間9.23〜10.9）.xlsx'
+INDEX_TIMELINE_FILE = './data/index_timeline/index_timeline.npz'
+
+# マージ時に残すカラム
+MERGE_COLUMNS = ['キーワード', 'URL', 'ランク', '距離', 'date']
+
+# 週次変化の対象週数（3ヶ月 = 12週）
+WEEKS = 12
+
+
+def merge(raw_dir: str = RAW_DIR, processed_dir: str = files.PROCESSED_DIR,
+          columns: list[str] | None = MERGE_COLUMNS) -> pd.DataFrame | None:
+    """
+    週次の順位エクスポートをマージし、data/processed に保存
+
+    Returns:
+        マージ済みデータ（入力ファイルがない場合はNone）
+    """
+    from merge_data import merge_weekly_data
+
+    return merge_weekly_data(raw_dir, processed_dir, columns)
+
+
+def latest_merged_file(processed_dir: str = files.PROCESSED_DIR) -> str:
+    """最新のマージ済みCSV（ない場合はFileNotFoundError）"""
+    merged_file = files.latest_output(files.MERGED_DATA, processed_dir)
+    if merged_file is None:
+        raise FileNotFoundError(
+            f"{processed_dir}にマージ済みファイルが見つかりません。先にmerge_data.pyを実行してください。"
+        )
+    return merged_file
+
+
+def load_merged(merged_file: str | None = None) -> pd.DataFrame:
+    """マージ済みデータを読み込み（省略時は最新のファイル。Arrowファイルがあればそちらを使用）"""
+    from merge_data import load_merged_data, arrow_path_for
+
+    merged_file = merged_file or latest_merged_file()
+    print(f"使用するファイル: {merged_file}")
+
+    with stage('load') as step:
+        df = load_merged_data(merged_file)
+        arrow_file = arrow_path_for(merged_file)
+        step.read(arrow_file if os.path.exists(arrow_file) else merged_file)
+        step.rows_out = len(df)
+    print(f"データ読み込み完了: {len(df)}行")
+    return df
+
+
+def weekly_analysis(rank_frame: pd.DataFrame, weeks: int = WEEKS, merged_file: str | None = None) -> pd.DataFrame:
+    """
+    キーワード×URLごとの週次変化を計算し、カテゴリを付与
+
+    同じ週に複数の日付のデータがある場合（日次のファイルなど）は、週次ロールアップ（平均）で
+    前週比を計算します。
+
+    Args:
+        rank_frame: マージ済みデータ（prepare_rank_frame済みでなければここで変換）
+        weeks: 対象の週数
+        merged_file: rank_frameの元のマージ済みファイル（週次ロールアップの再利用に使用）
+    """
+    from analyze_trends import prepare_rank_frame, calculate_weekly_changes
+    from category_index import attach_categories
+    import rank_rollups
+
+    rank_frame = prepare_rank_frame(rank_frame)
+
+    if rank_rollups.has_multiple_per_period(rank_frame, 'week'):
+        print("同じ週に複数の日付のデータがあるため、週次ロールアップ（平均）で前週比を計算します")
+        week_rollup = rank_rollups.build_rollups(rank_frame, periods=('week',), merged_file=merged_file)['week']
+        with stage('weekly_changes') as step:
+            analysis_df = rank_rollups.period_changes(week_rollup, periods=weeks)
+            step.rows_in, step.rows_out = len(week_rollup), len(analysis_df)
+    else:
+        with stage('weekly_changes') as step:
+            analysis_df = calculate_weekly_changes(rank_frame, weeks=weeks)
+            step.rows_in, step.rows_out = len(rank_frame), len(analysis_df)
+
+    # カテゴリ情報を分析結果に付与（category_mapping.csv由来のカテゴリインデックス）
+    with stage('attach_categories') as step:
+        analysis_df = attach_categories(analysis_df, keyword_col='keyword')
+        step.rows_in = step.rows_out = len(analysis_df)
+    print(f"分析結果にカテゴリ情報を付与: {analysis_df['カテゴリ'].notna().sum()}件マッチ")
+
+    return analysis_df
+
+
+def trend_features(rank_frame: pd.DataFrame, state_file: str | None = None,
+                   min_data_points: int = 5) -> pd.DataFrame:
+    """
+    キーワード×URL別の推移の特徴量（傾き・一貫性・直近の傾き・streak・EWMA）
+
+    state_file を指定した場合は、保存済みの状態を前回より新しい日付の行だけで更新して保存してから作成します。
+    Noneの場合は状態を読み書きせず、rank_frame の全期間からメモリ上で計算します。
+    """
+    import trend_state
+
+    with stage('trend_state') as step:
+        state = trend_state.refresh(rank_frame, state_file)
+        features = trend_state.trend_features(state, min_data_points=min_data_points)
+        step.rows_in, step.rows_out = len(rank_frame), len(features)
+    return features
+
+
+def _trend_state_file(merged_file):
+    """merged_file が data/processed の最新のマージ済みファイルなら推移の状態ファイル、それ以外はNone"""
+    import trend_state
+    from seo_etl import catalog
+
+    if merged_file is None:
+        return None
+    try:
+        latest = latest_merged_file()
+    except FileNotFoundError:
+        return None
+    if catalog.normalize_path(merged_file) != catalog.normalize_path(latest):
+        return None
+    return trend_state.STATE_FILE
+
+
+def rollups(merged: pd.DataFrame | str | None = None, output_dir: str = files.PROCESSED_DIR,
+            periods: tuple[str, ...] = ('week', 'month')) -> dict[str, pd.DataFrame]:
+    """
+    マージ済みデータの週次（ISO週）・月次ロールアップを作成して data/processed に保存
+
+    Returns:
+        {'week': 週次ロールアップ, 'month': 月次ロールアップ}（同じマージ済みファイルから作ったものがあれば再利用）
+    """
+    from rank_rollups import build_rollups
+
+    return build_rollups(merged, output_dir, periods)
+
+
+def analyze_seo(merged: pd.DataFrame | str | None = None, output_dir: str = files.ANALYSIS_DIR,
+                weeks: int = WEEKS) -> dict[str, str]:
+    """
+    SEOランク分析（週次変化・推移の示唆レポート）を実行して data/analysis に保存
+
+    Args:
+        merged: マージ済みデータのDataFrame、マージ済みCSVのパス、またはNone（最新のファイル）
+        output_dir: 出力ディレクトリ
+        weeks: 週次変化の対象週数
+
+    Returns:
+        {'analysis': weekly_analysis CSV, 'insights': insights_report TXT}
+    """
+    from analyze_trends import prepare_rank_frame, generate_insights
+
+    with stage('analyze_trends') as metrics:
+        # DataFrameを渡された場合は入力ファイル（リネージ）なし
+        if merged is None or isinstance(merged, str):
+            merged_file = merged or latest_merged_file()
+            df = load_merged(merged_file)
+        else:
+            merged_file, df = None, merged
+        metrics.rows_in = len(df)
+
+        # 型変換・ソート済みの分析用データを1回だけ作成し、以降の分析で共有
+        with stage('prepare') as step:
+            rank_frame = prepare_rank_frame(df)
+            step.rows_in, step.rows_out = len(df), len(rank_frame)
+        del df
+        print(f"分析対象: {len(rank_frame)}行（キーワード {len(rank_frame['keyword'].cat.categories)}件）")
+
+        analysis_df = weekly_analysis(rank_frame, weeks=weeks, merged_file=merged_file)
+
+        # 推移の特徴量は、最新のマージ済みファイルの場合だけ保存済みの状態を新しい週の行で更新
+        # （それ以外のファイル・DataFrameで保存済みの状態を進めないよう、メモリ上で計算）
+        trends_df = trend_features(rank_frame, state_file=_trend_state_file(merged_file))
+
+        # 分析結果を保存
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+
+        analysis_output = os.path.join(output_dir, f"weekly_analysis_{timestamp}.csv")
+        with stage('write') as step:
+            analysis_df.to_csv(analysis_output, index=False, encoding='utf-8-sig')
+            step.rows_out = len(analysis_df)
+            step.wrote(analysis_output)
+        files.record_output(analysis_output, files.WEEKLY_ANALYSIS, params={'weeks': weeks},
+                            inputs=[merged_file] if merged_file else (), rows=len(analysis_df))
+        print(f"分析結果を保存: {analysis_output}")
+
+        # 示唆レポートを生成（元データも渡して推移分析を行う）
+        insights_output = os.path.join(output_dir, f"insights_report_{timestamp}.txt")
+        with stage('insights') as step:
+            generate_insights(analysis_df, original_df=rank_frame, output_file=insights_output, trends_df=trends_df)
+            step.wrote(insights_output)
+        files.record_output(insights_output, files.INSIGHTS_REPORT, params={'weeks': weeks},
+                            inputs=[analysis_output])
+
+        metrics.rows_out = len(analysis_df)
+        metrics.wrote(analysis_output)
+        metrics.wrote(insights_output)
+
+    return {'analysis': analysis_output, 'insights': insights_output}
+
+
+def search_console_trends(input_dir: str = files.SEARCH_CONSOLE_DIR, output_dir: str = files.ANALYSIS_DIR,
+                          months: int = 3) -> str | None:
+    """
+    Search Consoleの週次データから順位推移の傾向を分析
+
+    Returns:
+        レポートファイル（週次データがない場合はNone）
+    """
+    from analyze_search_console_trends import analyze_search_console_trends
+
+    return analyze_search_console_trends(input_dir, output_dir, months)
+
+
+def index_drops(input_file: str = SITE_RESULTS_FILE, output_dir: str = files.ANALYSIS_DIR,
+                timeline_file: str | None = INDEX_TIMELINE_FILE) -> pd.DataFrame:
+    """
+    site:結果のワークブックからインデックス落ちしたr_hashを特定（タイムラインも更新）
+
+    Returns:
+        シート間のインデックス落ちの一覧
+    """
+    from analyze_index_drop import analyze_index_drops
+
+    return analyze_index_drops(input_file, output_dir, timeline_file=timeline_file)
+
+
+def index_timeline_reports(timeline_file: str = INDEX_TIMELINE_FILE, output_dir: str = files.ANALYSIS_DIR,
+                           min_flaps: int = 2) -> dict[str, str] | None:
+    """
+    r_hash別インデックスタイムラインの集計結果をCSVに保存
+
+    Returns:
+        {レポート名: CSV}（スナップショットがない場合はNone）
+    """
+    from index_timeline import load_timeline, export_timeline_reports
+
+    return export_timeline_reports(load_timeline(timeline_file), output_dir, min_flaps=min_flaps)
+
+
+def export_dify(all_rows: bool = False, shard_by: str | None = None,
+                max_shard_kb: int | None = None) -> list[str]:
+    """
+    Difyのナレッジベース用のMarkdownを data/dify_export にエクスポート
+
+    Args:
+        all_rows: Trueの場合、詳細テーブル・ランキングを件数で切らずに全件出力
+        shard_by: シャードの分割単位（'category'・'week'・'category-week'。Noneの場合はシャードを作らない）
+        max_shard_kb: シャード1件のサイズ上限（KB、Noneの場合は既定値）
+
+    Returns:
+        出力したファイル（シャードを含む）
+    """
+    import export_for_dify
+
+    seo_rows = None if all_rows else export_for_dify.SEO_DETAIL_ROWS
+    search_console_rows = None if all_rows else export_for_dify.SEARCH_CONSOLE_TOP_ROWS
+
+    outputs = [
+        export_for_dify.export_seo_rank_analysis(max_rows=seo_rows),
+        export_for_dify.export_search_console_analysis(max_rows=search_console_rows),
+        export_for_dify.export_metadata(),
+    ]
+    outputs = [path for path in outputs if path]
+
+    if shard_by:
+        outputs.extend(export_for_dify.export_shards(
+            shard_by, max_shard_kb or export_for_dify.DEFAULT_MAX_SHARD_KB))
+
+    return outputs
@@ -1,63 +1,35 @@
 import os
-import pickle
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
+import json
+
+from seo_etl import drive, google_api
 
 # Google Drive設定
 SCOPES = ['https://www.googleapis.com/auth/drive.file']
 PARENT_FOLDER_ID = '1sSy8mDQgtkmyODigpIiWiNh6hOJxG1Pt'  # 既存フォルダID
 
-def authenticate():
-    """Google Drive APIの認証（OAuth）"""
-    creds = None
-
-    if os.path.exists('token.pickle'):
-        with open('token.pickle', 'rb') as token:
-            creds = pickle.load(token)
+# 作成したフォルダIDの保存先（各アップロード・ダウンロードスクリプトが参照）
+FOLDER_IDS_FILE = 'drive_folder_ids.json'
 
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(
-                'credentials.json', SCOPES)
-            creds = flow.run_local_server(port=0)
+def load_folder_ids(path=FOLDER_IDS_FILE):
+    """保存済みのフォルダID（{フォルダ名: ID}、ファイルがない場合は空）"""
+    if not os.path.exists(path):
+        return {}
 
-        with open('token.pickle', 'wb') as token:
-            pickle.dump(creds, token)
+    with open(path, 'r') as f:
+        return json.load(f)
 
-    return build('drive', 'v3', credentials=creds)
+def authenticate():
+    """Google Drive APIの認証（OAuth）"""
+    return google_api.drive_service(SCOPES)
 
 def create_folder(service, folder_name, parent_folder_id):
-    """Google Driveにフォルダを作成"""
-    # 既存フォルダを検索
-    query = f"name='{folder_name}' and '{parent_folder_id}' in parents and mimeType='application/vnd.google-apps.folder' and trashed=false"
-    results = service.files().list(
-        q=query,
-        fields='files(id, name, webViewLink)'
-    ).execute()
-
-    folders = results.get('files', [])
-
-    if folders:
-        folder = folders[0]
-        print(f'✓ 既存フォルダ: {folder_name} (ID: {folder.get("id")})')
-        return folder
-    else:
-        file_metadata = {
-            'name': folder_name,
-            'mimeType': 'application/vnd.google-apps.folder',
-            'parents': [parent_folder_id]
-        }
-
-        folder = service.files().create(
-            body=file_metadata,
-            fields='id, name, webViewLink'
-        ).execute()
-
+    """Google Driveにフォルダを作成（既存のフォルダがあればそれを使用）"""
+    folder, created = drive.find_or_create_folder(service, folder_name, parent_folder_id)
+    if created:
         print(f'✓ 新規作成: {folder_name} (ID: {folder.get("id")})')
-        return folder
+    else:
+        print(f'✓ 既存フォルダ: {folder_name} (ID: {folder.get("id")})')
+    return folder
 
 def setup_folder_structure():
     """フォルダ構造をセットアップ"""
@@ -84,12 +56,11 @@ def setup_folder_structure():
         print(f"  リンク: {folder.get('webViewLink')}\n")
 
     # フォルダIDをファイルに保存
-    import json
-    with open('drive_folder_ids.json', 'w') as f:
+    with open(FOLDER_IDS_FILE, 'w') as f:
         json.dump(folder_ids, f, indent=2)
 
     print("✅ フォルダ構造のセットアップが完了しました")
-    print(f"\nフォルダIDは drive_folder_ids.json に保存されました")
+    print(f"\nフォルダIDは {FOLDER_IDS_FILE} に保存されました")
 
     return folder_ids
 
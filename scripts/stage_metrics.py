@@ -0,0 +1,353 @@
+"""
+ステージごとの処理時間・メモリ・行数・I/Oの計測
+
+各スクリプトの処理（ステージ）とその中の手順（読み込み・型変換・集計・分類・書き出しなど）を
+stage() で囲むと、終了時に次の情報を data/logs/run_log.jsonl に1行のJSONとして追記します。
+
+- wall_sec / cpu_sec: 経過時間とCPU時間
+- max_rss_mb: 終了時点のプロセスの最大常駐メモリ（ピークRSS）
+- rss_growth_mb: そのステージの間にピークRSSが増えた量（ステージが押し上げたピーク）
+- rows_in / rows_out: 入力・出力の行数（ステージ内で設定）
+- bytes_read / bytes_written: 読み書きしたファイルのサイズ（ステージ内で記録）
+- io_read_bytes / io_write_bytes: OSが数えた読み書きのバイト数（Linuxのみ）
+- api_calls: 外部API（Claude・BigQuery・Google Drive など）の呼び出し回数（count_api_call() で記録）
+
+同じ make の実行から呼ばれたスクリプトは、環境変数 SEO_ETL_RUN_ID で同じ run_id にまとめられます。
+ログの出力先は環境変数 SEO_ETL_RUN_LOG で変更でき、'off' を指定すると記録しません。
+--profile オプション（または SEO_ETL_PROFILE=1）を指定すると、トップレベルのステージを
+プロファイルします（profiling.py を参照）。
+
+使い方:
+    from stage_metrics import stage
+
+    with stage('merge_weekly_data') as metrics:
+        with stage('load') as step:
+            df = pd.read_csv(path)
+            step.read(path)
+            step.rows_out = len(df)
+        ...
+        metrics.rows_out = len(merged_df)
+
+    # 長い関数はインデントを変えずに手順を区切る
+    @instrumented()
+    def analyze(...):
+        metrics = current_stage()
+        step = metrics.step('load')
+        ...
+        step = metrics.step('groupby')
+        ...
+
+    python scripts/stage_metrics.py            # 最新の実行のステージ別サマリーを表示
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import functools
+import contextlib
+import contextvars
+from datetime import datetime
+
+from profiling import PROFILE_DIR, StageProfiler, profiling_enabled
+
+RUN_LOG_FILE = './data/logs/run_log.jsonl'
+RUN_LOG_ENV = 'SEO_ETL_RUN_LOG'
+RUN_ID_ENV = 'SEO_ETL_RUN_ID'
+
+# 環境変数で指定されていない場合のrun_id（プロセスごと）
+_process_run_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+
+# 実行中のステージ（スレッド・asyncioのタスクごとに別々に保持）
+_current = contextvars.ContextVar('stage_metrics_current', default=None)
+
+
+def get_run_id():
+    """現在の実行のrun_id"""
+    return os.environ.get(RUN_ID_ENV) or _process_run_id
+
+
+def get_run_log_file():
+    """ランログの出力先（記録しない場合はNone）"""
+    path = os.environ.get(RUN_LOG_ENV, RUN_LOG_FILE)
+    if not path or path.lower() == 'off':
+        return None
+    return path
+
+
+def _max_rss_mb():
+    """プロセスの最大常駐メモリ（MB、取得できない環境ではNone）"""
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linuxはキロバイト、macOSはバイト単位
+    return max_rss / 1024 / (1024 if sys.platform == 'darwin' else 1)
+
+
+def _io_counters():
+    """プロセスが読み書きしたバイト数（/proc/self/io の rchar, wchar、取得できない環境ではNone）"""
+    try:
+        with open('/proc/self/io', 'r') as f:
+            counters = dict(line.split(': ') for line in f.read().splitlines())
+        return int(counters['rchar']), int(counters['wchar'])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+class StageMetrics:
+    """1つのステージの計測値（stage() のwithブロック内で行数・読み書きしたファイルを設定）"""
+
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent
+        self.path = f"{parent.path}/{name}" if parent else name
+        self.rows_in = None
+        self.rows_out = None
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.api_calls = {}
+        self.fields = {}
+        self._step = None
+
+    def read(self, path):
+        """読み込んだファイルを記録（ファイルサイズをbytes_readに加算）"""
+        if path and os.path.isfile(path):
+            self.bytes_read += os.path.getsize(path)
+
+    def wrote(self, path):
+        """書き出したファイルを記録（ファイルサイズをbytes_writtenに加算）"""
+        if path and os.path.isfile(path):
+            self.bytes_written += os.path.getsize(path)
+
+    def api_call(self, service, calls=1):
+        """外部APIの呼び出しを記録（終了時に親ステージにも加算）"""
+        self.api_calls[service] = self.api_calls.get(service, 0) + calls
+
+    def set(self, **fields):
+        """ログに追加で記録する値を設定"""
+        self.fields.update(fields)
+
+    def step(self, name, rows_in=None, **fields):
+        """
+        実行中の手順を終了して次の手順を開始
+
+        長い関数をインデントを変えずに手順（load → coerce → groupby ...）に区切るために使います。
+        最後の手順はend_step()を呼ぶか、このステージの終了時に自動で終了します。
+
+        Args:
+            name: 手順名
+            rows_in: 手順の入力行数
+            **fields: ログに追加で記録する値
+
+        Returns:
+            開始した手順のStageMetrics
+        """
+        self.end_step()
+        self._step = stage(name, **fields)
+        step = self._step.__enter__()
+        step.rows_in = rows_in
+        return step
+
+    def end_step(self, exc_info=(None, None, None)):
+        """実行中の手順を終了"""
+        if self._step is not None:
+            step, self._step = self._step, None
+            step.__exit__(*exc_info)
+
+
+def _write_record(record):
+    """ランログに1行追記"""
+    log_file = get_run_log_file()
+    if log_file is None:
+        return
+
+    try:
+        os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
+        with open(log_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+    except OSError as e:
+        # 計測の失敗で本体の処理を止めない
+        print(f"警告: ランログを書き込めませんでした: {e}")
+
+
+@contextlib.contextmanager
+def stage(name, **fields):
+    """
+    ステージ（または手順）を計測するコンテキストマネージャー
+
+    他のstage()の中で使うと、その手順として親ステージのパス（例: merge_weekly_data/load）で記録されます。
+    例外が発生した場合もstatus='error'として記録し、例外はそのまま送出します。
+
+    Args:
+        name: ステージ名
+        **fields: ログに追加で記録する値
+
+    Yields:
+        StageMetrics（rows_in / rows_out の設定や read() / wrote() の記録に使用）
+    """
+    metrics = StageMetrics(name, parent=_current.get())
+    metrics.set(**fields)
+    token = _current.set(metrics)
+
+    # プロファイルはトップレベルのステージ単位（cProfileは入れ子にできないため）
+    profiler = None
+    if metrics.parent is None and profiling_enabled():
+        profiler = StageProfiler(name, os.path.join(PROFILE_DIR, get_run_id()))
+        if not profiler.start():
+            profiler = None
+
+    started_at = datetime.now()
+    rss_before = _max_rss_mb()
+    io_before = _io_counters()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    status, error = 'ok', None
+
+    try:
+        yield metrics
+        metrics.end_step()
+    except BaseException as e:
+        status, error = 'error', f"{type(e).__name__}: {e}"
+        metrics.end_step((type(e), e, e.__traceback__))
+        raise
+    finally:
+        wall_sec = time.perf_counter() - wall_start
+        cpu_sec = time.process_time() - cpu_start
+        rss_after = _max_rss_mb()
+        io_after = _io_counters()
+        _current.reset(token)
+
+        record = {
+            'run_id': get_run_id(),
+            'script': os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else None,
+            'stage': metrics.path,
+            'depth': metrics.path.count('/'),
+            'started_at': started_at.isoformat(timespec='milliseconds'),
+            'wall_sec': round(wall_sec, 4),
+            'cpu_sec': round(cpu_sec, 4),
+            'max_rss_mb': round(rss_after, 1) if rss_after is not None else None,
+            'rss_growth_mb': round(rss_after - rss_before, 1) if rss_after is not None else None,
+            'rows_in': metrics.rows_in,
+            'rows_out': metrics.rows_out,
+            'bytes_read': metrics.bytes_read,
+            'bytes_written': metrics.bytes_written,
+            'io_read_bytes': io_after[0] - io_before[0] if io_before and io_after else None,
+            'io_write_bytes': io_after[1] - io_before[1] if io_before and io_after else None,
+            'api_calls': dict(metrics.api_calls),
+            'status': status,
+            'error': error,
+        }
+        record.update(metrics.fields)
+
+        if metrics.parent is not None:
+            for service, calls in metrics.api_calls.items():
+                metrics.parent.api_call(service, calls)
+
+        if profiler is not None:
+            record['profile'] = profiler.stop()
+
+        _write_record(record)
+
+        if metrics.parent is None:
+            rss_label = f" / 最大RSS {rss_after:,.0f}MB" if rss_after is not None else ''
+            print(f"⏱ {metrics.path}: {wall_sec:.2f}秒（CPU {cpu_sec:.2f}秒）{rss_label}")
+
+
+def current_stage():
+    """実行中のステージ（stage()の外ではNone）"""
+    return _current.get()
+
+
+def count_api_call(service, calls=1):
+    """実行中のステージに外部APIの呼び出しを記録（stage()の外では何もしない）"""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.api_call(service, calls)
+
+
+def instrumented(name=None):
+    """関数全体をstage()で計測するデコレーター（nameを省略した場合は関数名）"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name or func.__name__):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def load_run_log(log_file=RUN_LOG_FILE):
+    """ランログを読み込み（壊れた行は読み飛ばす）"""
+    if not os.path.exists(log_file):
+        return []
+
+    records = []
+    with open(log_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+
+def _format_bytes(value):
+    if not value:
+        return '-'
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if value < 1024 or unit == 'GB':
+            return f"{value:,.0f}{unit}" if unit == 'B' else f"{value:,.1f}{unit}"
+        value /= 1024
+
+
+def print_run_summary(records, run_id=None):
+    """1回の実行のステージ別サマリーを表示（run_id省略時は最新の実行）"""
+    if not records:
+        print("ランログがありません")
+        return
+
+    run_id = run_id or records[-1]['run_id']
+    run_records = sorted((r for r in records if r['run_id'] == run_id), key=lambda r: (r['started_at'], r['depth']))
+    if not run_records:
+        print(f"run_id {run_id} の記録がありません")
+        return
+
+    total = sum(r['wall_sec'] for r in run_records if r['depth'] == 0)
+    print(f"run_id: {run_id}（トップレベルの合計 {total:.2f}秒）\n")
+    print(f"{'ステージ':<48} {'時間(秒)':>9} {'CPU(秒)':>9} {'RSS増(MB)':>10} {'行数(入→出)':>20} {'読込':>10} {'書込':>10}")
+
+    for r in run_records:
+        label = '  ' * r['depth'] + r['stage'].rsplit('/', 1)[-1]
+        if r['depth'] == 0 and r.get('script'):
+            label += f" ({r['script']})"
+        rows = f"{r['rows_in'] if r['rows_in'] is not None else '-'} → {r['rows_out'] if r['rows_out'] is not None else '-'}"
+        growth = f"{r['rss_growth_mb']:.1f}" if r.get('rss_growth_mb') is not None else '-'
+        mark = ' ✗' if r['status'] != 'ok' else ''
+        print(f"{label:<48} {r['wall_sec']:>9.2f} {r['cpu_sec']:>9.2f} {growth:>10} {rows:>20} "
+              f"{_format_bytes(r['bytes_read']):>10} {_format_bytes(r['bytes_written']):>10}{mark}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='ランログのステージ別サマリーを表示')
+    parser.add_argument('--run', help='表示するrun_id（デフォルト: 最新）')
+    parser.add_argument('--log', default=get_run_log_file() or RUN_LOG_FILE, help=f'ランログ（デフォルト: {RUN_LOG_FILE}）')
+    parser.add_argument('--list', action='store_true', help='記録されているrun_idの一覧を表示')
+    args = parser.parse_args()
+
+    records = load_run_log(args.log)
+
+    if args.list:
+        runs = {}
+        for r in records:
+            run = runs.setdefault(r['run_id'], {'started_at': r['started_at'], 'wall_sec': 0.0, 'stages': 0})
+            run['started_at'] = min(run['started_at'], r['started_at'])
+            if r['depth'] == 0:
+                run['wall_sec'] += r['wall_sec']
+                run['stages'] += 1
+        for run_id, run in sorted(runs.items(), key=lambda item: item[1]['started_at']):
+            print(f"{run_id}  {run['started_at']}  ステージ {run['stages']}件  {run['wall_sec']:.2f}秒")
+    else:
+        print_run_summary(records, args.run)
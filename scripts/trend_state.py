@@ -0,0 +1,369 @@
+"""
+キーワード×URL別の順位推移の特徴量（増分更新）
+
+analyze_trends_over_period は毎回すべての履歴から傾き・一貫性を計算し直しますが、
+ここでは（keyword, url）ごとの集計状態を永続化し、ペアごとに前回反映した日付（last_date）より
+新しい行だけで更新します。週次の更新は新しい行数に比例する時間で済みます。
+途中から追加されたペアは過去の行もすべて反映します。反映済みの日付以前に行が増えた（過去の週を
+差し替えた・追加した）ペアは順序どおりに反映できないため、警告を表示します（--rebuild で作り直す）。
+
+（keyword, url）ごとに保持する状態:
+- 直近 WINDOW 回の順位（リングバッファ）と、その区間の回帰用の和（Σy・Σty）
+- 全期間の回帰用の和（Σy・Σty）と件数、初回の日付・順位、最新の日付・順位・距離
+- 改善・悪化の回数と、連続して改善（負）/悪化（正）している回数（streak）
+- 順位の指数移動平均（EWMA、平滑化係数 EWMA_ALPHA）
+
+t をペア内の観測の通し番号（0, 1, 2, ...）とすると、n件の傾きは
+(Σty - Σt・Σy / n) / (n(n²-1)/12) で、analyze_trends_over_period と同じ値になります。
+
+保存形式（.npz）:
+    keywords, urls:  ペアのキー（初出順、インデックスが行番号）
+    ring:            行=ペア、列=リングバッファの位置（t % WINDOW）の順位
+    その他:           ペアごとの状態の配列、window・alpha・max_date
+
+使い方:
+    # 最新のマージ済みデータで状態を更新し、特徴量をCSVに保存
+    python scripts/trend_state.py
+
+    # 状態を作り直す（WINDOW・EWMA_ALPHAを変えた場合など）
+    python scripts/trend_state.py --rebuild --window 8
+"""
+from __future__ import annotations
+
+import os
+from datetime import datetime
+from pathlib import Path
+
+from lazy_imports import lazy_import
+from profiling import enable_profiling
+from seo_etl import files, stages
+from stage_metrics import instrumented
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# 設定
+STATE_FILE = './data/trend_state/trend_state.npz'
+OUTPUT_DIR = './data/analysis'
+WINDOW = 12         # リングバッファに保持する直近の回数（週次で3ヶ月分）
+EWMA_ALPHA = 0.3    # 順位の指数移動平均の平滑化係数
+
+# ペアごとの状態の配列 → (型, 新しいペアの初期値)（keywords / urls / ring 以外）
+STATE_COLUMNS = {
+    'count': ('int64', 0),
+    'first_date': ('datetime64[D]', 'NaT'),
+    'last_date': ('datetime64[D]', 'NaT'),
+    'first_rank': ('float64', float('nan')),
+    'last_rank': ('float64', float('nan')),
+    'last_distance': ('float64', float('nan')),
+    'previous_rank': ('float64', float('nan')),
+    'sum_y': ('float64', 0.0),
+    'sum_ty': ('float64', 0.0),
+    'window_sum_y': ('float64', 0.0),
+    'window_sum_ty': ('float64', 0.0),
+    'improvements': ('int64', 0),
+    'deteriorations': ('int64', 0),
+    'streak': ('int64', 0),
+    'ewma_rank': ('float64', float('nan')),
+}
+
+
+def empty_state(window=WINDOW, alpha=EWMA_ALPHA):
+    """空の状態を作成"""
+    state = {name: np.empty(0, dtype=dtype) for name, (dtype, _) in STATE_COLUMNS.items()}
+    state.update({
+        'keywords': np.empty(0, dtype=str),
+        'urls': np.empty(0, dtype=str),
+        'ring': np.full((0, window), np.nan, dtype=np.float32),
+        'window': window,
+        'alpha': alpha,
+        'max_date': np.datetime64('NaT', 'D'),
+    })
+    return state
+
+
+def load_state(path=STATE_FILE, window=WINDOW, alpha=EWMA_ALPHA):
+    """
+    保存済みの状態を読み込み（存在しない場合は空）
+
+    保存済みの状態と window・alpha が異なる場合はValueError（--rebuild で作り直す）
+    """
+    if not os.path.exists(path):
+        return empty_state(window, alpha)
+
+    with np.load(path) as data:
+        state = {name: data[name] for name in data.files}
+    state['window'] = int(state['window'])
+    state['alpha'] = float(state['alpha'])
+    state['max_date'] = state['max_date'][()]
+
+    if state['window'] != window or state['alpha'] != alpha:
+        raise ValueError(
+            f"保存済みの状態（window={state['window']}, alpha={state['alpha']}）と設定"
+            f"（window={window}, alpha={alpha}）が異なります。--rebuild で作り直してください"
+        )
+    return state
+
+
+def save_state(state, path=STATE_FILE):
+    """状態を保存（一時ファイルに書き込んでから置き換え）"""
+    Path(os.path.dirname(path)).mkdir(parents=True, exist_ok=True)
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez_compressed(f, **state)
+    os.replace(tmp_path, path)
+
+
+def _pair_rows(state, keywords, urls):
+    """
+    ペアの行番号を検索し、未登録のペアは末尾に追加（keywords, urls のペアは重複なし）
+
+    Returns:
+        (更新後の状態, 各ペアの行番号)
+    """
+    known = pd.MultiIndex.from_arrays([state['keywords'], state['urls']])
+    rows = known.get_indexer(pd.MultiIndex.from_arrays([keywords, urls]))
+
+    new = rows < 0
+    if new.any():
+        n_new = int(new.sum())
+        rows[new] = len(state['keywords']) + np.arange(n_new)
+        state = dict(state)
+        state['keywords'] = np.concatenate([state['keywords'].astype(str), np.asarray(keywords[new], dtype=str)])
+        state['urls'] = np.concatenate([state['urls'].astype(str), np.asarray(urls[new], dtype=str)])
+        for name, (dtype, fill) in STATE_COLUMNS.items():
+            state[name] = np.concatenate([state[name], np.full(n_new, fill, dtype=dtype)])
+        state['ring'] = np.concatenate([state['ring'], np.full((n_new, state['window']), np.nan, np.float32)])
+    return state, rows
+
+
+def _apply(state, rows, rank, distance, dates):
+    """各ペアの次の観測（rowsは重複なし）で状態を更新"""
+    window = state['window']
+    alpha = state['alpha']
+    n = state['count'][rows]
+    first = n == 0
+
+    diff = np.where(first, 0.0, rank - state['last_rank'][rows])
+    streak = state['streak'][rows]
+    state['streak'][rows] = np.where(
+        diff < 0, np.where(streak < 0, streak - 1, -1),
+        np.where(diff > 0, np.where(streak > 0, streak + 1, 1), 0)
+    )
+    state['improvements'][rows] += diff < 0
+    state['deteriorations'][rows] += diff > 0
+
+    # 全期間の回帰用の和（t = n）
+    state['sum_y'][rows] += rank
+    state['sum_ty'][rows] += n * rank
+
+    # 直近window回の回帰用の和（リングバッファから押し出される値を差し引く）
+    slot = n % window
+    evicted = state['ring'][rows, slot].astype(np.float64)
+    full = n >= window
+    state['window_sum_y'][rows] += rank - np.where(full, evicted, 0.0)
+    state['window_sum_ty'][rows] += n * rank - np.where(full, (n - window) * evicted, 0.0)
+    state['ring'][rows, slot] = rank
+
+    state['ewma_rank'][rows] = np.where(first, rank, alpha * rank + (1 - alpha) * state['ewma_rank'][rows])
+    state['first_rank'][rows] = np.where(first, rank, state['first_rank'][rows])
+    state['first_date'][rows] = np.where(first, dates, state['first_date'][rows])
+    state['previous_rank'][rows] = state['last_rank'][rows]
+    state['last_rank'][rows] = rank
+    state['last_distance'][rows] = distance
+    state['last_date'][rows] = dates
+    state['count'][rows] = n + 1
+
+
+def update_state(state, rank_frame):
+    """
+    ペアごとに反映済みの日付（last_date）より新しい行だけで状態を更新
+
+    状態にないペアはすべての行を反映します。反映済みの日付以前の行が状態の件数より多いペア
+    （過去の週の行が後から追加されたもの）は反映できないため、警告を表示します。
+
+    Args:
+        state: load_stateで読み込んだ状態
+        rank_frame: prepare_rank_frameで作成したデータフレーム（全期間でも、新しい週だけでもよい）
+
+    Returns:
+        (更新後の状態, 反映した行数)
+    """
+    from analyze_trends import prepare_rank_frame, _group_starts
+
+    frame = prepare_rank_frame(rank_frame)
+    dates = frame['date'].to_numpy().astype('datetime64[D]')
+    if len(state['keywords']) > 0 and len(frame) > 0:
+        # ペアごとの反映済みの日付（状態にないペアはNaT）
+        starts = _group_starts(frame)
+        start_idx = np.flatnonzero(starts)
+        group_ids = np.cumsum(starts) - 1
+        known = pd.MultiIndex.from_arrays([state['keywords'], state['urls']]).get_indexer(
+            pd.MultiIndex.from_arrays([np.asarray(frame['keyword'].array.take(start_idx), dtype=str),
+                                       np.asarray(frame['url'].array.take(start_idx), dtype=str)]))
+        last_date = np.where(known >= 0, state['last_date'][known], np.datetime64('NaT', 'D'))[group_ids]
+        new = np.isnat(last_date) | (dates > last_date)
+
+        # 反映済みの期間に状態の件数より多くの行があるペア = 後から追加された過去の行
+        old_counts = np.bincount(group_ids[~new], minlength=len(start_idx))
+        backfilled = (known >= 0) & (old_counts > np.where(known >= 0, state['count'][known], 0))
+        if backfilled.any():
+            print(f"  ⚠ {int(backfilled.sum()):,}ペアで反映済みの日付以前の行が増えています"
+                  "（過去の週を差し替えた場合は --rebuild で作り直してください）")
+
+        frame, dates = frame[new], dates[new]
+    if len(frame) == 0:
+        return state, 0
+
+    # ペアごとに行番号を求め、ペア内の何番目の新しい行かを計算（frameはkeyword, url, dateの順にソート済み）
+    starts = _group_starts(frame)
+    start_idx = np.flatnonzero(starts)
+    group_ids = np.cumsum(starts) - 1
+    position = np.arange(len(frame)) - start_idx[group_ids]
+
+    state, pair_rows = _pair_rows(state, np.asarray(frame['keyword'].array.take(start_idx), dtype=str),
+                                  np.asarray(frame['url'].array.take(start_idx), dtype=str))
+    rows = pair_rows[group_ids]
+    rank = frame['rank'].to_numpy(dtype=np.float64)
+    distance = frame['distance'].to_numpy(dtype=np.float64)
+
+    # k番目の新しい行をすべてのペアについてまとめて反映（週次の更新では1回）
+    state = {name: value.copy() if isinstance(value, np.ndarray) else value for name, value in state.items()}
+    for k in range(int(position.max()) + 1):
+        idx = np.flatnonzero(position == k)
+        _apply(state, rows[idx], rank[idx], distance[idx], dates[idx])
+
+    state['max_date'] = dates.max() if np.isnat(state['max_date']) else max(state['max_date'], dates.max())
+    return state, len(frame)
+
+
+def _slope(count, sum_y, sum_ty, first_t):
+    """t = first_t, ..., first_t + count - 1 の回帰の傾き（1件以下は0）"""
+    count = count.astype(np.float64)
+    sum_t = count * first_t + count * (count - 1) / 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (sum_ty - sum_t * sum_y / count) / (count * (count ** 2 - 1) / 12)
+    return np.where(count > 1, slope, 0.0)
+
+
+def trend_features(state, min_data_points=5):
+    """
+    状態から（keyword, url）ごとの推移の特徴量を作成
+
+    analyze_trends_over_period と同じ列（keyword, url, first_date, last_date, first_rank,
+    last_rank, total_change, slope, improvements, deteriorations, consistency_score,
+    data_points）に、直近window回の傾き・平均順位、前回からの順位差、streak、EWMAを加えたもの
+
+    Returns:
+        data_points が min_data_points 以上のペアのデータフレーム（keyword, url の順）
+    """
+    count = state['count']
+    window_count = np.minimum(count, state['window'])
+
+    improvements = state['improvements']
+    deteriorations = state['deteriorations']
+    total_changes = improvements + deteriorations
+    with np.errstate(divide='ignore', invalid='ignore'):
+        consistency_score = np.where(total_changes > 0, (deteriorations - improvements) / total_changes, 0.0)
+        window_mean_rank = state['window_sum_y'] / window_count
+
+    features = pd.DataFrame({
+        'keyword': state['keywords'],
+        'url': state['urls'],
+        'first_date': state['first_date'].astype('datetime64[ns]'),
+        'last_date': state['last_date'].astype('datetime64[ns]'),
+        'first_rank': state['first_rank'],
+        'last_rank': state['last_rank'],
+        'total_change': state['last_rank'] - state['first_rank'],
+        'slope': _slope(count, state['sum_y'], state['sum_ty'], 0),
+        'improvements': improvements,
+        'deteriorations': deteriorations,
+        'consistency_score': consistency_score,
+        'data_points': count,
+        'window_slope': _slope(window_count, state['window_sum_y'], state['window_sum_ty'], count - window_count),
+        'window_mean_rank': np.round(window_mean_rank, 2),
+        'rank_diff': state['last_rank'] - state['previous_rank'],
+        'streak': state['streak'],
+        'ewma_rank': np.round(state['ewma_rank'], 2),
+    })
+
+    features = features[count >= min_data_points]
+    order = np.lexsort((features['url'].to_numpy(), features['keyword'].to_numpy()))
+    return features.iloc[order].reset_index(drop=True)
+
+
+def window_ranks(state):
+    """リングバッファの順位を古い順に並べた配列（行=ペア、足りない分はNaN）"""
+    window = state['window']
+    count = state['count']
+    # 列jに入る観測の通し番号 t = count - window + j（負の場合はまだない）
+    t = count[:, None] - window + np.arange(window)
+    ranks = np.take_along_axis(state['ring'], np.maximum(t, 0) % window, axis=1)
+    return np.where(t >= 0, ranks, np.nan)
+
+
+@instrumented()
+def refresh(rank_frame, path=STATE_FILE, window=WINDOW, alpha=EWMA_ALPHA, rebuild=False):
+    """
+    保存済みの状態を新しい行で更新して保存
+
+    Args:
+        rank_frame: マージ済みデータまたはprepare_rank_frameで作成したデータフレーム
+        path: 状態の保存先（Noneの場合は保存済みの状態を読み書きせず、rank_frameの全期間からメモリ上で計算）
+        window: リングバッファの長さ
+        alpha: EWMAの平滑化係数
+        rebuild: Trueの場合、保存済みの状態を使わずに全期間から作り直す
+
+    Returns:
+        更新後の状態
+    """
+    state = empty_state(window, alpha) if rebuild or path is None else load_state(path, window, alpha)
+    state, applied = update_state(state, rank_frame)
+    if path is not None and (applied > 0 or rebuild):
+        save_state(state, path)
+
+    print(f"推移の特徴量: {applied:,}行を反映 (ペア {len(state['keywords']):,}件, 最新 {state['max_date']})")
+    return state
+
+
+def export_features(state, output_dir=OUTPUT_DIR, min_data_points=5, inputs=()):
+    """特徴量をCSVに保存"""
+    features = trend_features(state, min_data_points=min_data_points)
+
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_file = os.path.join(output_dir, f"trend_features_{timestamp}.csv")
+    features.to_csv(output_file, index=False, encoding='utf-8-sig')
+    files.record_output(output_file, files.TREND_FEATURES,
+                        params={'window': state['window'], 'alpha': state['alpha'],
+                                'min_data_points': min_data_points},
+                        inputs=inputs, rows=len(features))
+    print(f"✓ 保存: {output_file}")
+    return output_file
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='キーワード×URL別の順位推移の特徴量（増分更新）')
+    parser.add_argument('--input', type=str, help='マージ済みデータ（省略時は最新のファイル）')
+    parser.add_argument('--state', type=str, default=STATE_FILE, help='状態ファイルのパス')
+    parser.add_argument('--output-dir', type=str, default=OUTPUT_DIR, help='出力ディレクトリ')
+    parser.add_argument('--window', type=int, default=WINDOW, help=f'リングバッファの長さ（デフォルト: {WINDOW}）')
+    parser.add_argument('--alpha', type=float, default=EWMA_ALPHA, help=f'EWMAの平滑化係数（デフォルト: {EWMA_ALPHA}）')
+    parser.add_argument('--min-data-points', type=int, default=5, help='出力に必要な最小データポイント数')
+    parser.add_argument('--rebuild', action='store_true', help='保存済みの状態を使わずに全期間から作り直す')
+    parser.add_argument('--profile', action='store_true', help='処理をプロファイルして data/profiles/ に保存')
+
+    args = parser.parse_args()
+    enable_profiling(args.profile)
+
+    try:
+        merged_file = args.input or stages.latest_merged_file()
+        state = refresh(stages.load_merged(merged_file), args.state, window=args.window, alpha=args.alpha,
+                        rebuild=args.rebuild)
+        export_features(state, args.output_dir, min_data_points=args.min_data_points, inputs=[merged_file])
+    except (FileNotFoundError, ValueError) as e:
+        print(f"エラー: {e}")
+        exit(1)
@@ -3,13 +3,10 @@
 プレゼンテーションファイルをGoogle Driveにアップロードし、Google Slidesとして公開するスクリプト
 """
 import os
-import pickle
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
 import json
 
+from seo_etl import drive, google_api
+
 # Google Drive設定
 SCOPES = ['https://www.googleapis.com/auth/drive.file']
 PARENT_FOLDER_ID = '1sSy8mDQgtkmyODigpIiWiNh6hOJxG1Pt'
@@ -18,109 +15,32 @@ PRESENTATION_NAME = 'スタンバイSEO 11月大阪合宿'
 
 def authenticate():
     """Google Drive APIの認証（OAuth）"""
-    creds = None
-
-    # token.pickleファイルがあれば読み込む
-    if os.path.exists('token.pickle'):
-        with open('token.pickle', 'rb') as token:
-            creds = pickle.load(token)
-
-    # 認証情報が無効または存在しない場合
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            # OAuth認証フローを開始
-            flow = InstalledAppFlow.from_client_secrets_file(
-                'credentials.json', SCOPES)
-            creds = flow.run_local_server(port=0)
-
-        # 認証情報を保存
-        with open('token.pickle', 'wb') as token:
-            pickle.dump(creds, token)
-
-    return build('drive', 'v3', credentials=creds)
+    return google_api.drive_service(SCOPES)
 
 def find_or_create_folder(service, folder_name, parent_folder_id):
     """フォルダを検索、なければ作成"""
-    # 既存フォルダを検索
-    query = f"name='{folder_name}' and '{parent_folder_id}' in parents and mimeType='application/vnd.google-apps.folder' and trashed=false"
-    results = service.files().list(
-        q=query,
-        fields='files(id, name, webViewLink)'
-    ).execute()
-
-    folders = results.get('files', [])
-
-    if folders:
-        folder = folders[0]
-        print(f'既存フォルダを使用: {folder_name} (ID: {folder.get("id")})')
-        return folder
-    else:
-        # フォルダを作成
-        file_metadata = {
-            'name': folder_name,
-            'mimeType': 'application/vnd.google-apps.folder',
-            'parents': [parent_folder_id]
-        }
-        folder = service.files().create(
-            body=file_metadata,
-            fields='id, name, webViewLink'
-        ).execute()
+    folder, created = drive.find_or_create_folder(service, folder_name, parent_folder_id)
+    if created:
         print(f'フォルダ作成: {folder_name} (ID: {folder.get("id")})')
-        return folder
+    else:
+        print(f'既存フォルダを使用: {folder_name} (ID: {folder.get("id")})')
+    return folder
 
 def upload_presentation_as_slides(service, file_path, folder_id, presentation_name):
     """プレゼンテーションファイルをGoogle Slidesとしてアップロード"""
-
-    # 既存ファイルを検索
-    query = f"name='{presentation_name}' and '{folder_id}' in parents and trashed=false"
-    results = service.files().list(
-        q=query,
-        fields='files(id, name, webViewLink)'
-    ).execute()
-
-    existing_files = results.get('files', [])
-
-    # ファイルのMIMEタイプを判定
-    if file_path.endswith('.pptx'):
-        source_mime_type = 'application/vnd.openxmlformats-officedocument.presentationml.presentation'
-    elif file_path.endswith('.pdf'):
-        source_mime_type = 'application/pdf'
-    else:
-        source_mime_type = 'application/octet-stream'
-
     # Google Slides形式
     target_mime_type = 'application/vnd.google-apps.presentation'
 
-    media = MediaFileUpload(file_path, mimetype=source_mime_type, resumable=True)
-
     try:
-        if existing_files:
-            # 既存ファイルを更新
-            file_id = existing_files[0]['id']
-            print(f'既存のGoogle Slidesを更新中: {presentation_name}')
-
-            # 既存ファイルの内容を更新（URLは維持される）
-            file = service.files().update(
-                fileId=file_id,
-                media_body=media,
-                fields='id, name, webViewLink, mimeType'
-            ).execute()
-            print(f'  Google Slidesを更新しました（URLは変わりません）')
-        else:
-            # 新規ファイルを作成
-            print(f'新しいGoogle Slidesを作成中: {presentation_name}')
-            file_metadata = {
-                'name': presentation_name,
-                'parents': [folder_id],
-                'mimeType': target_mime_type
-            }
-            file = service.files().create(
-                body=file_metadata,
-                media_body=media,
-                fields='id, name, webViewLink, mimeType'
-            ).execute()
+        print(f'Google Slidesにアップロード中: {presentation_name}')
+        file, updated = drive.upload_file(
+            service, file_path, folder_id,
+            name=presentation_name,
+            target_mime_type=target_mime_type,
+            fields='id, name, webViewLink, mimeType'
+        )
+        if updated:
+            print(f'  既存のGoogle Slidesを更新しました（URLは変わりません）')
 
         print(f'\n✓ Google Slidesとして公開しました')
         print(f'  名前: {file.get("name")}')
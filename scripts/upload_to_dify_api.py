@@ -13,31 +13,73 @@ Dify APIを使ってナレッジベースを自動更新
    DIFY_DATASET_ID=xxxxx-xxxxx-xxxxx
 """
 import os
-import requests
+import json
+import time
+import hashlib
+import argparse
 import glob
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
 from pathlib import Path
 
+from seo_etl import env
+
 # Dify API設定
 DIFY_API_ENDPOINT = os.getenv('DIFY_API_ENDPOINT', 'https://api.dify.ai/v1')
 DIFY_API_KEY = os.getenv('DIFY_API_KEY')
 DIFY_DATASET_ID = os.getenv('DIFY_DATASET_ID')
 
-# .envファイルから読み込み
+# アップロード済みドキュメントのコンテンツハッシュを記録するマニフェスト
+SYNC_MANIFEST_FILE = './data/cache/dify_sync_manifest.json'
+
+# 並列アップロード・リトライ設定
+DEFAULT_CONCURRENCY = 4
+MAX_RETRIES = 5
+RETRY_BACKOFF_FACTOR = 1.0
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+# ドキュメント作成（POST）は冪等でないため、サーバーが処理していない429と接続エラーだけをリトライ
+UPLOAD_RETRYABLE_STATUS_CODES = (429,)
+REQUEST_TIMEOUT = (10, 120)
+
+# インデックス完了待ちの設定
+INDEXING_POLL_INTERVAL = 5
+INDEXING_TIMEOUT = 600
+INDEXING_DONE_STATUSES = ('completed', 'error', 'paused')
+
+# ドキュメント一覧の1ページあたりの件数（Dify APIの上限）
+LIST_PAGE_LIMIT = 100
+
+# ドキュメント登録時の処理ルール
+PROCESS_SETTINGS = {
+    'indexing_technique': 'high_quality',
+    'process_rule': {
+        'mode': 'custom',
+        'rules': {
+            'pre_processing_rules': [
+                {'id': 'remove_extra_spaces', 'enabled': True},
+                {'id': 'remove_urls_emails', 'enabled': False}
+            ],
+            'segmentation': {
+                'separator': '###',
+                'max_tokens': 1000
+            }
+        }
+    }
+}
+
+_session = None
+_upload_session = None
+
+# 実行中のドキュメント一覧キャッシュ（キーワード → 一覧）
+_document_cache = {}
+
 def load_env():
-    """簡易的な.envファイル読み込み"""
-    env_file = '.env'
-    if os.path.exists(env_file):
-        with open(env_file, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#'):
-                    key, value = line.split('=', 1)
-                    os.environ[key] = value
-
-        # 再取得
-        global DIFY_API_KEY, DIFY_DATASET_ID
-        DIFY_API_KEY = os.getenv('DIFY_API_KEY')
-        DIFY_DATASET_ID = os.getenv('DIFY_DATASET_ID')
+    """.envファイルを読み込み、Difyの設定を再取得"""
+    env.load_env()
+
+    global DIFY_API_KEY, DIFY_DATASET_ID
+    DIFY_API_KEY = os.getenv('DIFY_API_KEY')
+    DIFY_DATASET_ID = os.getenv('DIFY_DATASET_ID')
 
 def check_config():
     """設定を確認"""
@@ -58,138 +100,447 @@ def check_config():
 
     return True
 
-def get_existing_documents():
-    """既存のドキュメント一覧を取得"""
+def _build_session(retry, concurrency):
+    """リトライ設定とコネクションプールを付けたrequests.Sessionを作成"""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(concurrency, 1), max_retries=retry)
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['Authorization'] = f'Bearer {DIFY_API_KEY}'
+    return session
+
+def get_session(concurrency=DEFAULT_CONCURRENCY):
+    """
+    Dify API用のrequests.Sessionを取得（実行中は1つを使い回す）
+
+    コネクションプールは並列数に合わせ、冪等なメソッド（GET・DELETEなど）の429/5xxは
+    Retry-Afterに従って指数バックオフでリトライします。POSTは get_upload_session() を使います。
+    """
+    global _session
+    if _session is None:
+        from urllib3.util.retry import Retry
+
+        retry = Retry(
+            total=MAX_RETRIES,
+            backoff_factor=RETRY_BACKOFF_FACTOR,
+            status_forcelist=RETRYABLE_STATUS_CODES,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        _session = _build_session(retry, concurrency)
+
+    return _session
+
+def get_upload_session(concurrency=DEFAULT_CONCURRENCY):
+    """
+    ドキュメント作成（POST）用のrequests.Sessionを取得（実行中は1つを使い回す）
+
+    POSTは冪等でないため、二重登録にならない429（Retry-Afterに従う）と接続エラーだけを
+    リトライし、5xxや読み込みのタイムアウトはリトライしません。
+    """
+    global _upload_session
+    if _upload_session is None:
+        from urllib3.util.retry import Retry
+
+        retry = Retry(
+            total=MAX_RETRIES,
+            read=0,
+            backoff_factor=RETRY_BACKOFF_FACTOR,
+            status_forcelist=UPLOAD_RETRYABLE_STATUS_CODES,
+            allowed_methods=frozenset({'POST'}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        _upload_session = _build_session(retry, concurrency)
+
+    return _upload_session
+
+def _fetch_document_page(page, keyword=None):
+    """ドキュメント一覧の1ページを取得"""
     url = f"{DIFY_API_ENDPOINT}/datasets/{DIFY_DATASET_ID}/documents"
-    headers = {
-        'Authorization': f'Bearer {DIFY_API_KEY}'
-    }
-
+    params = {'page': page, 'limit': LIST_PAGE_LIMIT}
+    if keyword:
+        params['keyword'] = keyword
+
+    response = get_session().get(url, params=params, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+def list_documents(keyword=None, concurrency=DEFAULT_CONCURRENCY, refresh=False):
+    """
+    ナレッジベースのドキュメントを全ページ取得
+
+    1ページ目で総件数を確認し、残りのページは並列に取得します。
+    結果は実行中キャッシュし、同じキーワードでの2回目以降はAPIを呼びません。
+
+    Args:
+        keyword: 指定した場合はドキュメント名でAPI側で絞り込み
+        concurrency: ページ取得の並列数
+        refresh: Trueの場合はキャッシュを使わずに再取得
+
+    Returns:
+        ドキュメント（{'id', 'name', ...}）のリスト
+    """
+    if not refresh and keyword in _document_cache:
+        return _document_cache[keyword]
+
+    first = _fetch_document_page(1, keyword)
+    documents = list(first.get('data', []))
+
+    if first.get('has_more'):
+        limit = first.get('limit') or LIST_PAGE_LIMIT
+        total = first.get('total')
+
+        if total:
+            # 総件数からページ数がわかる場合は残りを並列に取得
+            pages = range(2, -(-total // limit) + 1)
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                for page_data in executor.map(lambda page: _fetch_document_page(page, keyword), pages):
+                    documents.extend(page_data.get('data', []))
+        else:
+            page = 2
+            while True:
+                page_data = _fetch_document_page(page, keyword)
+                documents.extend(page_data.get('data', []))
+                if not page_data.get('has_more'):
+                    break
+                page += 1
+
+    # ページ取得中に追加・削除があった場合の重複を除去
+    documents = list({doc['id']: doc for doc in documents}.values())
+
+    _document_cache[keyword] = documents
+    return documents
+
+def find_documents(keyword):
+    """ドキュメント名にkeywordを含むドキュメントを検索（{名前: ID}）"""
+    if None in _document_cache:
+        documents = [doc for doc in _document_cache[None] if keyword in doc['name']]
+    else:
+        documents = list_documents(keyword)
+    return {doc['name']: doc['id'] for doc in documents}
+
+def get_existing_documents(concurrency=DEFAULT_CONCURRENCY):
+    """
+    既存のドキュメント一覧を取得（{名前: ID}）
+
+    取得に失敗した場合はNoneを返します（空扱いにすると全件が新規作成され、
+    重複ドキュメントができるため）。
+    """
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-
-        data = response.json()
-        documents = data.get('data', [])
-
-        print(f"既存ドキュメント数: {len(documents)}")
-        return {doc['name']: doc['id'] for doc in documents}
+        documents = list_documents(concurrency=concurrency)
     except Exception as e:
         print(f"⚠ ドキュメント一覧取得エラー: {e}")
-        return {}
-
-def update_document(doc_id, file_path):
-    """既存ドキュメントを更新"""
-    url = f"{DIFY_API_ENDPOINT}/datasets/{DIFY_DATASET_ID}/documents/{doc_id}/update_by_file"
-    headers = {
-        'Authorization': f'Bearer {DIFY_API_KEY}'
-    }
-
+        return None
+
+    existing = {}
+    duplicates = 0
+    for doc in documents:
+        if doc['name'] in existing:
+            duplicates += 1
+            continue
+        existing[doc['name']] = doc['id']
+
+    print(f"既存ドキュメント数: {len(documents)}")
+    if duplicates:
+        print(f"⚠ 同名のドキュメントが{duplicates}件あります（先頭のものを更新対象にします）")
+    return existing
+
+def _post_document(url, file_path):
+    """
+    ファイルをmultipartで送信し、(ドキュメントID, バッチID) を返す
+
+    処理ルールはDify APIの仕様どおり、JSON文字列の data フィールドで送信します。
+    """
     file_name = os.path.basename(file_path)
+    settings = dict(PROCESS_SETTINGS, name=file_name)
 
     with open(file_path, 'rb') as f:
         files = {
-            'file': (file_name, f, 'text/markdown')
-        }
-        data = {
-            'name': file_name,
-            'indexing_technique': 'high_quality',
-            'process_rule': {
-                'mode': 'custom',
-                'rules': {
-                    'pre_processing_rules': [
-                        {'id': 'remove_extra_spaces', 'enabled': True},
-                        {'id': 'remove_urls_emails', 'enabled': False}
-                    ],
-                    'segmentation': {
-                        'separator': '###',
-                        'max_tokens': 1000
-                    }
-                }
-            }
+            'file': (file_name, f, 'text/markdown'),
+            'data': (None, json.dumps(settings), 'text/plain'),
         }
+        response = get_upload_session().post(url, files=files, timeout=REQUEST_TIMEOUT)
 
-        try:
-            response = requests.post(url, headers=headers, files=files, data=data)
-            response.raise_for_status()
-            print(f"  ✓ 更新完了: {file_name}")
-            return True
-        except Exception as e:
-            print(f"  ✗ 更新失敗: {file_name} - {e}")
-            return False
+    response.raise_for_status()
+    result = response.json()
+    return result.get('document', {}).get('id'), result.get('batch')
+
+def update_document(doc_id, file_path):
+    """既存ドキュメントを更新（成功時は (ドキュメントID, バッチID) を返す）"""
+    url = f"{DIFY_API_ENDPOINT}/datasets/{DIFY_DATASET_ID}/documents/{doc_id}/update_by_file"
+    file_name = os.path.basename(file_path)
+
+    try:
+        new_id, batch = _post_document(url, file_path)
+        print(f"  ✓ 更新完了: {file_name}")
+        return new_id or doc_id, batch
+    except Exception as e:
+        print(f"  ✗ 更新失敗: {file_name} - {e}")
+        return None, None
 
 def create_document(file_path):
-    """新規ドキュメントを作成"""
+    """新規ドキュメントを作成（成功時は (ドキュメントID, バッチID) を返す）"""
     url = f"{DIFY_API_ENDPOINT}/datasets/{DIFY_DATASET_ID}/document/create_by_file"
-    headers = {
-        'Authorization': f'Bearer {DIFY_API_KEY}'
-    }
-
     file_name = os.path.basename(file_path)
 
-    with open(file_path, 'rb') as f:
-        files = {
-            'file': (file_name, f, 'text/markdown')
-        }
-        data = {
-            'name': file_name,
-            'indexing_technique': 'high_quality',
-            'process_rule': {
-                'mode': 'custom',
-                'rules': {
-                    'pre_processing_rules': [
-                        {'id': 'remove_extra_spaces', 'enabled': True},
-                        {'id': 'remove_urls_emails', 'enabled': False}
-                    ],
-                    'segmentation': {
-                        'separator': '###',
-                        'max_tokens': 1000
-                    }
-                }
-            }
-        }
+    try:
+        doc_id, batch = _post_document(url, file_path)
+        print(f"  ✓ 作成完了: {file_name}")
+        return doc_id, batch
+    except Exception as e:
+        print(f"  ✗ 作成失敗: {file_name} - {e}")
+        return None, None
+
+def delete_document(doc_id, file_name):
+    """ドキュメントを削除"""
+    url = f"{DIFY_API_ENDPOINT}/datasets/{DIFY_DATASET_ID}/documents/{doc_id}"
 
-        try:
-            response = requests.post(url, headers=headers, files=files, data=data)
+    try:
+        response = get_session().delete(url, timeout=REQUEST_TIMEOUT)
+        # 既に削除済みの場合も成功扱い
+        if response.status_code != 404:
             response.raise_for_status()
-            print(f"  ✓ 作成完了: {file_name}")
-            return True
-        except Exception as e:
-            print(f"  ✗ 作成失敗: {file_name} - {e}")
-            return False
+        print(f"  ✓ 削除完了: {file_name}")
+        return True
+    except Exception as e:
+        print(f"  ✗ 削除失敗: {file_name} - {e}")
+        return False
+
+def get_indexing_status(batch):
+    """バッチのインデックス状況を取得（{ドキュメントID: ステータス}）"""
+    url = f"{DIFY_API_ENDPOINT}/datasets/{DIFY_DATASET_ID}/documents/{batch}/indexing-status"
+    response = get_session().get(url, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return {item['id']: item.get('indexing_status') for item in response.json().get('data', [])}
+
+def wait_for_indexing(batches, concurrency=DEFAULT_CONCURRENCY,
+                      interval=INDEXING_POLL_INTERVAL, timeout=INDEXING_TIMEOUT):
+    """
+    アップロードしたドキュメントのインデックス完了を待ち、ドキュメントごとのレイテンシを表示
+
+    Args:
+        batches: {バッチID: (ファイル名, アップロード完了時刻)}
+        concurrency: ステータス取得の並列数
+        interval: ポーリング間隔（秒）
+        timeout: 待機の上限（秒）
+
+    Returns:
+        {ファイル名: {'status': str, 'latency': 秒 or None}}
+    """
+    if not batches:
+        return {}
+
+    print(f"\nインデックス完了を待機中: {len(batches)}件（最大{timeout}秒）")
+
+    results = {}
+    pending = dict(batches)
+    deadline = time.monotonic() + timeout
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while pending and time.monotonic() < deadline:
+            futures = {executor.submit(get_indexing_status, batch): batch for batch in pending}
+            for future in as_completed(futures):
+                batch = futures[future]
+                file_name, uploaded_at = pending[batch]
+                try:
+                    statuses = future.result()
+                except Exception as e:
+                    print(f"  ⚠ ステータス取得エラー: {file_name} - {e}")
+                    continue
+
+                if statuses and all(status in INDEXING_DONE_STATUSES for status in statuses.values()):
+                    status = 'completed' if all(s == 'completed' for s in statuses.values()) else 'error'
+                    latency = time.monotonic() - uploaded_at
+                    results[file_name] = {'status': status, 'latency': latency}
+                    mark = '✓' if status == 'completed' else '✗'
+                    print(f"  {mark} {status}: {file_name}（{latency:.1f}秒）")
+                    del pending[batch]
+
+            if pending:
+                time.sleep(interval)
+
+    for file_name, _ in pending.values():
+        results[file_name] = {'status': 'timeout', 'latency': None}
+        print(f"  ⚠ タイムアウト: {file_name}")
+
+    latencies = sorted(r['latency'] for r in results.values() if r['status'] == 'completed')
+    if latencies:
+        median = latencies[len(latencies) // 2]
+        print(f"インデックス完了: {len(latencies)}/{len(results)}件"
+              f"（中央値 {median:.1f}秒 / 最大 {latencies[-1]:.1f}秒）")
+
+    return results
+
+def _upload_one(file_path, doc_id):
+    """1ファイルを更新または作成し、(ドキュメントID, バッチID, 完了時刻) を返す"""
+    if doc_id:
+        new_id, batch = update_document(doc_id, file_path)
+    else:
+        new_id, batch = create_document(file_path)
+    return new_id, batch, time.monotonic()
+
+def file_sha256(file_path):
+    """ファイル内容のsha256"""
+    with open(file_path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
 
-def upload_documents(directory='./data/dify_export'):
-    """指定ディレクトリのMarkdownファイルをDifyにアップロード"""
-    md_files = glob.glob(os.path.join(directory, '*.md'))
+def load_sync_manifest(manifest_file=SYNC_MANIFEST_FILE):
+    """
+    同期マニフェストを読み込み
+
+    形式: {dataset_id: {ファイル名: {'doc_id', 'sha256', 'synced_at'}}}
+    """
+    if not os.path.exists(manifest_file):
+        return {}
+
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"⚠ 同期マニフェストを読み込めないため全件アップロードします: {e}")
+        return {}
+
+def save_sync_manifest(manifest, manifest_file=SYNC_MANIFEST_FILE):
+    """同期マニフェストを保存（一時ファイル経由で置き換え）"""
+    os.makedirs(os.path.dirname(manifest_file), exist_ok=True)
+    tmp_file = manifest_file + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, manifest_file)
+
+def upload_documents(directory='./data/dify_export', manifest_file=SYNC_MANIFEST_FILE,
+                     force=False, delete_missing=True, dry_run=False,
+                     concurrency=DEFAULT_CONCURRENCY, wait=True, indexing_timeout=INDEXING_TIMEOUT):
+    """
+    指定ディレクトリのMarkdownファイルをDifyに差分同期
+
+    前回アップロード時のコンテンツハッシュと比較し、変更のないファイルは
+    スキップします（アップロードのたびにhigh_qualityの再埋め込みが走るため）。
+    前回アップロードしたが今回のエクスポートにないファイルはドキュメントを削除します。
+    削除対象はこのスクリプトでアップロードしたドキュメントのみです。
+
+    Args:
+        directory: アップロード対象のディレクトリ
+        manifest_file: 同期マニフェストのパス
+        force: Trueの場合はハッシュに関係なく全件アップロード
+        delete_missing: Falseの場合はドキュメントを削除しない
+        dry_run: Trueの場合は実行内容の表示のみ
+        concurrency: アップロードの並列数
+        wait: Trueの場合はインデックス完了まで待機してレイテンシを表示
+        indexing_timeout: インデックス完了待ちの上限（秒）
+    """
+    md_files = sorted(glob.glob(os.path.join(directory, '*.md')))
 
     if not md_files:
         print(f"⚠ {directory} にMarkdownファイルが見つかりません")
         return
 
-    print(f"\n{len(md_files)}個のファイルをアップロードします\n")
+    get_session(concurrency)
+    get_upload_session(concurrency)
+    manifest = load_sync_manifest(manifest_file)
+    synced = manifest.get(DIFY_DATASET_ID, {})
 
     # 既存ドキュメントを取得
-    existing_docs = get_existing_documents()
+    existing_docs = get_existing_documents(concurrency)
+    if existing_docs is None:
+        print("❌ 既存ドキュメントを取得できないため中止します")
+        return
+    existing_ids = {doc['id'] for doc in list_documents()}
 
-    success_count = 0
+    uploads = []
+    skipped = 0
     for file_path in md_files:
         file_name = os.path.basename(file_path)
-        print(f"処理中: {file_name}")
-
-        # 既存のドキュメントがあれば更新、なければ作成
-        if file_name in existing_docs:
-            doc_id = existing_docs[file_name]
-            if update_document(doc_id, file_path):
-                success_count += 1
-        else:
-            if create_document(file_path):
-                success_count += 1
+        content_hash = file_sha256(file_path)
+        entry = synced.get(file_name)
+
+        # ハッシュが一致し、ドキュメントがDify側に残っていればスキップ
+        unchanged = (entry is not None
+                     and entry.get('sha256') == content_hash
+                     and entry.get('doc_id') in existing_ids)
+        if unchanged and not force:
+            skipped += 1
+            continue
+
+        uploads.append((file_path, file_name, content_hash))
+
+    current_names = {os.path.basename(path) for path in md_files}
+    deletions = []
+    if delete_missing:
+        deletions = [(name, entry['doc_id']) for name, entry in sorted(synced.items())
+                     if name not in current_names]
+
+    print(f"\n{len(md_files)}個のファイル: アップロード {len(uploads)}件 / 変更なし {skipped}件 / 削除 {len(deletions)}件\n")
+
+    if dry_run:
+        for _, file_name, _ in uploads:
+            action = '更新' if file_name in existing_docs else '作成'
+            print(f"  [dry-run] {action}: {file_name}")
+        for file_name, _ in deletions:
+            print(f"  [dry-run] 削除: {file_name}")
+        return
 
+    # 既存のドキュメントがあれば更新、なければ作成（並列実行）
+    success_count = 0
+    batches = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {
+            executor.submit(_upload_one, file_path, existing_docs.get(file_name)): (file_name, content_hash)
+            for file_path, file_name, content_hash in uploads
+        }
+        for future in as_completed(futures):
+            file_name, content_hash = futures[future]
+            doc_id, batch, uploaded_at = future.result()
+            if not doc_id:
+                continue
+
+            success_count += 1
+            if batch:
+                batches[batch] = (file_name, uploaded_at)
+            synced[file_name] = {
+                'doc_id': doc_id,
+                'sha256': content_hash,
+                'synced_at': datetime.now().isoformat(timespec='seconds'),
+            }
+            # 途中で失敗しても成功分は次回スキップできるよう都度保存
+            manifest[DIFY_DATASET_ID] = synced
+            save_sync_manifest(manifest, manifest_file)
+
+    deleted_count = 0
+    for file_name, doc_id in deletions:
+        print(f"処理中: {file_name}（エクスポートから削除済み）")
+        if delete_document(doc_id, file_name):
+            deleted_count += 1
+            del synced[file_name]
+            manifest[DIFY_DATASET_ID] = synced
+            save_sync_manifest(manifest, manifest_file)
         print()
 
-    print(f"✅ 完了: {success_count}/{len(md_files)}件成功")
+    print(f"\n✅ 完了: アップロード {success_count}/{len(uploads)}件成功、"
+          f"変更なし {skipped}件スキップ、削除 {deleted_count}/{len(deletions)}件")
+
+    if wait:
+        wait_for_indexing(batches, concurrency, timeout=indexing_timeout)
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Dify ナレッジベース自動更新')
+    parser.add_argument('--dir', default='./data/dify_export', help='アップロード対象のディレクトリ')
+    parser.add_argument('--force', action='store_true', help='変更のないファイルも含めて全件アップロード')
+    parser.add_argument('--no-delete', action='store_true',
+                        help='エクスポートからなくなったファイルのドキュメントを削除しない')
+    parser.add_argument('--dry-run', action='store_true', help='実行内容の表示のみ')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f'アップロードの並列数（デフォルト: {DEFAULT_CONCURRENCY}）')
+    parser.add_argument('--no-wait', action='store_true', help='インデックス完了を待たずに終了')
+    parser.add_argument('--indexing-timeout', type=int, default=INDEXING_TIMEOUT,
+                        help=f'インデックス完了待ちの上限秒数（デフォルト: {INDEXING_TIMEOUT}）')
+    args = parser.parse_args()
+
     print("=" * 50)
     print("Dify ナレッジベース自動更新")
     print("=" * 50)
@@ -207,4 +558,6 @@ if __name__ == '__main__':
     print()
 
     # ドキュメントをアップロード
-    upload_documents()
+    upload_documents(args.dir, force=args.force, delete_missing=not args.no_delete, dry_run=args.dry_run,
+                     concurrency=args.concurrency, wait=not args.no_wait,
+                     indexing_timeout=args.indexing_timeout)